@@ -0,0 +1,611 @@
+import streamlit as st
+from datetime import date, timedelta
+import optimistic
+from data_layer import (
+    LOCATIONS_ID,
+    date_property,
+    enqueue_operation,
+    get_location_types_for_device,
+    iso_to_date,
+    reserved_elsewhere,
+    section_data,
+    shipment_state,
+    update_page_step
+)
+from ui import (
+    SHIPMENT_STATUSES,
+    card,
+    counter_badge,
+    fmt,
+    format_relative_date,
+    get_shipment_status_icon,
+    legend_button,
+    load_section,
+    pending_notice,
+    preserve_expander_state,
+    save_headphones,
+    save_shipment_status,
+    set_expander_open,
+    show_feedback,
+    smart_segmented_filter
+)
+from dialogs import (
+    confirm_add_devices,
+    confirm_checkin,
+    confirm_delete_shipment,
+    confirm_end_shipment,
+    confirm_reassign_pending,
+    confirm_remove_device,
+    confirm_renew_rental,
+    confirm_return_device
+)
+
+preloaded_data = load_section("Almacén")
+locations_map = preloaded_data['locations_map']
+all_devices = preloaded_data['devices']
+incidence_map = preloaded_data['incidence_map']
+
+st.title("📦 Almacén")
+legend_button()
+
+future_locs = preloaded_data['future_locations']
+active_locs = preloaded_data['active_locations']
+pending_locs = preloaded_data['pending_locations']
+
+future_count = len(future_locs)
+pending_count = len(pending_locs)
+
+if 'almacen_subtab' not in st.session_state:
+    st.session_state.almacen_subtab = f"🚀 Próximos ({future_count})"
+
+opciones_almacen = [
+    f"🚀 Próximos ({future_count})",
+    "✅ Activos",
+    f"📬 Recepcionar ({pending_count})"
+]
+
+if st.session_state.get('keep_almacen_tab'):
+    if st.session_state.almacen_subtab not in opciones_almacen:
+        st.session_state.almacen_subtab = opciones_almacen[2]
+    st.session_state.keep_almacen_tab = False
+
+selected_almacen = st.radio(
+    "Sección",
+    opciones_almacen,
+    index=opciones_almacen.index(st.session_state.almacen_subtab) if st.session_state.almacen_subtab in opciones_almacen else 0,
+    horizontal=True,
+    key="radio_almacen",
+    label_visibility="collapsed"
+)
+
+st.session_state.almacen_subtab = selected_almacen
+
+if selected_almacen == opciones_almacen[2]:
+    st.session_state.current_view = "Recepcionar"
+
+st.markdown("---")
+
+if selected_almacen == opciones_almacen[0]:
+    
+    if len(future_locs) == 0:
+        st.info("No hay envíos próximos.")
+    else:
+        reserved = reserved_elsewhere()
+        
+        for loc in future_locs:
+            lname = loc["name"]
+            loc_id = loc["id"]
+            device_count = loc["device_count"]
+            start_date = iso_to_date(loc["start"])
+            
+            relative_start = format_relative_date(start_date)
+            
+            status_icon = get_shipment_status_icon(loc_id)
+            
+            shipment_expander_key = f"expander_shipment_{loc_id}"
+            
+            with st.expander(f"{status_icon} {lname} 🥽 {device_count} 📅 Sale {relative_start}", expanded=preserve_expander_state(shipment_expander_key, is_primary=False)):
+                saving = pending_notice(loc_id)
+                
+                devices = all_devices
+                
+                status_options = [f"{icon} {name}" for name, icon in SHIPMENT_STATUSES.items()]
+                shipment = shipment_state(loc_id)
+                status_key = f"status_select_{loc_id}"
+                
+                st.session_state[status_key] = next(
+                    (option for option in status_options if option.endswith(f" {shipment['status']}")),
+                    status_options[0]
+                )
+                
+                st.selectbox(
+                    "Estado del envío:",
+                    status_options,
+                    key=status_key,
+                    disabled=saving,
+                    on_change=save_shipment_status,
+                    args=(loc_id, status_key)
+                )
+                
+                assigned = [
+                    d for d in devices
+                    if loc_id in d["location_ids"]
+                ]
+                
+                ls = iso_to_date(loc["start"])
+                le = iso_to_date(loc["end"])
+                
+                can_add = [
+                    d for d in preloaded_data['shipment_candidates'].get(loc_id, [])
+                    if d["id"] not in reserved
+                ]
+                
+                expander_dates_key = f"expander_dates_{loc_id}"
+                
+                total_days_rental = (le - ls).days if ls and le else 0
+                
+                with st.expander(f"📅 Fechas [{fmt(loc['start'])} → {fmt(loc['end'])}] • {total_days_rental} días", expanded=preserve_expander_state(expander_dates_key, is_primary=False)):
+                    
+                    with st.form(key=f"edit_dates_{loc_id}"):
+                        st.subheader("Editar fechas del envío")
+                        
+                        col_start, col_end = st.columns(2)
+                        
+                        with col_start:
+                            current_start = iso_to_date(loc["start"])
+                            new_start = st.date_input(
+                                "Fecha salida",
+                                value=current_start,
+                                key=f"new_start_{loc_id}"
+                            )
+                        
+                        with col_end:
+                            current_end = iso_to_date(loc["end"]) if loc["end"] else None
+                            new_end = st.date_input(
+                                "Fecha regreso",
+                                value=current_end if current_end else date.today(),
+                                key=f"new_end_{loc_id}"
+                            )
+                        
+                        submit_dates = st.form_submit_button("Actualizar fechas", use_container_width=True, disabled=saving)
+                        
+                        if submit_dates:
+                            if new_start > new_end:
+                                show_feedback('error', "La fecha de salida no puede ser posterior a la de regreso", duration=3)
+                            else:
+                                enqueue_operation(
+                                    f"Fechas {lname}",
+                                    [update_page_step(loc_id, LOCATIONS_ID, {
+                                        "Start Date": date_property(new_start.isoformat()),
+                                        "End Date": date_property(new_end.isoformat())
+                                    }, label="Cambiar fechas", compensate={"properties": {
+                                        "Start Date": date_property(loc["start"]),
+                                        "End Date": date_property(loc["end"])
+                                    }})],
+                                    [optimistic.update_location_patch(loc_id, start=new_start.isoformat(), end=new_end.isoformat())]
+                                )
+                                
+                                set_expander_open(shipment_expander_key)
+                                set_expander_open(expander_dates_key)
+                                st.rerun()
+                
+                expander_devices_key = f"expander_devices_{loc_id}"
+                
+                with st.expander(f"🥽 Dispositivos [{len(assigned)} asignados]", expanded=preserve_expander_state(expander_devices_key, is_primary=False)):
+                    
+                    if len(assigned) == 0:
+                        st.warning("Este envío no tiene dispositivos asignados")
+                        
+                        if st.button("Borrar envío", key=f"delete_loc_{loc_id}", use_container_width=True, disabled=saving):
+                            confirm_delete_shipment(lname, loc_id)
+                    else:
+                        assigned_filtered, _ = smart_segmented_filter(assigned, key_prefix=f"assigned_{loc_id}")
+                        
+                        with st.container(border=False):
+                            for d in assigned_filtered:
+                                cols = st.columns([8, 2])
+                                
+                                with cols[0]:
+                                    subtitle = get_location_types_for_device(d, locations_map)
+                                    inc = incidence_map.get(d["id"], {"active": 0, "total": 0})
+                                    card(
+                                        d["Name"],
+                                        location_types=subtitle,
+                                        incident_counts=(inc["active"], inc["total"])
+                                    )
+                                
+                                with cols[1]:
+                                    if st.button("Quitar", key=f"rm_{loc_id}_{d['id']}", use_container_width=True, disabled=saving):
+                                        confirm_remove_device(d["Name"], lname, d["id"], shipment_expander_key)
+                    
+                    expander_add_key = f"expander_add_{loc_id}"
+                    
+                    with st.expander(f"➕ Añadir más dispositivos [{len(can_add)} disponibles]", expanded=preserve_expander_state(expander_add_key, is_primary=False)):
+                        
+                        can_add_filtered, _ = smart_segmented_filter(can_add, key_prefix=f"canadd_{loc_id}")
+                        
+                        checkbox_keys = []
+                        
+                        with st.container(height=400, border=True):
+                            for d in can_add_filtered:
+                                key = f"add_{loc_id}_{d['id']}"
+                                checkbox_keys.append(key)
+                                
+                                subtitle = get_location_types_for_device(d, locations_map)
+                                
+                                cols = st.columns([0.5, 9.5])
+                                
+                                with cols[0]:
+                                    st.checkbox("", key=key, disabled=saving)
+                                
+                                with cols[1]:
+                                    inc = incidence_map.get(d["id"], {"active": 0, "total": 0})
+                                    card(
+                                        d["Name"],
+                                        location_types=subtitle,
+                                        selected=st.session_state.get(key, False),
+                                        incident_counts=(inc["active"], inc["total"])
+                                    )
+                        
+                        selected_ids = [
+                            key.split("_")[-1]
+                            for key in checkbox_keys
+                            if st.session_state.get(key, False)
+                        ]
+                        
+                        sel_count = len(selected_ids)
+                        
+                        if sel_count > 0:
+                            cols_bottom = st.columns([7, 3])
+                            
+                            with cols_bottom[0]:
+                                counter_badge(sel_count, len(can_add_filtered))
+                            
+                            with cols_bottom[1]:
+                                if st.button("Añadir", key=f"assign_btn_{loc_id}", use_container_width=True, disabled=saving):
+                                    confirm_add_devices(lname, sel_count, loc_id, selected_ids, shipment_expander_key)
+                
+                headphones_key = f"headphones_{loc_id}"
+                st.session_state[headphones_key] = shipment["headphones"]
+                
+                st.checkbox(
+                    "🎧 Incluye cascos",
+                    key=headphones_key,
+                    disabled=saving,
+                    on_change=save_headphones,
+                    args=(loc_id, headphones_key)
+                )
+
+
+elif selected_almacen == opciones_almacen[1]:
+    devices = all_devices
+    
+    active_with_end = [loc for loc in active_locs if loc.get('end')]
+    active_without_end = [loc for loc in active_locs if not loc.get('end')]
+    
+    total_active = len(active_with_end) + len(active_without_end)
+    
+    if total_active == 0:
+        st.info("No hay envíos activos en este momento.")
+    else:
+        st.write(f"**{total_active} envío(s) activo(s)**")
+        
+        for loc in active_with_end:
+            lname = loc["name"]
+            loc_id = loc["id"]
+            device_count = loc["device_count"]
+            days_until_end = loc["days_until_end"]
+            total_days = loc["total_days"]
+            start_date_obj = loc["start_date_obj"]
+            end_date_obj = loc["end_date_obj"]
+            
+            if days_until_end < 30:
+                status_circle = "🟡"
+            else:
+                status_circle = "🟢"
+            
+            days_text = f"Quedan {days_until_end} de {total_days} días"
+            
+            active_expander_key = f"expander_active_{loc_id}"
+            
+            with st.expander(f"{status_circle} 📦 {lname} 🥽 {device_count} 📅 {days_text}", expanded=preserve_expander_state(active_expander_key, is_primary=False)):
+                saving = pending_notice(loc_id)
+                
+                col1, col2, col3 = st.columns(3)
+                with col1:
+                    st.markdown(f"📅 **Inicio:** {fmt(loc['start'])}")
+                with col2:
+                    st.markdown(f"📅 **Fin:** {fmt(loc['end'])}")
+                with col3:
+                    st.markdown(f"⏱️ **Duración:** {total_days} días")
+                
+                st.markdown("")
+                
+                col_end, col_renew = st.columns(2)
+                
+                with col_end:
+                    if st.button("Terminar alquiler hoy", key=f"end_today_{loc_id}", use_container_width=True, disabled=saving):
+                        confirm_end_shipment(lname, device_count, loc_id)
+                
+                with col_renew:
+                    if st.button("🔄 Renovar alquiler", key=f"toggle_renew_{loc_id}", use_container_width=True, disabled=saving):
+                        renew_key = f"expander_renew_{loc_id}"
+                        if renew_key not in st.session_state.expander_states:
+                            st.session_state.expander_states[renew_key] = False
+                        st.session_state.expander_states[renew_key] = not st.session_state.expander_states[renew_key]
+                        st.rerun()
+                
+                renew_expander_key = f"expander_renew_{loc_id}"
+                if renew_expander_key not in st.session_state.expander_states:
+                    st.session_state.expander_states[renew_expander_key] = False
+                
+                if st.session_state.expander_states[renew_expander_key]:
+                    with st.container(border=True):
+                        st.subheader("Renovar alquiler")
+                        st.caption(f"Se hará check-in de todos los dispositivos y se creará un nuevo alquiler consecutivo")
+                        
+                        assigned = [
+                            d for d in devices
+                            if loc_id in d["location_ids"]
+                        ]
+                        
+                        new_start_date = end_date_obj + timedelta(days=1)
+                        new_end_date = new_start_date + timedelta(days=total_days)
+                        year_suffix = new_start_date.year
+                        default_name = f"{lname} {year_suffix}"
+                        
+                        renew_client_name = st.text_input(
+                            "Nombre del nuevo alquiler",
+                            value=default_name,
+                            key=f"renew_name_{loc_id}"
+                        )
+                        
+                        col_start, col_end = st.columns(2)
+                        
+                        with col_start:
+                            renew_start = st.date_input(
+                                "Fecha salida",
+                                value=new_start_date,
+                                key=f"renew_start_{loc_id}"
+                            )
+                        
+                        with col_end:
+                            renew_end = st.date_input(
+                                "Fecha regreso",
+                                value=new_end_date,
+                                key=f"renew_end_{loc_id}"
+                            )
+                        
+                        col_confirm, col_cancel = st.columns(2)
+                        
+                        with col_confirm:
+                            if st.button("Confirmar renovación", key=f"confirm_renew_{loc_id}", use_container_width=True, disabled=saving, type="primary"):
+                                if not renew_client_name or renew_client_name.strip() == "":
+                                    show_feedback('error', "Debes escribir el nombre del alquiler", duration=2)
+                                elif renew_start > renew_end:
+                                    show_feedback('error', "La fecha de salida no puede ser posterior a la de regreso", duration=3)
+                                else:
+                                    device_ids = [d["id"] for d in assigned]
+                                    confirm_renew_rental(renew_client_name, assigned, renew_start, renew_end, loc_id, lname, device_ids)
+                        
+                        with col_cancel:
+                            if st.button("Cancelar", key=f"cancel_renew_{loc_id}", use_container_width=True):
+                                st.session_state.expander_states[renew_expander_key] = False
+                                st.rerun()
+                
+                st.markdown("---")
+                
+                assigned = [
+                    d for d in devices
+                    if loc_id in d["location_ids"]
+                ]
+                
+                if len(assigned) > 0:
+                    st.caption("Dispositivos en uso:")
+                    
+                    assigned_filtered, _ = smart_segmented_filter(assigned, key_prefix=f"active_assigned_{loc_id}")
+                    
+                    with st.container(border=False):
+                        for d in assigned_filtered:
+                            cols = st.columns([8, 2])
+                            
+                            with cols[0]:
+                                subtitle = get_location_types_for_device(d, locations_map)
+                                inc = incidence_map.get(d["id"], {"active": 0, "total": 0})
+                                card(
+                                    d["Name"],
+                                    location_types=subtitle,
+                                    incident_counts=(inc["active"], inc["total"])
+                                )
+                            
+                            with cols[1]:
+                                if st.button("Devolver", key=f"return_{loc_id}_{d['id']}", use_container_width=True, disabled=saving):
+                                    confirm_return_device(d["Name"], lname, d["id"], active_expander_key)
+        
+        for loc in active_without_end:
+            lname = loc["name"]
+            loc_id = loc["id"]
+            device_count = loc["device_count"]
+            days_since_start = loc["days_since_start"]
+            
+            status_circle = "🔵"
+            days_text = f"Llevan {days_since_start} días"
+            
+            active_indef_expander_key = f"expander_active_indef_{loc_id}"
+            
+            with st.expander(f"{status_circle} 📦 {lname} 🥽 {device_count} 📅 {days_text}", expanded=preserve_expander_state(active_indef_expander_key, is_primary=True)):
+                saving = pending_notice(loc_id)
+                
+                col1, col2 = st.columns(2)
+                with col1:
+                    st.markdown(f"📅 **Inicio:** {fmt(loc['start'])}")
+                with col2:
+                    st.markdown(f"⏱️ **Duración:** {days_since_start} días")
+                
+                st.markdown("")
+                
+                if st.button("Terminar alquiler hoy", key=f"end_today_{loc_id}", use_container_width=True, disabled=saving):
+                    confirm_end_shipment(lname, device_count, loc_id)
+                
+                st.markdown("---")
+                
+                assigned = [
+                    d for d in devices
+                    if loc_id in d["location_ids"]
+                ]
+                
+                if len(assigned) > 0:
+                    st.caption("Dispositivos en uso:")
+                    
+                    assigned_filtered, _ = smart_segmented_filter(assigned, key_prefix=f"active_assigned_indef_{loc_id}")
+                    
+                    with st.container(border=False):
+                        for d in assigned_filtered:
+                            cols = st.columns([8, 2])
+                            
+                            with cols[0]:
+                                subtitle = get_location_types_for_device(d, locations_map)
+                                inc = incidence_map.get(d["id"], {"active": 0, "total": 0})
+                                card(
+                                    d["Name"],
+                                    location_types=subtitle,
+                                    incident_counts=(inc["active"], inc["total"])
+                                )
+                            
+                            with cols[1]:
+                                if st.button("Devolver", key=f"return_{loc_id}_{d['id']}", use_container_width=True, disabled=saving):
+                                    confirm_return_device(d["Name"], lname, d["id"], active_indef_expander_key)
+
+
+elif selected_almacen == opciones_almacen[2]:
+    with st.spinner("🔄 Cargando histórico..."):
+        historic_locs = section_data("Recepcionar")['historic_locations']
+    
+    expander_pending_key = "expander_pending_reception"
+    
+    with st.expander(f"📬 Pendientes de recepcionar ({len(pending_locs)})", expanded=preserve_expander_state(expander_pending_key, is_primary=True)):
+        
+        if len(pending_locs) == 0:
+            st.info("No hay envíos pendientes de recepcionar.")
+        else:
+            for loc in pending_locs:
+                lname = loc["name"]
+                loc_id = loc["id"]
+                device_count = loc["device_count"]
+                end_date_obj = loc["end_date_obj"]
+                
+                relative_date = format_relative_date(end_date_obj)
+                
+                days_late = (date.today() - end_date_obj).days
+                
+                if days_late > 2:
+                    status_icon = "🔴"
+                else:
+                    status_icon = "⚠️"
+                
+                pending_loc_expander_key = f"expander_pending_loc_{loc_id}"
+                
+                with st.expander(f"{status_icon} {lname} 🥽 {device_count} 📅 Terminó {relative_date}", expanded=preserve_expander_state(pending_loc_expander_key, is_primary=False)):
+                    saving = pending_notice(loc_id)
+                    
+                    devices = all_devices
+                    
+                    assigned = [
+                        d for d in devices
+                        if loc_id in d["location_ids"]
+                    ]
+                    
+                    st.caption(f"Dispositivos pendientes de recepcionar:")
+                    
+                    with st.container(border=False):
+                        for d in assigned:
+                            cols = st.columns([8, 2])
+                            
+                            with cols[0]:
+                                subtitle = get_location_types_for_device(d, locations_map)
+                                inc = incidence_map.get(d["id"], {"active": 0, "total": 0})
+                                card(
+                                    d["Name"],
+                                    location_types=subtitle,
+                                    incident_counts=(inc["active"], inc["total"])
+                                )
+                            
+                            with cols[1]:
+                                if st.button("Check-In", key=f"checkin_{d['id']}", use_container_width=True, disabled=saving):
+                                    confirm_checkin(d["Name"], lname, d["id"], loc_id, d)
+                    
+                    st.markdown("---")
+                    
+                    if st.button("📦 Reasignar a nuevo proyecto", key=f"toggle_reassign_{loc_id}", use_container_width=True, disabled=saving):
+                        reassign_key = f"expander_reassign_{loc_id}"
+                        if reassign_key not in st.session_state.expander_states:
+                            st.session_state.expander_states[reassign_key] = False
+                        st.session_state.expander_states[reassign_key] = not st.session_state.expander_states[reassign_key]
+                        st.rerun()
+                    
+                    reassign_expander_key = f"expander_reassign_{loc_id}"
+                    if reassign_expander_key not in st.session_state.expander_states:
+                        st.session_state.expander_states[reassign_expander_key] = False
+                    
+                    if st.session_state.expander_states[reassign_expander_key]:
+                        with st.container(border=True):
+                            st.subheader("Reasignar dispositivos pendientes")
+                            st.caption(f"Se hará check-in automático de {len(assigned)} dispositivos y se reasignarán al nuevo proyecto")
+                            
+                            new_client_name = st.text_input(
+                                "Nombre del nuevo cliente/proyecto",
+                                key=f"reassign_name_{loc_id}"
+                            )
+                            
+                            col_start, col_end = st.columns(2)
+                            
+                            with col_start:
+                                new_start = st.date_input(
+                                    "Fecha salida",
+                                    value=date.today(),
+                                    key=f"reassign_start_{loc_id}"
+                                )
+                            
+                            with col_end:
+                                new_end = st.date_input(
+                                    "Fecha regreso",
+                                    value=date.today() + timedelta(days=7),
+                                    key=f"reassign_end_{loc_id}"
+                                )
+                            
+                            col_confirm, col_cancel = st.columns(2)
+                            
+                            with col_confirm:
+                                if st.button("Confirmar reasignación", key=f"confirm_reassign_{loc_id}", use_container_width=True, disabled=saving, type="primary"):
+                                    if not new_client_name or new_client_name.strip() == "":
+                                        show_feedback('error', "Debes escribir el nombre del cliente", duration=2)
+                                    elif new_start > new_end:
+                                        show_feedback('error', "La fecha de salida no puede ser posterior a la de regreso", duration=3)
+                                    else:
+                                        device_ids = [d["id"] for d in assigned]
+                                        confirm_reassign_pending(new_client_name, assigned, new_start, new_end, loc_id, lname, device_ids)
+                            
+                            with col_cancel:
+                                if st.button("Cancelar", key=f"cancel_reassign_{loc_id}", use_container_width=True):
+                                    st.session_state.expander_states[reassign_expander_key] = False
+                                    st.rerun()
+    
+    expander_historic_key = "expander_historic"
+    
+    with st.expander(f"📚 Histórico (últimos 30 días) ({len(historic_locs)})", expanded=preserve_expander_state(expander_historic_key)):
+        
+        if len(historic_locs) == 0:
+            st.info("No hay envíos en el histórico de los últimos 30 días.")
+        else:
+            for loc in historic_locs:
+                lname = loc["name"]
+                device_count = loc["device_count"]
+                checkin_date = loc.get("checkin_date")
+                
+                if checkin_date:
+                    checkin_fmt = fmt(checkin_date)
+                    status_text = f"Recepcionado el {checkin_fmt}"
+                else:
+                    status_text = "Completado"
+                
+                st.markdown(f"⚫ **{lname}** 🥽 {device_count} 📅 {status_text}")
@@ -0,0 +1,87 @@
+import streamlit as st
+from datetime import date
+from data_layer import available, get_location_types_for_device, reserved_elsewhere
+from ui import (
+    card,
+    counter_badge,
+    legend_button,
+    load_section,
+    show_feedback,
+    smart_segmented_filter
+)
+from dialogs import confirm_assign_client
+
+preloaded_data = load_section("Disponibles para Alquilar")
+locations_map = preloaded_data['locations_map']
+all_devices = preloaded_data['devices']
+incidence_map = preloaded_data['incidence_map']
+
+st.title("Disponibles para Alquilar")
+legend_button()
+
+c1, c2, c3 = st.columns(3)
+with c1:
+    start = st.date_input("Fecha salida", date.today(), key="tab1_start_date")
+with c2:
+    end = st.date_input("Fecha regreso", date.today(), key="tab1_end_date")
+with c3:
+    if 'tab1_start_date' in st.session_state and 'tab1_end_date' in st.session_state:
+        days_diff = (st.session_state.tab1_end_date - st.session_state.tab1_start_date).days
+    else:
+        days_diff = 0
+    st.metric("Días totales", days_diff)
+
+if st.button("Comprobar disponibilidad"):
+    st.session_state.tab1_show = True
+    st.session_state.sel1 = []
+    for key in list(st.session_state.keys()):
+        if key.startswith("a_"):
+            del st.session_state[key]
+
+if st.session_state.tab1_show:
+    devices = all_devices
+    reserved = reserved_elsewhere()
+    
+    avail = [
+        d for d in devices
+        if d.get("location_ids") and available(d, start, end)
+        and d["id"] not in reserved
+    ]
+    
+    avail_filtered, _ = smart_segmented_filter(avail, key_prefix="tab1")
+    
+    with st.container(height=400, border=True):
+        for d in avail_filtered:
+            key = f"a_{d['id']}"
+            subtitle = get_location_types_for_device(d, locations_map)
+            
+            cols = st.columns([0.5, 9.5])
+            with cols[0]:
+                st.checkbox("", key=key)
+            
+            with cols[1]:
+                inc = incidence_map.get(d["id"], {"active": 0, "total": 0})
+                card(
+                    d["Name"],
+                    location_types=subtitle,
+                    selected=st.session_state.get(key, False),
+                    incident_counts=(inc["active"], inc["total"])
+                )
+    
+    st.session_state.sel1 = [
+        d["id"] for d in avail_filtered if st.session_state.get(f"a_{d['id']}", False)
+    ]
+    sel_count = len(st.session_state.sel1)
+    
+    if sel_count > 0:
+        counter_badge(sel_count, len(avail_filtered))
+        
+        with st.form("form_assign_client"):
+            client = st.text_input("Nombre Cliente")
+            submit = st.form_submit_button("Asignar Cliente", use_container_width=True)
+            
+            if submit:
+                if not client or client.strip() == "":
+                    show_feedback('error', "Debes escribir el nombre del cliente", duration=2)
+                else:
+                    confirm_assign_client(client, sel_count, start, end, st.session_state.sel1)
@@ -0,0 +1,119 @@
+import streamlit as st
+from data_layer import get_location_types_for_device, reserved_elsewhere
+from ui import (
+    card,
+    counter_badge,
+    legend_button,
+    load_section,
+    preserve_expander_state,
+    smart_segmented_filter
+)
+from dialogs import confirm_assign_to_person, confirm_return_device
+
+preloaded_data = load_section("Gafas en casa")
+locations_map = preloaded_data['locations_map']
+all_devices = preloaded_data['devices']
+incidence_map = preloaded_data['incidence_map']
+
+st.title("Gafas en casa")
+legend_button()
+
+devices = all_devices
+inh = preloaded_data['inhouse']
+oid = preloaded_data['office_id']
+
+inh_ids = [p["id"] for p in inh]
+
+expander_personal_key = "expander_personal_devices"
+
+with st.expander("Personal con dispositivos en casa", expanded=preserve_expander_state(expander_personal_key, is_primary=True)):
+    
+    devices_filtered, _ = smart_segmented_filter(devices, key_prefix="inhouse")
+    
+    inhouse_filtered = [
+        d for d in devices_filtered
+        if any(l in inh_ids for l in d["location_ids"])
+    ]
+    
+    people_devices = {p["id"]: [] for p in inh}
+    for d in inhouse_filtered:
+        for lid in d["location_ids"]:
+            if lid in people_devices:
+                people_devices[lid].append(d)
+    
+    people_with_devices = [
+        p for p in inh if len(people_devices[p["id"]]) > 0
+    ]
+    
+    with st.container(border=False):
+        for person in people_with_devices:
+            pid = person["id"]
+            pname = person["name"]
+            devs = people_devices.get(pid, [])
+            
+            person_expander_key = f"expander_person_{pid}"
+            
+            with st.expander(f"{pname} ({len(devs)})", expanded=preserve_expander_state(person_expander_key, is_primary=False)):
+                
+                for d in devs:
+                    cols = st.columns([8, 2])
+                    
+                    with cols[0]:
+                        inc = incidence_map.get(d["id"], {"active": 0, "total": 0})
+                        card(
+                            d["Name"],
+                            location_types="In House",
+                            incident_counts=(inc["active"], inc["total"])
+                        )
+                    
+                    with cols[1]:
+                        if st.button("Devolver", key=f"rm_{d['id']}", use_container_width=True):
+                            confirm_return_device(d["Name"], pname, d["id"], person_expander_key)
+
+expander_office_key = "expander_office_devices"
+
+with st.expander("Otras gafas disponibles en oficina", expanded=preserve_expander_state(expander_office_key, is_primary=True)):
+    
+    devices_filtered_office, _ = smart_segmented_filter(devices, key_prefix="office")
+    
+    reserved = reserved_elsewhere()
+    
+    office_filtered = [
+        d for d in devices_filtered_office
+        if oid in d["location_ids"]
+        and d["id"] not in reserved
+    ]
+    
+    with st.container(height=400, border=True):
+        for d in office_filtered:
+            key = f"o_{d['id']}"
+            subtitle = get_location_types_for_device(d, locations_map)
+            
+            cols = st.columns([0.5, 9.5])
+            
+            with cols[0]:
+                st.checkbox("", key=key)
+            
+            with cols[1]:
+                inc = incidence_map.get(d["id"], {"active": 0, "total": 0})
+                card(
+                    d["Name"],
+                    location_types=subtitle,
+                    selected=st.session_state.get(key, False),
+                    incident_counts=(inc["active"], inc["total"])
+                )
+    
+    st.session_state.sel2 = [
+        d["id"] for d in office_filtered
+        if st.session_state.get(f"o_{d['id']}", False)
+    ]
+    sel_count = len(st.session_state.sel2)
+    
+    if sel_count > 0:
+        counter_badge(sel_count, len(office_filtered))
+        
+        dest = st.selectbox("Asignar a:", [x["name"] for x in inh], key="dest_person")
+        dest_id = next(x["id"] for x in inh if x["name"] == dest)
+        
+        if st.button("Asignar seleccionadas", use_container_width=True):
+            confirm_assign_to_person(dest, sel_count, dest_id, st.session_state.sel2)
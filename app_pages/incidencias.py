@@ -0,0 +1,299 @@
+import streamlit as st
+from datetime import datetime, date
+import optimistic
+from data_layer import (
+    ACTIVE_INC_ID,
+    PAST_INC_ID,
+    create_page_step,
+    enqueue_operation,
+    get_location_types_for_device,
+    update_page_step
+)
+from ui import (
+    card,
+    counter_badge,
+    fmt_datetime,
+    legend_button,
+    load_section,
+    preserve_expander_state,
+    show_feedback,
+    smart_segmented_filter
+)
+
+preloaded_data = load_section("Incidencias")
+locations_map = preloaded_data['locations_map']
+all_devices = preloaded_data['devices']
+incidence_map = preloaded_data['incidence_map']
+
+st.title("Incidencias en dispositivos")
+legend_button()
+
+actives = preloaded_data['active_incidents']
+pasts = preloaded_data['past_incidents']
+devices = all_devices
+
+device_map = {d["id"]: d for d in devices}
+
+incidents_by_device = {}
+
+for inc in actives:
+    did = inc.get("Device")
+    if not did:
+        continue
+    incidents_by_device.setdefault(did, {"active": [], "past": []})
+    incidents_by_device[did]["active"].append(inc)
+
+for inc in pasts:
+    did = inc.get("Device")
+    if not did:
+        continue
+    incidents_by_device.setdefault(did, {"active": [], "past": []})
+    incidents_by_device[did]["past"].append(inc)
+
+total_active = sum(len(v["active"]) for v in incidents_by_device.values())
+
+expander_incidents_key = "expander_incidents_main"
+
+with st.expander(f"Incidencias en dispositivos ({total_active} activas)", expanded=preserve_expander_state(expander_incidents_key, is_primary=True)):
+    
+    devices_with_incidents = [
+        device_map[did] for did in incidents_by_device.keys() if did in device_map
+    ]
+
+    search_query = st.text_input(
+        "Buscar dispositivo...",
+        placeholder="Ej: Quest 3, Quest 2, Vision Pro...",
+        key="inc_dynamic_search"
+    )
+
+    if search_query:
+        q_lower = search_query.lower().strip()
+        devices_with_incidents = [
+            d for d in devices_with_incidents 
+            if q_lower in d["Name"].lower()
+        ]
+
+    devices_filtered, selected_group = smart_segmented_filter(
+        devices_with_incidents, 
+        key_prefix="incidents_filter",
+        show_red_for_active=True,
+        incidence_map=incidence_map
+    )
+
+    
+    filtered_device_ids = {d["id"] for d in devices_filtered}
+    filtered_incidents_by_device = {
+        did: lists for did, lists in incidents_by_device.items() 
+        if did in filtered_device_ids
+    }
+    
+    total_active_filtered = sum(len(v["active"]) for v in filtered_incidents_by_device.values())
+
+    if not filtered_incidents_by_device:
+        st.info("No hay incidencias registradas para este tipo de dispositivo.")
+    else:
+        all_incidents_list = []
+        for did, lists in filtered_incidents_by_device.items():
+            dev = device_map.get(did)
+            dev_name = dev["Name"] if dev else "Dispositivo desconocido"
+            
+            active_sorted = sorted(
+                lists["active"], key=lambda x: x.get("Created") or "", reverse=True
+            )
+            for inc in active_sorted:
+                all_incidents_list.append({
+                    "type": "active",
+                    "dev_name": dev_name,
+                    "inc": inc
+                })
+            
+            past_sorted = sorted(
+                lists["past"], key=lambda x: x.get("Created") or "", reverse=True
+            )
+            for inc in past_sorted:
+                all_incidents_list.append({
+                    "type": "past",
+                    "dev_name": dev_name,
+                    "inc": inc
+                })
+        
+        with st.container(height=500, border=True):
+            for item in all_incidents_list:
+                inc = item["inc"]
+                dev_name = item["dev_name"]
+                inc_type = item["type"]
+                
+                if inc_type == "active":
+                    notes = inc.get("Notes", "").replace("<", "&lt;").replace(">", "&gt;")
+                    created = fmt_datetime(inc.get("Created"))
+
+                    cols = st.columns([8, 2])
+                    with cols[0]:
+                        st.markdown(
+                            f"""<div style='margin-left:20px;margin-bottom:10px;padding:8px;background:#FFEBEE;border-radius:4px;'><div style='display:flex;align-items:center;margin-bottom:4px;'><div style='width:10px;height:10px;background:#E53935;border-radius:50%;margin-right:8px;'></div><strong style='font-size:14px;color:#333;'>{dev_name}</strong><span style='margin:0 6px;color:#AAA;'>|</span><strong style='font-size:14px;color:#333;'>{inc['Name']}</strong><span style='margin-left:8px;color:#888;font-size:12px;'>{created}</span></div><div style='margin-left:18px;color:#666;font-size:13px;'>{notes if notes else '<em>Sin notas</em>'}</div></div>""",
+                            unsafe_allow_html=True
+                        )
+
+                    with cols[1]:
+                        if st.button("Resolver", key=f"resolve_{inc['id']}", use_container_width=True, disabled=optimistic.is_pending_id(inc["id"])):
+                            st.session_state.solve_inc = inc
+                            st.rerun()
+                
+                else:
+                    notes = inc.get("Notes", "").replace("<", "&lt;").replace(">", "&gt;")
+                    created = fmt_datetime(inc.get("Created"))
+                    resolved = fmt_datetime(inc.get("Resolved"))
+
+                    rnotes = inc.get("ResolutionNotes", "")
+                    rnotes_html = ""
+                    if rnotes:
+                        rnotes = rnotes.replace("<", "&lt;").replace(">", "&gt;")
+                        rnotes_html = f"<div style='margin-left:18px;color:#4CAF50;font-size:13px;margin-top:4px;'>{rnotes}</div>"
+
+                    st.markdown(
+                        f"""<div style='margin-left:20px;margin-bottom:10px;padding:8px;background:#F5F5F5;border-radius:4px;'><div style='display:flex;align-items:center;margin-bottom:4px;'><div style='width:10px;height:10px;background:#9E9E9E;border-radius:50%;margin-right:8px;'></div><strong style='font-size:14px;color:#555;'>{dev_name}</strong><span style='margin:0 6px;color:#AAA;'>|</span><strong style='font-size:14px;color:#555;'>{inc['Name']}</strong><span style='margin-left:8px;color:#888;font-size:12px;'>Creada: {created} → Resuelta: {resolved}</span></div><div style='margin-left:18px;color:#666;font-size:13px;'>{notes if notes else '<em>Sin notas</em>'}</div>{rnotes_html}</div>""",
+                        unsafe_allow_html=True
+                    )
+
+if "solve_inc" not in st.session_state:
+    st.session_state.solve_inc = None
+
+if st.session_state.solve_inc:
+    inc = st.session_state.solve_inc
+
+    st.markdown("---")
+    st.header("Resolver incidencia")
+    st.write(f"**{inc['Name']}**")
+    st.caption(f"Creada: {fmt_datetime(inc.get('Created'))}")
+
+    if inc.get("Notes"):
+        st.caption(f"Notas: {inc['Notes']}")
+
+    col_date, col_time = st.columns(2)
+
+    with col_date:
+        resolved_date = st.date_input("Fecha de resolución", value=date.today())
+
+    with col_time:
+        resolved_time = st.time_input("Hora de resolución", value=datetime.now().time())
+
+    rnotes = st.text_area("Notas de resolución")
+
+    col1, col2 = st.columns(2)
+
+    with col1:
+        if st.button("Confirmar", use_container_width=True, type="primary"):
+
+            resolved_datetime = datetime.combine(resolved_date, resolved_time)
+            resolved_iso = resolved_datetime.isoformat()
+
+            properties = {
+                "Name": {"title": [{"text": {"content": inc["Name"]}}]},
+                "Device": {"relation": [{"id": inc["Device"]}]},
+                "Created Date": {"date": {"start": inc.get("Created")}},
+                "Notes": {"rich_text": [{"text": {"content": inc.get("Notes", "")}}]},
+                "Resolved Date": {"date": {"start": resolved_iso}},
+            }
+
+            if rnotes:
+                properties["Resolution Notes"] = {
+                    "rich_text": [{"text": {"content": rnotes}}]
+                }
+
+            enqueue_operation(
+                f"Resolver incidencia {inc['Name']}",
+                [
+                    create_page_step(PAST_INC_ID, properties),
+                    update_page_step(inc["id"], ACTIVE_INC_ID, archived=True)
+                ],
+                [optimistic.resolve_incident_patch(inc["id"], resolved_iso, rnotes)]
+            )
+
+            st.session_state.solve_inc = None
+            if "add_new_incident_expander" in st.session_state.expander_states:
+                st.session_state.expander_states["add_new_incident_expander"] = False
+            st.rerun()
+
+    with col2:
+        if st.button("Cancelar", use_container_width=True):
+            st.session_state.solve_inc = None
+            st.rerun()
+
+add_new_expanded_key = "add_new_incident_expander"
+
+with st.expander("Añadir nueva incidencia", expanded=preserve_expander_state(add_new_expanded_key, is_primary=False)):
+
+    devices_with_location = [
+        d for d in devices 
+        if d.get("location_ids") and len(d["location_ids"]) > 0
+    ]
+
+    devices_filtered_new, _ = smart_segmented_filter(devices_with_location, key_prefix="new_inc")
+
+    sel_keys = []
+
+    with st.container(height=300, border=True):
+        for d in devices_filtered_new:
+            key = f"newinc_{d['id']}"
+            sel_keys.append(key)
+
+            cols = st.columns([0.5, 9.5])
+
+            with cols[0]:
+                st.checkbox("", key=key)
+
+            with cols[1]:
+                inc = incidence_map.get(d["id"], {"active": 0, "total": 0})
+                subtitle = get_location_types_for_device(d, locations_map)
+                card(
+                    d["Name"],
+                    location_types=subtitle,
+                    incident_counts=(inc["active"], inc["total"])
+                )
+
+    selected_devices = [
+        key.split("_")[1] for key in sel_keys if st.session_state.get(key, False)
+    ]
+
+    if selected_devices:
+        counter_badge(len(selected_devices), len(devices_filtered_new))
+
+        name = st.text_input("Título incidencia", key="new_inc_name")
+        notes = st.text_area("Notas", key="new_inc_notes")
+
+        if st.button("Crear incidencia", use_container_width=True):
+
+            if not name or name.strip() == "":
+                show_feedback("error", "Debes poner un título", duration=2)
+
+            else:
+                now = datetime.now().isoformat()
+
+                enqueue_operation(
+                    f"Nueva incidencia {name} ({len(selected_devices)} dispositivos)",
+                    [
+                        create_page_step(ACTIVE_INC_ID, {
+                            "Name": {"title": [{"text": {"content": name}}]},
+                            "Device": {"relation": [{"id": did}]},
+                            "Notes": {"rich_text": [{"text": {"content": notes}}]},
+                            "Created Date": {"date": {"start": now}},
+                        })
+                        for did in selected_devices
+                    ],
+                    [
+                        optimistic.create_incident_patch(optimistic.pending_id(), did, name, notes, now, step=i)
+                        for i, did in enumerate(selected_devices)
+                    ]
+                )
+
+                for key in sel_keys:
+                    if key in st.session_state:
+                        del st.session_state[key]
+
+                if "new_inc_name" in st.session_state:
+                    del st.session_state["new_inc_name"]
+                if "new_inc_notes" in st.session_state:
+                    del st.session_state["new_inc_notes"]
+
+                st.session_state.expander_states[add_new_expanded_key] = False
+                st.rerun()
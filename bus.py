@@ -0,0 +1,23 @@
+import threading
+import time
+
+
+class VersionBus:
+    """Bus de avisos dentro del proceso: cada escritura o recarga de datos publica una versión nueva.
+
+    Las sesiones abiertas comparan la versión que pintaron con la actual desde un fragmento que se
+    relanza solo, y se recargan cuando cambia; no hace falta consultar Notion para enterarse.
+    """
+
+    def __init__(self):
+        self.version = 0
+        self.last_reason = None
+        self.last_published = None
+        self._lock = threading.Lock()
+
+    def publish(self, reason):
+        with self._lock:
+            self.version += 1
+            self.last_reason = reason
+            self.last_published = time.time()
+            return self.version
@@ -0,0 +1,1075 @@
+import streamlit as st
+from datetime import datetime, date
+import os
+from dotenv import load_dotenv
+import time
+import threading
+import uuid
+import json
+from write_queue import WriteQueue
+import optimistic
+import saga
+import snapshot
+import swr
+import sync
+import query_cache
+import singleflight
+import depgraph
+import notion_api
+import notion_async
+import prefetch
+import lifecycle
+import events
+import leases
+import bus
+import shipment_state as shipment_state_store
+import metrics
+import contextlib
+import contextvars
+from concurrent.futures import ThreadPoolExecutor, as_completed, wait
+
+load_dotenv()
+
+try:
+    NOTION_TOKEN = st.secrets["NOTION_TOKEN"]
+except:
+    NOTION_TOKEN = os.getenv("NOTION_TOKEN")
+
+NOTION_VERSION = "2022-06-28"
+
+DEVICES_ID = "43e15b677c8c4bd599d7c602f281f1da"
+LOCATIONS_ID = "28758a35e4118045abe6e37534c44974"
+HISTORIC_ID = "2a158a35e411806d9d11c6d77598d44d"
+ACTIVE_INC_ID = "28c58a35e41180b8ae87fb11aec1f48e"
+PAST_INC_ID = "28e58a35e41180f29199c42d33500566"
+
+DATABASE_NAMES = {
+    DEVICES_ID: "devices",
+    LOCATIONS_ID: "locations",
+    HISTORIC_ID: "historic",
+    ACTIVE_INC_ID: "active_incidents",
+    PAST_INC_ID: "past_incidents"
+}
+
+DATA_DIR = os.getenv("LOGISTICA_DATA_DIR", ".logistica")
+
+NOTION_RELATION_LIMIT = 100
+SNAPSHOT_TTL = 600
+SHIPMENT_STATUS_PROPERTY = os.getenv("LOGISTICA_STATUS_PROPERTY", "Estado envío")
+HEADPHONES_PROPERTY = os.getenv("LOGISTICA_HEADPHONES_PROPERTY", "Cascos")
+
+headers = {
+    "Authorization": f"Bearer {NOTION_TOKEN}",
+    "Content-Type": "application/json",
+    "Notion-Version": NOTION_VERSION,
+}
+
+def iso_to_date(s):
+    try:
+        return datetime.fromisoformat(s).date()
+    except:
+        return None
+
+@st.cache_resource
+def get_circuit_breaker():
+    return notion_api.CircuitBreaker(
+        threshold=int(os.getenv("LOGISTICA_BREAKER_THRESHOLD", "5")),
+        reset_after=int(os.getenv("LOGISTICA_BREAKER_RESET", "30"))
+    )
+
+@st.cache_resource
+def get_notion_client():
+    return notion_async.AsyncNotionClient(
+        headers,
+        breaker=get_circuit_breaker(),
+        rate=float(os.getenv("LOGISTICA_NOTION_RATE", "3")),
+        burst=int(os.getenv("LOGISTICA_NOTION_BURST", "10")),
+        database_names=DATABASE_NAMES
+    )
+
+@st.cache_resource
+def get_query_cache():
+    return query_cache.ProjectedQueryCache(int(float(os.getenv("LOGISTICA_QUERY_CACHE_MB", "16")) * 1024 * 1024))
+
+def query_pages(db, payload):
+    results = get_notion_client().query_sync(db, payload)
+    
+    if results is None:
+        st.error(f"Error fetching database {db}")
+    
+    return results
+
+@st.cache_resource
+def get_single_flight():
+    return singleflight.SingleFlight()
+
+def q(db, payload=None, project=None, ttl=300):
+    if payload is None:
+        payload = {"page_size": 100}
+    
+    payload_key = json.dumps(payload, sort_keys=True)
+    database = DATABASE_NAMES.get(db, db)
+    low_priority = notion_async.is_low_priority()
+    
+    if project is None:
+        with metrics.timer("query_seconds", database=database):
+            return get_single_flight().do((db, payload_key, low_priority), lambda: query_pages(db, payload)) or []
+    
+    cache = get_query_cache()
+    key = (db, payload_key, project.__name__, ttl)
+    records = cache.get(key)
+    if records is not None:
+        metrics.inc("query_cache_total", database=database, result="hit")
+        return records
+    metrics.inc("query_cache_total", database=database, result="miss")
+    
+    def load():
+        pages = query_pages(db, payload)
+        if pages is None:
+            return []
+        return cache.set(key, [project(p) for p in pages])
+    
+    with metrics.timer("query_seconds", database=database):
+        return get_single_flight().do(key + (low_priority,), load)
+
+def available(dev, start, end):
+    ds = iso_to_date(dev.get("Start"))
+    de = iso_to_date(dev.get("End"))
+    
+    if not ds and not de:
+        return True
+    if ds and de:
+        return not (start <= de and end >= ds)
+    if ds and not de:
+        return end < ds
+    if de and not ds:
+        return start > de
+    return True
+
+def create_page_step(database_id, properties, label="Crear página", writes=None):
+    return saga.step(
+        "POST",
+        "pages",
+        {"parent": {"database_id": database_id}, "properties": properties},
+        label=label,
+        compensate=saga.step("PATCH", f"pages/{saga.SELF_REF}", {"archived": True}),
+        writes=writes or [database_id]
+    )
+
+def update_page_step(page_id, database_id, properties=None, archived=None, label="Actualizar página", compensate=None, writes=None):
+    body = {}
+    if properties is not None:
+        body["properties"] = properties
+    if archived is not None:
+        body["archived"] = archived
+        if properties is None and compensate is None:
+            compensate = {"archived": not archived}
+    return saga.step(
+        "PATCH",
+        f"pages/{page_id}",
+        body,
+        label=label,
+        compensate=saga.step("PATCH", f"pages/{page_id}", compensate) if compensate else None,
+        writes=writes or [database_id]
+    )
+
+def location_relation(loc_ids):
+    return {"Location": {"relation": [{"id": loc_id} for loc_id in loc_ids]}}
+
+def date_property(iso):
+    return {"date": {"start": iso} if iso else None}
+
+def assign_device(dev_id, loc_id):
+    dev = next((d for d in load_devices() if d["id"] == dev_id), None)
+    previous = dev["location_ids"] if dev else []
+    return update_page_step(
+        dev_id,
+        DEVICES_ID,
+        location_relation([loc_id]),
+        label="Asignar dispositivo",
+        compensate={"properties": location_relation(previous)}
+    )
+
+def client_location_step(client_name, start_date, end_date, devices_property=None, device_ids=()):
+    properties = {
+        "Name": {"title": [{"text": {"content": client_name}}]},
+        "Type": {"select": {"name": "Client"}},
+        "Start Date": {"date": {"start": start_date.isoformat()}},
+        "End Date": {"date": {"start": end_date.isoformat()}}
+    }
+    writes = [LOCATIONS_ID]
+    if devices_property:
+        properties[devices_property] = {"relation": [{"id": did} for did in device_ids]}
+        writes.append(DEVICES_ID)
+    return create_page_step(LOCATIONS_ID, properties, label="Crear envío", writes=writes)
+
+@st.cache_data(ttl=3600)
+def load_locations_schema():
+    r = notion_api.request("GET", f"databases/{LOCATIONS_ID}", headers, breaker=get_circuit_breaker())
+    r.raise_for_status()
+    return r.json().get("properties", {})
+
+def load_locations_devices_property():
+    for name, prop in load_locations_schema().items():
+        if prop.get("type") != "relation":
+            continue
+        relation = prop["relation"]
+        if relation.get("database_id", "").replace("-", "") != DEVICES_ID:
+            continue
+        if relation.get("type") == "dual_property" and relation.get("dual_property", {}).get("synced_property_name") == "Location":
+            return name, prop["id"]
+    return None
+
+def locations_devices_property():
+    try:
+        return load_locations_devices_property()
+    except:
+        return None
+
+def new_shipment_steps(client_name, start_date, end_date, device_ids):
+    """Envío nuevo: si la relación de Ubicaciones es doble se crea con los dispositivos y se liberan de sus ubicaciones
+    anteriores, releyendo cada relación al ejecutar el paso. Si no, un PATCH por dispositivo."""
+    devices_property = locations_devices_property()
+    moved = set(device_ids)
+    devices = get_overlay().apply(load_datasets(['devices', 'location_records']), derive_views)['devices']
+    
+    sources = {}
+    for dev in devices:
+        for loc_id in dev["location_ids"]:
+            if dev["id"] in moved:
+                sources.setdefault(loc_id, []).append(dev["id"])
+    
+    if (
+        not devices_property
+        or len(device_ids) > NOTION_RELATION_LIMIT
+        or any(optimistic.is_pending_id(loc_id) for loc_id in sources)
+    ):
+        steps = [client_location_step(client_name, start_date, end_date)]
+        steps += [assign_device(did, "$result:0") for did in device_ids]
+        return steps
+    
+    name, property_id = devices_property
+    steps = [client_location_step(client_name, start_date, end_date, name, device_ids)]
+    steps[0]["touches"] = list(device_ids)
+    for loc_id, released in sources.items():
+        path = f"pages/{loc_id}"
+        steps.append(saga.step(
+            "PATCH",
+            path,
+            label="Liberar dispositivos",
+            after=[0],
+            writes=[LOCATIONS_ID, DEVICES_ID],
+            relation=saga.relation_edit(name, property_id, remove=released),
+            touches=released,
+            compensate={"method": "PATCH", "path": path, "relation": saga.relation_edit(name, property_id, add=released)}
+        ))
+    return steps
+
+def historic_checkin_step(dev, location_id):
+    properties = {
+        "Name": {"title": [{"text": {"content": dev['Name']}}]},
+        "Tags": {"select": {"name": dev["Tags"]}} if dev.get("Tags") else None,
+        "SN": {"rich_text": [{"text": {"content": dev.get("SN", "")}}]},
+        "Location": {"relation": [{"id": location_id}]},
+        "Start Date": {"date": {"start": dev["Start"]}} if dev.get("Start") else None,
+        "End Date": {"date": {"start": dev["End"]}} if dev.get("End") else None,
+        "Check In": {"date": {"start": date.today().isoformat()}}
+    }
+    
+    return create_page_step(HISTORIC_ID, {k: v for k, v in properties.items() if v is not None}, label="Check-in")
+
+@st.cache_resource
+def get_bus():
+    return bus.VersionBus()
+
+def data_version():
+    return get_bus().version
+
+@st.cache_resource
+def get_event_log():
+    return events.EventLog(os.path.join(DATA_DIR, "events.jsonl"))
+
+@st.cache_resource
+def get_overlay():
+    overlay = optimistic.OptimisticOverlay()
+    get_event_log().subscribe("overlay", overlay)
+    return overlay
+
+def record_event(kind, **fields):
+    get_overlay()
+    event = get_event_log().append(kind, **fields)
+    get_bus().publish(kind)
+    return event
+
+def reconcile_operation(op):
+    if op["status"] == "done":
+        record_event(
+            "operation_done",
+            op_id=op["id"],
+            results=op["results"],
+            pages=saga.written_pages(op),
+            duration=time.time() - op["created"]
+        )
+    else:
+        record_event("operation_failed", op_id=op["id"], status=op["status"], error=op["error"])
+    
+    invalidate_sources(op["invalidate"] if isinstance(op["invalidate"], list) else SOURCE_DATABASES)
+    revalidate_snapshot()
+
+@st.cache_resource
+def get_write_queue():
+    wq = WriteQueue(os.path.join(DATA_DIR, "write_queue.jsonl"), get_notion_client())
+    wq.add_listener(reconcile_operation)
+    return wq
+
+def enqueue_operation(label, steps, patches=None):
+    op_id = uuid.uuid4().hex
+    record_event("operation_submitted", op_id=op_id, label=label, patches=patches or [], holder=lease_holder())
+    writes = sorted({db for step in steps for db in step.get("writes", [])})
+    return get_write_queue().submit(label, steps, invalidate=writes, op_id=op_id)
+
+def parse_location(p):
+    props = p["properties"]
+    
+    try:
+        name = props["Name"]["title"][0]["text"]["content"]
+    except:
+        name = "Sin nombre"
+    
+    try:
+        t = props["Type"]["select"]["name"]
+    except:
+        t = None
+    
+    sd = props["Start Date"]["date"]["start"] if props.get("Start Date") and props["Start Date"]["date"] else None
+    ed = props["End Date"]["date"]["start"] if props.get("End Date") and props["End Date"]["date"] else None
+    
+    shipping = props.get(SHIPMENT_STATUS_PROPERTY) or {}
+    status = (shipping.get("select") or shipping.get("status") or {}).get("name")
+    headphones = (props.get(HEADPHONES_PROPERTY) or {}).get("checkbox")
+    
+    return {"id": p["id"], "name": name, "type": t, "start": sd, "end": ed, "status": status, "headphones": headphones}
+
+@swr.stale_while_revalidate(ttl=900)
+def load_location_records():
+    return [parse_location(p) for p in q(LOCATIONS_ID)]
+
+def complete_relations(pages, prop):
+    truncated = [
+        (p["id"], p["properties"][prop]["id"]) for p in pages
+        if (p["properties"].get(prop) or {}).get("has_more")
+    ]
+    if not truncated:
+        return {}
+    
+    full = get_notion_client().relation_ids_many(truncated)
+    return {page_id: ids for (page_id, _), ids in zip(truncated, full) if ids is not None}
+
+@swr.stale_while_revalidate(ttl=900)
+def load_devices():
+    results = q(DEVICES_ID)
+    full_locations = complete_relations(results, "Location")
+    out = []
+    
+    for p in results:
+        props = p["properties"]
+        
+        name = props["Name"]["title"][0]["text"]["content"] if props["Name"]["title"] else "Sin nombre"
+        
+        tag = props["Tags"]["select"]["name"] if props.get("Tags") and props["Tags"]["select"] else None
+        
+        if p["id"] in full_locations:
+            locs = full_locations[p["id"]]
+        else:
+            locs = [r["id"] for r in props["Location"]["relation"]] if props.get("Location") and props["Location"]["relation"] else []
+        
+        try:
+            sn = props["SN"]["rich_text"][0]["text"]["content"]
+        except:
+            sn = ""
+        
+        def roll(field):
+            try:
+                rr = props[field]["rollup"]
+                if rr.get("array"):
+                    return rr["array"][0]["date"]["start"]
+                if rr.get("date"):
+                    return rr["date"]["start"]
+            except:
+                return None
+        
+        out.append({
+            "id": p["id"],
+            "Name": name,
+            "Tags": tag,
+            "SN": sn,
+            "location_ids": locs,
+            "Start": roll("Start Date"),
+            "End": roll("End Date"),
+            "edited": p.get("last_edited_time")
+        })
+    
+    out = sorted(out, key=lambda x: x["Name"])
+    return out
+
+@swr.stale_while_revalidate(ttl=300)
+def load_historic_records():
+    out = []
+    
+    for entry in q(HISTORIC_ID):
+        hist_props = entry["properties"]
+        hist_loc = hist_props.get("Location", {}).get("relation", [])
+        checkin_prop = hist_props.get("Check In", {}).get("date", {})
+        
+        out.append({
+            "id": entry["id"],
+            "location_id": hist_loc[0]["id"] if hist_loc else None,
+            "check_in": checkin_prop.get("start") if checkin_prop else None
+        })
+    
+    return out
+
+def count_devices_by_location(devices):
+    counts = {}
+    for d in devices:
+        for lid in d["location_ids"]:
+            counts[lid] = counts.get(lid, 0) + 1
+    return counts
+
+def derive_future_locations(records, devices):
+    counts = count_devices_by_location(devices)
+    out = []
+    
+    for r in records:
+        out.append({
+            "id": r["id"],
+            "name": r["name"],
+            "start": r["start"],
+            "end": r["end"],
+            "device_count": counts.get(r["id"], 0)
+        })
+    
+    return out
+
+def derive_active_locations(records, devices, today):
+    counts = count_devices_by_location(devices)
+    out = []
+    
+    for r in records:
+        sd = r["start"]
+        ed = r["end"]
+        start_date = iso_to_date(sd)
+        
+        if ed:
+            end_date = iso_to_date(ed)
+            days_until_end = (end_date - today).days
+            days_since_start = (today - start_date).days
+            total_days = (end_date - start_date).days
+        else:
+            end_date = None
+            days_since_start = (today - start_date).days
+            days_until_end = None
+            total_days = None
+        
+        out.append({
+            "id": r["id"],
+            "name": r["name"],
+            "start": sd,
+            "end": ed,
+            "device_count": counts.get(r["id"], 0),
+            "start_date_obj": start_date,
+            "end_date_obj": end_date,
+            "days_since_start": days_since_start,
+            "days_until_end": days_until_end,
+            "total_days": total_days
+        })
+    
+    out = sorted(out, key=lambda x: x["days_until_end"] if x["days_until_end"] is not None else float('inf'))
+    
+    return out
+
+def derive_pending_locations(records, devices):
+    counts = count_devices_by_location(devices)
+    out = []
+    
+    for r in records:
+        ed = r["end"]
+        end_date = iso_to_date(ed)
+        currently_assigned = counts.get(r["id"], 0)
+        
+        if currently_assigned == 0:
+            continue
+        
+        out.append({
+            "id": r["id"],
+            "name": r["name"],
+            "start": r["start"],
+            "end": ed,
+            "device_count": currently_assigned,
+            "end_date_obj": end_date
+        })
+    
+    out = sorted(out, key=lambda x: x["end_date_obj"])
+    
+    return out
+
+def derive_historic_locations(records, devices, historic, today):
+    counts = count_devices_by_location(devices)
+    
+    historic_by_location = {}
+    for entry in historic:
+        historic_by_location.setdefault(entry["location_id"], []).append(entry)
+    
+    out = []
+    
+    for r in records:
+        ed = r["end"]
+        end_date = iso_to_date(ed)
+        
+        if counts.get(r["id"], 0) > 0:
+            continue
+        
+        entries = historic_by_location.get(r["id"], [])
+        historic_count = len(entries)
+        
+        if historic_count == 0 and end_date < today:
+            continue
+        
+        checkin_date = next((e["check_in"] for e in entries if e["check_in"]), None)
+        
+        out.append({
+            "id": r["id"],
+            "name": r["name"],
+            "start": r["start"],
+            "end": ed,
+            "device_count": historic_count,
+            "end_date_obj": end_date,
+            "checkin_date": checkin_date
+        })
+    
+    out = sorted(out, key=lambda x: x["end_date_obj"], reverse=True)
+    
+    return out
+
+def project_page_id(p):
+    return p["id"]
+
+def project_location_name(p):
+    try:
+        name = p["properties"]["Name"]["title"][0]["text"]["content"]
+    except:
+        name = "Sin nombre"
+    
+    return {"id": p["id"], "name": name}
+
+@swr.stale_while_revalidate(ttl=600)
+def load_inhouse():
+    return q(LOCATIONS_ID, {"filter": {"property": "Type", "select": {"equals": "In House"}}}, project=project_location_name, ttl=600)
+
+@swr.stale_while_revalidate(ttl=600)
+def office_id():
+    r = q(LOCATIONS_ID, {"filter": {"property": "Name", "title": {"equals": "Office"}}}, project=project_page_id, ttl=600)
+    oid = r[0] if r else None
+    return oid
+
+@swr.stale_while_revalidate(ttl=180)
+def load_active_incidents():
+    r = q(ACTIVE_INC_ID)
+    out = []
+    
+    for p in r:
+        props = p["properties"]
+        
+        try:
+            name = props["Name"]["title"][0]["text"]["content"]
+        except:
+            name = "Sin nombre"
+        
+        dev = None
+        if "Device" in props and props["Device"]["relation"]:
+            dev = props["Device"]["relation"][0]["id"]
+        
+        created = props.get("Created Date", {}).get("date", {}).get("start")
+        
+        notes = ""
+        if props.get("Notes") and props["Notes"]["rich_text"]:
+            notes = props["Notes"]["rich_text"][0]["text"]["content"]
+        
+        out.append({
+            "id": p["id"],
+            "Name": name,
+            "Device": dev,
+            "Created": created,
+            "Notes": notes
+        })
+    
+    return out
+
+@swr.stale_while_revalidate(ttl=300)
+def load_past_incidents():
+    r = q(PAST_INC_ID)
+    out = []
+    
+    for p in r:
+        props = p["properties"]
+        
+        try:
+            name = props["Name"]["title"][0]["text"]["content"]
+        except:
+            name = "Sin nombre"
+        
+        dev = None
+        if "Device" in props and props["Device"]["relation"]:
+            dev = props["Device"]["relation"][0]["id"]
+        
+        created = props.get("Created Date", {}).get("date", {}).get("start")
+        resolved = props.get("Resolved Date", {}).get("date", {}).get("start")
+        
+        notes = ""
+        if props.get("Notes") and props["Notes"]["rich_text"]:
+            notes = props["Notes"]["rich_text"][0]["text"]["content"]
+        
+        rnotes = ""
+        if props.get("Resolution Notes") and props["Resolution Notes"]["rich_text"]:
+            rnotes = props["Resolution Notes"]["rich_text"][0]["text"]["content"]
+        
+        out.append({
+            "id": p["id"],
+            "Name": name,
+            "Device": dev,
+            "Created": created,
+            "Notes": notes,
+            "Resolved": resolved,
+            "ResolutionNotes": rnotes
+        })
+    
+    return out
+
+def build_incidence_map(active, past):
+    m = {}
+    
+    for inc in active:
+        did = inc["Device"]
+        if not did:
+            continue
+        if did not in m:
+            m[did] = {"active": 0, "total": 0}
+        m[did]["active"] += 1
+        m[did]["total"] += 1
+    
+    for inc in past:
+        did = inc["Device"]
+        if not did:
+            continue
+        if did not in m:
+            m[did] = {"active": 0, "total": 0}
+        m[did]["total"] += 1
+    
+    return m
+
+def get_location_types_for_device(dev, loc_map):
+    types = []
+    for lid in dev.get("location_ids", []):
+        entry = loc_map.get(lid)
+        if entry and entry.get("type"):
+            types.append(entry["type"])
+    
+    uniq = []
+    seen = set()
+    for t in types:
+        if t not in seen:
+            seen.add(t)
+            uniq.append(t)
+    
+    return "  ".join(uniq) if uniq else None
+
+SNAPSHOT_LOADERS = {
+    'location_records': load_location_records,
+    'devices': load_devices,
+    'historic_records': load_historic_records,
+    'inhouse': load_inhouse,
+    'office_id': office_id,
+    'active_incidents': load_active_incidents,
+    'past_incidents': load_past_incidents
+}
+
+@st.cache_resource
+def get_lifecycle():
+    return lifecycle.LifecycleScheduler()
+
+SOURCE_DATABASES = [DEVICES_ID, LOCATIONS_ID, HISTORIC_ID, ACTIVE_INC_ID, PAST_INC_ID]
+
+cache_graph = depgraph.DependencyGraph()
+
+for db in SOURCE_DATABASES:
+    cache_graph.register(f"query_cache:{db}", [db], clear=lambda db=db: get_query_cache().invalidate(db))
+
+cache_graph.register('location_records', [LOCATIONS_ID], clear=load_location_records.clear)
+cache_graph.register('devices', [DEVICES_ID, LOCATIONS_ID], clear=load_devices.clear)
+cache_graph.register('historic_records', [HISTORIC_ID], clear=load_historic_records.clear)
+cache_graph.register('inhouse', [LOCATIONS_ID], clear=load_inhouse.clear)
+cache_graph.register('office_id', [LOCATIONS_ID], clear=office_id.clear)
+cache_graph.register('active_incidents', [ACTIVE_INC_ID], clear=load_active_incidents.clear)
+cache_graph.register('past_incidents', [PAST_INC_ID], clear=load_past_incidents.clear)
+
+cache_graph.register('snapshot', list(SNAPSHOT_LOADERS), clear=lambda: get_snapshot().invalidate())
+
+cache_graph.register(
+    'locations_map', ['location_records'],
+    compute=lambda d: {r["id"]: {"name": r["name"], "type": r["type"]} for r in d['location_records']}
+)
+cache_graph.register(
+    'lifecycle', ['location_records', 'today'],
+    compute=lambda d: get_lifecycle().sync(d['location_records'], date.fromisoformat(d['today']))
+)
+cache_graph.register(
+    'future_locations', ['lifecycle', 'devices'],
+    compute=lambda d: derive_future_locations(d['lifecycle']['future'], d['devices'])
+)
+cache_graph.register(
+    'active_locations', ['lifecycle', 'devices', 'today'],
+    compute=lambda d: derive_active_locations(d['lifecycle']['active'], d['devices'], date.fromisoformat(d['today']))
+)
+cache_graph.register(
+    'pending_locations', ['lifecycle', 'devices'],
+    compute=lambda d: derive_pending_locations(d['lifecycle']['pending'], d['devices'])
+)
+cache_graph.register(
+    'historic_locations', ['lifecycle', 'devices', 'historic_records', 'today'],
+    compute=lambda d: derive_historic_locations(d['lifecycle']['historic'], d['devices'], d['historic_records'], date.fromisoformat(d['today']))
+)
+cache_graph.register(
+    'shipment_candidates', ['future_locations', 'devices'],
+    compute=lambda d: {
+        loc["id"]: [
+            dev for dev in d['devices']
+            if dev.get("location_ids")
+            and available(dev, iso_to_date(loc["start"]), iso_to_date(loc["end"]))
+            and loc["id"] not in dev["location_ids"]
+        ]
+        for loc in d['future_locations']
+    }
+)
+cache_graph.register(
+    'incidence_map', ['active_incidents', 'past_incidents'],
+    compute=lambda d: build_incidence_map(d['active_incidents'], d['past_incidents'])
+)
+
+def invalidate_sources(databases, skip=()):
+    return cache_graph.invalidate(databases, skip)
+
+@metrics.timed("fleet_fetch_seconds")
+def fetch_fleet_data(names=None, on_loaded=None, wait_for=None, on_complete=None):
+    """Carga los datasets en paralelo; con `wait_for` vuelve en cuanto llegan esos y el resto termina en segundo plano"""
+    loaders = {name: loader for name, loader in SNAPSHOT_LOADERS.items() if names is None or name in names}
+    wait_for = set(loaders) if wait_for is None else set(wait_for) & set(loaders)
+    loaded_at = time.time()
+    event_seq = get_event_log().sync()
+    data = {}
+    pool = ThreadPoolExecutor(max_workers=len(loaders))
+    futures = {pool.submit(contextvars.copy_context().run, loader.latest): name for name, loader in loaders.items()}
+    pending = set(futures)
+    try:
+        for future in as_completed(futures):
+            pending.discard(future)
+            data[futures[future]] = future.result()
+            if on_loaded:
+                on_loaded(futures[future])
+            if wait_for <= set(data):
+                break
+    finally:
+        pool.shutdown(wait=False)
+    
+    if pending and on_complete:
+        def finish():
+            wait(pending)
+            on_complete()
+        threading.Thread(target=finish, daemon=True).start()
+    elif on_complete:
+        on_complete()
+    
+    data['loaded_at'] = loaded_at
+    data['event_seq'] = event_seq
+    return data
+
+@st.cache_resource
+def get_snapshot():
+    return snapshot.FleetSnapshot(os.path.join(DATA_DIR, "fleet.arrow"), derive=derive_views)
+
+@st.cache_resource
+def get_snapshot_lock():
+    return threading.Lock()
+
+def refresh_snapshot():
+    snap = get_snapshot()
+    with get_snapshot_lock():
+        snap.lock_refresh(blocking=True)
+        try:
+            data = snap.read()
+            if data is not None and not snap.is_stale(data, SNAPSHOT_TTL):
+                return data
+            data = snap.write(fetch_fleet_data())
+            get_bus().publish("snapshot")
+            return data
+        finally:
+            snap.unlock_refresh()
+
+def revalidate_snapshot(low_priority=False):
+    lock = get_snapshot_lock()
+    if not lock.acquire(blocking=False):
+        return
+    
+    def run():
+        snap = get_snapshot()
+        if not snap.lock_refresh():
+            lock.release()
+            return
+        try:
+            with notion_async.low_priority() if low_priority else contextlib.nullcontext():
+                data = snap.write(fetch_fleet_data())
+                while snap.is_stale(data, SNAPSHOT_TTL):
+                    data = snap.write(fetch_fleet_data())
+            get_bus().publish("snapshot")
+        except:
+            pass
+        finally:
+            snap.unlock_refresh()
+            lock.release()
+    
+    threading.Thread(target=run, daemon=True).start()
+
+def snapshot_refreshing():
+    return get_snapshot_lock().locked()
+
+def warm_caches():
+    data = get_snapshot().read()
+    if data is not None:
+        for name, loader in SNAPSHOT_LOADERS.items():
+            loader.seed(data[name], data['loaded_at'])
+    refresh_snapshot()
+
+def sources_changed(databases):
+    get_event_log().append("sources_changed", databases=databases, pid=os.getpid())
+    invalidate_sources(databases)
+    revalidate_snapshot()
+
+def sources_changed_elsewhere(databases):
+    """Cambios que ha detectado el proceso que sondea: él ya refresca la instantánea compartida"""
+    invalidate_sources(databases, skip=['snapshot'])
+
+@st.cache_resource
+def get_change_feed():
+    feed = sync.ChangeFeed(on_change=sources_changed_elsewhere)
+    get_event_log().subscribe("changes", feed)
+    return feed
+
+def own_writes():
+    get_event_log().sync()
+    return get_change_feed().written()
+
+@st.cache_resource
+def get_sync_worker():
+    get_change_feed()
+    worker = sync.SyncWorker(
+        SOURCE_DATABASES,
+        q,
+        warm=warm_caches,
+        on_change=sources_changed,
+        interval=int(os.getenv("LOGISTICA_SYNC_INTERVAL", "30")),
+        lock_path=os.path.join(DATA_DIR, "sync.lock"),
+        own_writes=own_writes
+    ).start()
+    
+    if os.getenv("LOGISTICA_HEALTH_PORT"):
+        sync.serve_health(
+            int(os.getenv("LOGISTICA_HEALTH_PORT")),
+            worker,
+            extra_status=lambda: {"query_cache": get_query_cache().stats(), "notion": get_circuit_breaker().status()},
+            metrics=metrics.REGISTRY.render
+        )
+    return worker
+
+SECTION_DATASETS = {
+    "Disponibles para Alquilar": ['devices', 'locations_map', 'incidence_map'],
+    "Gafas en casa": ['devices', 'inhouse', 'office_id', 'locations_map', 'incidence_map'],
+    "Almacén": ['devices', 'locations_map', 'incidence_map', 'future_locations', 'active_locations', 'pending_locations', 'shipment_candidates'],
+    "Recepcionar": ['historic_locations'],
+    "Incidencias": ['devices', 'active_incidents', 'past_incidents', 'locations_map', 'incidence_map']
+}
+
+SECTION_DEFERRED = {
+    "Disponibles para Alquilar": ['incidence_map'],
+    "Gafas en casa": ['incidence_map'],
+    "Almacén": ['incidence_map'],
+    "Incidencias": ['locations_map']
+}
+
+DATASET_LABELS = {
+    'location_records': "Ubicaciones",
+    'devices': "Dispositivos",
+    'historic_records': "Histórico",
+    'inhouse': "Gafas en casa",
+    'office_id': "Office",
+    'active_incidents': "Incidencias activas",
+    'past_incidents': "Incidencias resueltas",
+    'incidence_map': "Contadores de incidencias",
+    'locations_map': "Tipos de ubicación"
+}
+
+def load_datasets(names, on_progress=None, deferred=()):
+    """Datos desde la instantánea; sin ella se piden a Notion y se vuelve sin esperar a las vistas `deferred`,
+    que quedan vacías y listadas en 'loading' hasta que la nueva instantánea vuelve a pintar la sección"""
+    snap = get_snapshot()
+    data = snap.read()
+    
+    if data is not None:
+        if data['today'] != get_lifecycle().today().isoformat():
+            data = snap.rederive()
+        if snap.is_stale(data, SNAPSHOT_TTL):
+            revalidate_snapshot(low_priority=notion_async.is_low_priority())
+        return data
+    
+    needed = cache_graph.upstream(names) | set(names)
+    needed = [name for name in SNAPSHOT_LOADERS if name in needed]
+    loaded = []
+    
+    def on_loaded(name):
+        loaded.append(name)
+        if on_progress:
+            on_progress(needed, loaded)
+    
+    if on_progress:
+        on_progress(needed, loaded)
+    required = [name for name in names if name not in deferred]
+    required = cache_graph.upstream(required) | set(required)
+    data = derive_views(fetch_fleet_data(
+        needed,
+        on_loaded,
+        wait_for=required,
+        on_complete=lambda: revalidate_snapshot(low_priority=True)
+    ))
+    
+    data['loading'] = [name for name in deferred if name not in data]
+    for name in data['loading']:
+        data[name] = {}
+    return data
+
+def section_data(section, on_progress=None):
+    get_event_log().sync()
+    return get_overlay().apply(
+        load_datasets(SECTION_DATASETS[section], on_progress, SECTION_DEFERRED.get(section, ())),
+        derive_views
+    )
+
+@st.cache_resource
+def get_prefetcher():
+    def warm(view):
+        with notion_async.low_priority():
+            section_data(view)
+    
+    return prefetch.Prefetcher(
+        prefetch.NavigationStats(os.path.join(DATA_DIR, "navigation.json")),
+        warm,
+        limit=int(os.getenv("LOGISTICA_PREFETCH_LIMIT", "2"))
+    )
+
+def prefetch_next(view):
+    previous = st.session_state.get('last_view')
+    st.session_state.last_view = view
+    get_prefetcher().visited(previous, view)
+
+@st.cache_resource
+def get_leases():
+    return leases.LeaseTable(os.path.join(DATA_DIR, "leases.json"), ttl=int(os.getenv("LOGISTICA_LEASE_TTL", "120")))
+
+def lease_holder():
+    if 'lease_holder' not in st.session_state:
+        st.session_state.lease_holder = uuid.uuid4().hex
+    return st.session_state.lease_holder
+
+def reserve_devices(device_ids):
+    return get_leases().acquire(lease_holder(), device_ids)
+
+def release_devices(device_ids=None):
+    get_leases().release(lease_holder(), device_ids)
+
+def reserved_elsewhere():
+    return get_leases().held_by_others(lease_holder())
+
+def push_shipment_state(loc_id, state):
+    if optimistic.is_pending_id(loc_id):
+        loc_id = get_overlay().resolved_id(loc_id)
+        if not loc_id:
+            return False
+    
+    try:
+        schema = load_locations_schema()
+    except:
+        return False
+    
+    properties = {}
+    status_prop = schema.get(SHIPMENT_STATUS_PROPERTY) or {}
+    if status_prop.get("type") in ("select", "status"):
+        properties[SHIPMENT_STATUS_PROPERTY] = {status_prop["type"]: {"name": state["status"]}}
+    if (schema.get(HEADPHONES_PROPERTY) or {}).get("type") == "checkbox":
+        properties[HEADPHONES_PROPERTY] = {"checkbox": state["headphones"]}
+    
+    if not properties:
+        return True
+    
+    status, _, _ = get_notion_client().send_many([("PATCH", f"pages/{loc_id}", {"properties": properties})])[0]
+    return status == 200
+
+@st.cache_resource
+def get_shipment_states():
+    return shipment_state_store.ShipmentStateStore(os.path.join(DATA_DIR, "shipment_state.json"), push=push_shipment_state)
+
+def shipment_state(loc_id):
+    return get_shipment_states().get(loc_id)
+
+def set_shipment_state(loc_id, **fields):
+    get_shipment_states().set(loc_id, **fields)
+    get_bus().publish("shipment_state")
+
+def changed_devices(device_ids):
+    cached = {d["id"]: d for d in load_datasets(['devices'])['devices']}
+    own = get_overlay().patched_device_ids(lease_holder())
+    ids = [i for i in device_ids if i in cached and i not in own]
+    if not ids:
+        return []
+    
+    responses = get_notion_client().send_many([("GET", f"pages/{i}", None) for i in ids])
+    changed = []
+    
+    for device_id, (status, page, _) in zip(ids, responses):
+        if status != 200:
+            continue
+        
+        dev = cached[device_id]
+        relation = page["properties"].get("Location") or {}
+        fresh_locations = {r["id"] for r in relation.get("relation", [])}
+        
+        if dev.get("edited") and page.get("last_edited_time") != dev["edited"]:
+            changed.append(dev)
+        elif not relation.get("has_more") and fresh_locations != set(dev["location_ids"]):
+            changed.append(dev)
+    
+    if changed:
+        sources_changed([DEVICES_ID])
+    return changed
+
+def count_active_incidents():
+    """Solo a partir de la instantánea: sin ella el menú se pinta sin contador y se completa al publicarse"""
+    data = get_snapshot().read()
+    if data is None:
+        return 0
+    return len(get_overlay().apply(data, derive_views)['active_incidents'])
+
+def derive_views(data, previous=None):
+    data['today'] = get_lifecycle().today().isoformat()
+    with metrics.timer("derive_seconds"):
+        data = cache_graph.derive(data, previous)
+    
+    if 'location_records' in data and (previous is None or data['location_records'] is not previous.get('location_records')):
+        get_shipment_states().seed(data['location_records'], data['loaded_at'])
+    return data
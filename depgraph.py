@@ -0,0 +1,81 @@
+class DependencyGraph:
+    """Grafo declarativo de cachés: cada nodo declara qué bases de datos de Notion u otros nodos lee"""
+
+    def __init__(self):
+        self._reads = {}
+        self._clear = {}
+        self._compute = {}
+
+    def register(self, name, reads, clear=None, compute=None):
+        """`clear` invalida una caché; `compute(data)` calcula una vista derivada a partir de sus entradas"""
+        self._reads[name] = set(reads)
+        self._clear[name] = clear
+        self._compute[name] = compute
+
+    def reads(self, name):
+        return self._reads[name]
+
+    def upstream(self, names):
+        """Nodos y fuentes de los que dependen `names`, directa o transitivamente"""
+        needed = set()
+        frontier = list(names)
+        while frontier:
+            for dep in self._reads.get(frontier.pop(), ()):
+                if dep not in needed:
+                    needed.add(dep)
+                    frontier.append(dep)
+        return needed
+
+    def downstream(self, sources):
+        """Nodos afectados directa o transitivamente por `sources`, en orden topológico"""
+        frontier = set(sources)
+        changed = True
+        while changed:
+            changed = False
+            for name, reads in self._reads.items():
+                if name not in frontier and reads & frontier:
+                    frontier.add(name)
+                    changed = True
+
+        pending = [name for name in self._reads if name in frontier and name not in sources]
+        affected = []
+        while pending:
+            ready = [name for name in pending if not self._reads[name] & set(pending)]
+            if not ready:
+                raise ValueError(f"Dependencias circulares entre {sorted(pending)}")
+            affected.extend(ready)
+            pending = [name for name in pending if name not in ready]
+        return affected
+
+    def invalidate(self, sources, skip=()):
+        affected = self.downstream(sources)
+        for name in affected:
+            if self._clear[name] and name not in skip:
+                self._clear[name]()
+        return affected
+
+    def views(self):
+        """Vistas derivadas en orden topológico"""
+        order = self.downstream(set().union(*self._reads.values()) - set(self._reads))
+        return [name for name in order if self._compute[name]]
+
+    def derive(self, data, previous=None):
+        """Calcula las vistas cuyas entradas están en `data`; las que no han cambiado se reutilizan de `previous`"""
+        for name in self.views():
+            if any(i not in data for i in self._reads[name]):
+                continue
+            if previous is not None and name in previous and all(
+                _same(data.get(i), previous.get(i)) for i in self._reads[name]
+            ):
+                data[name] = previous[name]
+            else:
+                data[name] = self._compute[name](data)
+        return data
+
+
+def _same(a, b):
+    if a is b:
+        return True
+    if isinstance(a, str) and isinstance(b, str):
+        return a == b
+    return False
@@ -1,8 +1,8 @@
 import streamlit as st
-import requests
 from datetime import datetime, date
 import os
 from dotenv import load_dotenv
+import notion_api
 load_dotenv()
 
 # ---------------- CONFIG ----------------
@@ -33,7 +33,11 @@ def q(db, payload=None):
     """Consulta una base de datos de Notion"""
     if payload is None:
         payload = {"page_size": 200}
-    r = requests.post(f"https://api.notion.com/v1/databases/{db}/query", json=payload, headers=headers)
+    try:
+        r = notion_api.request("POST", f"databases/{db}/query", headers, json=payload)
+    except notion_api.NotionUnavailable as e:
+        st.error(f"❌ Notion no responde: {e}")
+        st.stop()
     return r.json().get("results", [])
 
 # ---------------- MAIN ----------------
@@ -0,0 +1,550 @@
+import streamlit as st
+from datetime import date
+import optimistic
+from data_layer import (
+    LOCATIONS_ID,
+    assign_device,
+    changed_devices,
+    enqueue_operation,
+    historic_checkin_step,
+    iso_to_date,
+    load_active_incidents,
+    load_devices,
+    new_shipment_steps,
+    office_id,
+    release_devices,
+    reserve_devices,
+    update_page_step
+)
+from ui import dialog, set_expander_open
+
+def hold_devices(device_ids):
+    taken = reserve_devices(device_ids)
+    if taken:
+        names = {d["id"]: d["Name"] for d in load_devices()}
+        st.error("🔒 **Otro operador tiene abierta ahora mismo una asignación con:**")
+        for device_id in taken:
+            st.write(f"• {names.get(device_id, device_id)}")
+        st.warning("Cancela y elige otros dispositivos, o espera a que confirme o cierre su diálogo.")
+    return taken
+
+def conflicts_key(device_ids):
+    return "conflicts:" + ",".join(sorted(device_ids))
+
+def clear_conflicts():
+    for key in [k for k in st.session_state if isinstance(k, str) and k.startswith("conflicts:")]:
+        del st.session_state[key]
+
+def find_conflicts(device_ids):
+    changed = changed_devices(device_ids)
+    if changed:
+        st.session_state[conflicts_key(device_ids)] = [d["Name"] for d in changed]
+    return changed
+
+def override_conflicts(device_ids):
+    names = st.session_state.get(conflicts_key(device_ids))
+    if not names:
+        return False
+    
+    st.error("⚠️ **Otro operador ha modificado estos dispositivos** desde que se cargaron los datos:")
+    for name in names:
+        st.write(f"• {name}")
+    st.warning("Cancela y revisa los datos actualizados, o continúa para sobrescribir sus cambios.")
+    
+    if st.button("Continuar de todos modos", use_container_width=True):
+        del st.session_state[conflicts_key(device_ids)]
+        return True
+    return False
+
+@dialog("⚠️ Asignar dispositivos a cliente", on_open=clear_conflicts)
+def confirm_assign_client(client_name, device_count, start_date, end_date, selected_devices):
+    st.write(f"**Vas a crear un nuevo envío:**")
+    st.write(f"• Cliente: **{client_name}**")
+    st.write(f"• Dispositivos: **{device_count}**")
+    st.write(f"• Desde: **{start_date.strftime('%d/%m/%Y')}**")
+    st.write(f"• Hasta: **{end_date.strftime('%d/%m/%Y')}**")
+    
+    total_days = (end_date - start_date).days
+    st.write(f"• Duración: **{total_days} días**")
+    
+    st.markdown("---")
+    st.write("📦 **Dispositivos a asignar:**")
+    
+    devices = load_devices()
+    incidents = load_active_incidents()
+    incident_map_local = {}
+    for inc in incidents:
+        did = inc.get("Device")
+        if did:
+            if did not in incident_map_local:
+                incident_map_local[did] = []
+            incident_map_local[did].append(inc)
+    
+    devices_with_issues = 0
+    
+    for dev_id in selected_devices:
+        dev = next((d for d in devices if d["id"] == dev_id), None)
+        if not dev:
+            continue
+        
+        dev_incidents = incident_map_local.get(dev_id, [])
+        
+        if dev_incidents:
+            devices_with_issues += 1
+            for inc in dev_incidents:
+                st.markdown(f"⚠️ **{dev['Name']}** - Incidencia activa: *\"{inc['Name']}\"*")
+        else:
+            st.markdown(f"✅ {dev['Name']}")
+    
+    if devices_with_issues > 0:
+        st.warning(f"⚠️ **ADVERTENCIA:** {devices_with_issues} dispositivo(s) tienen incidencias activas. Se recomienda resolver las incidencias antes de asignar.")
+    
+    st.markdown("---")
+    st.info("Se creará una nueva ubicación y se asignarán los dispositivos seleccionados.")
+    
+    taken = hold_devices(selected_devices)
+    
+    col1, col2 = st.columns(2)
+    with col1:
+        if st.button("Cancelar", use_container_width=True):
+            release_devices(selected_devices)
+            clear_conflicts()
+            st.rerun()
+    with col2:
+        confirmed = st.button("Confirmar", use_container_width=True, type="primary", disabled=bool(taken))
+    
+    if (confirmed and not find_conflicts(selected_devices)) or override_conflicts(selected_devices):
+        steps = new_shipment_steps(client_name, start_date, end_date, selected_devices)
+        
+        new_loc_id = optimistic.pending_id()
+        patches = [
+            optimistic.create_location_patch(new_loc_id, client_name, "Client", start_date.isoformat(), end_date.isoformat(), step=0),
+            optimistic.assign_patch(selected_devices, new_loc_id)
+        ]
+
+        enqueue_operation(
+            f"Nuevo envío {client_name} ({device_count} dispositivos)",
+            steps,
+            patches
+        )
+        release_devices(selected_devices)
+        st.rerun()
+
+@dialog("⚠️ Check-In de dispositivo")
+def confirm_checkin(device_name, location_name, device_id, location_id, device_data):
+    st.write(f"**Vas a recepcionar el dispositivo:**")
+    st.write(f"• Dispositivo: **{device_name}**")
+    st.write(f"• Del envío: **{location_name}**")
+    st.info("Se registrará en el histórico y volverá a oficina.")
+    
+    col1, col2 = st.columns(2)
+    with col1:
+        if st.button("Cancelar", use_container_width=True):
+            st.rerun()
+    with col2:
+        if st.button("Confirmar", use_container_width=True, type="primary"):
+            enqueue_operation(
+                f"Check-in {device_name} ({location_name})",
+                [
+                    historic_checkin_step(device_data, location_id),
+                    assign_device(device_id, office_id())
+                ],
+                [
+                    optimistic.add_historic_patch(optimistic.pending_id(), location_id, date.today().isoformat(), step=0),
+                    optimistic.assign_patch([device_id], office_id())
+                ]
+            )
+
+            set_expander_open(f"expander_pending_loc_{location_id}")
+            st.session_state.keep_almacen_tab = True
+            st.rerun()
+
+@dialog("⚠️ Devolver dispositivo a oficina")
+def confirm_return_device(device_name, location_name, device_id, expander_key):
+    st.write(f"**Vas a devolver el dispositivo:**")
+    st.write(f"• Dispositivo: **{device_name}**")
+    st.write(f"• Desde: **{location_name}**")
+    st.write(f"• Hacia: **Office**")
+    st.info("El dispositivo volverá a estar disponible en oficina.")
+    
+    col1, col2 = st.columns(2)
+    with col1:
+        if st.button("Cancelar", use_container_width=True):
+            st.rerun()
+    with col2:
+        if st.button("Confirmar", use_container_width=True, type="primary"):
+            enqueue_operation(
+                f"Devolver {device_name} a oficina",
+                [assign_device(device_id, office_id())],
+                [optimistic.assign_patch([device_id], office_id())]
+            )
+            set_expander_open(expander_key)
+            st.rerun()
+
+@dialog("⚠️ Quitar dispositivo del envío")
+def confirm_remove_device(device_name, location_name, device_id, expander_key):
+    st.write(f"**Vas a quitar el dispositivo:**")
+    st.write(f"• Dispositivo: **{device_name}**")
+    st.write(f"• Del envío: **{location_name}**")
+    st.info("El dispositivo volverá a oficina.")
+    
+    col1, col2 = st.columns(2)
+    with col1:
+        if st.button("Cancelar", use_container_width=True):
+            st.rerun()
+    with col2:
+        if st.button("Confirmar", use_container_width=True, type="primary"):
+            enqueue_operation(
+                f"Quitar {device_name} de {location_name}",
+                [assign_device(device_id, office_id())],
+                [optimistic.assign_patch([device_id], office_id())]
+            )
+            set_expander_open(expander_key)
+            st.rerun()
+
+@dialog("⚠️ Borrar envío")
+def confirm_delete_shipment(location_name, location_id):
+    st.write(f"**Vas a eliminar el envío:**")
+    st.write(f"• Cliente: **{location_name}**")
+    st.warning("Esta acción no se puede deshacer.")
+    
+    col1, col2 = st.columns(2)
+    with col1:
+        if st.button("Cancelar", use_container_width=True):
+            st.rerun()
+    with col2:
+        if st.button("Confirmar eliminación", use_container_width=True, type="primary"):
+            enqueue_operation(
+                f"Borrar envío {location_name}",
+                [update_page_step(location_id, LOCATIONS_ID, archived=True)],
+                [optimistic.archive_location_patch(location_id)]
+            )
+            st.rerun()
+
+@dialog("⚠️ Terminar envío")
+def confirm_end_shipment(location_name, device_count, location_id):
+    st.write(f"**Vas a finalizar el envío:**")
+    st.write(f"• Cliente: **{location_name}**")
+    st.write(f"• Dispositivos: **{device_count}**")
+    st.write(f"• Nueva fecha fin: **{date.today().strftime('%d/%m/%Y')}**")
+    st.info("El envío pasará a 'Pendientes de recepcionar'.")
+    
+    col1, col2 = st.columns(2)
+    with col1:
+        if st.button("Cancelar", use_container_width=True):
+            st.rerun()
+    with col2:
+        if st.button("Confirmar", use_container_width=True, type="primary"):
+            enqueue_operation(
+                f"Terminar envío {location_name}",
+                [update_page_step(location_id, LOCATIONS_ID, {"End Date": {"date": {"start": date.today().isoformat()}}})],
+                [optimistic.update_location_patch(location_id, end=date.today().isoformat())]
+            )
+            st.rerun()
+
+@dialog("⚠️ Añadir dispositivos al envío", on_open=clear_conflicts)
+def confirm_add_devices(location_name, device_count, location_id, selected_devices, expander_key):
+    st.write(f"**Vas a añadir dispositivos:**")
+    st.write(f"• Al envío: **{location_name}**")
+    st.write(f"• Cantidad: **{device_count}**")
+    
+    st.markdown("---")
+    st.write("📦 **Dispositivos a añadir:**")
+    
+    devices = load_devices()
+    incidents = load_active_incidents()
+    incident_map_local = {}
+    for inc in incidents:
+        did = inc.get("Device")
+        if did:
+            if did not in incident_map_local:
+                incident_map_local[did] = []
+            incident_map_local[did].append(inc)
+    
+    devices_with_issues = 0
+    
+    for dev_id in selected_devices:
+        dev = next((d for d in devices if d["id"] == dev_id), None)
+        if not dev:
+            continue
+        
+        dev_incidents = incident_map_local.get(dev_id, [])
+        
+        if dev_incidents:
+            devices_with_issues += 1
+            for inc in dev_incidents:
+                st.markdown(f"⚠️ **{dev['Name']}** - Incidencia activa: *\"{inc['Name']}\"*")
+        else:
+            st.markdown(f"✅ {dev['Name']}")
+    
+    if devices_with_issues > 0:
+        st.warning(f"⚠️ **ADVERTENCIA:** {devices_with_issues} dispositivo(s) tienen incidencias activas. Se recomienda resolver las incidencias antes de añadir.")
+    
+    st.markdown("---")
+    
+    taken = hold_devices(selected_devices)
+    
+    col1, col2 = st.columns(2)
+    with col1:
+        if st.button("Cancelar", use_container_width=True):
+            release_devices(selected_devices)
+            clear_conflicts()
+            st.rerun()
+    with col2:
+        confirmed = st.button("Confirmar", use_container_width=True, type="primary", disabled=bool(taken))
+    
+    if (confirmed and not find_conflicts(selected_devices)) or override_conflicts(selected_devices):
+        enqueue_operation(
+            f"Añadir {device_count} dispositivos a {location_name}",
+            [assign_device(did, location_id) for did in selected_devices],
+            [optimistic.assign_patch(selected_devices, location_id)]
+        )
+        release_devices(selected_devices)
+        set_expander_open(expander_key)
+        st.rerun()
+
+@dialog("⚠️ Asignar dispositivos a persona", on_open=clear_conflicts)
+def confirm_assign_to_person(person_name, device_count, person_id, selected_devices):
+    st.write(f"**Vas a asignar dispositivos:**")
+    st.write(f"• A: **{person_name}**")
+    st.write(f"• Cantidad: **{device_count}**")
+    
+    st.markdown("---")
+    st.write("📦 **Dispositivos a asignar:**")
+    
+    devices = load_devices()
+    incidents = load_active_incidents()
+    incident_map_local = {}
+    for inc in incidents:
+        did = inc.get("Device")
+        if did:
+            if did not in incident_map_local:
+                incident_map_local[did] = []
+            incident_map_local[did].append(inc)
+    
+    devices_with_issues = 0
+    
+    for dev_id in selected_devices:
+        dev = next((d for d in devices if d["id"] == dev_id), None)
+        if not dev:
+            continue
+        
+        dev_incidents = incident_map_local.get(dev_id, [])
+        
+        if dev_incidents:
+            devices_with_issues += 1
+            for inc in dev_incidents:
+                st.markdown(f"⚠️ **{dev['Name']}** - Incidencia activa: *\"{inc['Name']}\"*")
+        else:
+            st.markdown(f"✅ {dev['Name']}")
+    
+    if devices_with_issues > 0:
+        st.warning(f"⚠️ **ADVERTENCIA:** {devices_with_issues} dispositivo(s) tienen incidencias activas. Se recomienda resolver las incidencias antes de asignar.")
+    
+    st.markdown("---")
+    
+    taken = hold_devices(selected_devices)
+    
+    col1, col2 = st.columns(2)
+    with col1:
+        if st.button("Cancelar", use_container_width=True):
+            release_devices(selected_devices)
+            clear_conflicts()
+            st.rerun()
+    with col2:
+        confirmed = st.button("Confirmar", use_container_width=True, type="primary", disabled=bool(taken))
+    
+    if (confirmed and not find_conflicts(selected_devices)) or override_conflicts(selected_devices):
+        enqueue_operation(
+            f"Asignar {device_count} dispositivos a {person_name}",
+            [assign_device(did, person_id) for did in selected_devices],
+            [optimistic.assign_patch(selected_devices, person_id)]
+        )
+        release_devices(selected_devices)
+        st.rerun()
+
+@dialog("⚠️ Reasignar dispositivos a nuevo proyecto", on_open=clear_conflicts)
+def confirm_reassign_pending(client_name, devices, start_date, end_date, old_loc_id, old_loc_name, device_ids):
+    st.write(f"**Vas a reasignar los dispositivos pendientes:**")
+    st.write(f"• Desde envío: **{old_loc_name}**")
+    st.write(f"• Hacia nuevo proyecto: **{client_name}**")
+    st.write(f"• Dispositivos: **{len(devices)}**")
+    st.write(f"• Desde: **{start_date.strftime('%d/%m/%Y')}**")
+    st.write(f"• Hasta: **{end_date.strftime('%d/%m/%Y')}**")
+    
+    total_days = (end_date - start_date).days
+    st.write(f"• Duración: **{total_days} días**")
+    
+    st.markdown("---")
+    st.write("📦 **Dispositivos a reasignar:**")
+    
+    incidents = load_active_incidents()
+    incident_map_local = {}
+    for inc in incidents:
+        did = inc.get("Device")
+        if did:
+            if did not in incident_map_local:
+                incident_map_local[did] = []
+            incident_map_local[did].append(inc)
+    
+    devices_with_issues = 0
+    
+    for dev in devices:
+        dev_incidents = incident_map_local.get(dev["id"], [])
+        
+        if dev_incidents:
+            devices_with_issues += 1
+            for inc in dev_incidents:
+                st.markdown(f"⚠️ **{dev['Name']}** - Incidencia activa: *\"{inc['Name']}\"*")
+        else:
+            st.markdown(f"✅ {dev['Name']}")
+    
+    if devices_with_issues > 0:
+        st.warning(f"⚠️ **ADVERTENCIA:** {devices_with_issues} dispositivo(s) tienen incidencias activas. Se recomienda resolver las incidencias antes de reasignar.")
+    
+    st.markdown("---")
+    
+    conflicts = []
+    for dev in devices:
+        if dev.get("Start") and dev.get("End"):
+            dev_start = iso_to_date(dev["Start"])
+            dev_end = iso_to_date(dev["End"])
+            
+            if dev_start and dev_end:
+                if not (start_date > dev_end or end_date < dev_start):
+                    conflicts.append(dev["Name"])
+    
+    if conflicts:
+        st.error(f"⚠️ **Conflicto detectado:** Los siguientes dispositivos ya están asignados a otros proyectos en esas fechas:")
+        for dev_name in conflicts:
+            st.write(f"• {dev_name}")
+        st.warning("Si continúas, estos dispositivos tendrán solapamiento de fechas.")
+    
+    st.info("Se hará check-in automático de todos los dispositivos pendientes y se asignarán al nuevo proyecto.")
+    
+    taken = hold_devices(device_ids)
+    
+    col1, col2 = st.columns(2)
+    with col1:
+        if st.button("Cancelar", use_container_width=True):
+            release_devices(device_ids)
+            clear_conflicts()
+            st.rerun()
+    with col2:
+        confirmed = st.button("Confirmar reasignación", use_container_width=True, type="primary", disabled=bool(taken))
+    
+    if (confirmed and not find_conflicts(device_ids)) or override_conflicts(device_ids):
+        steps = new_shipment_steps(client_name, start_date, end_date, device_ids)
+        checkin_offset = len(steps)
+        steps += [historic_checkin_step(dev, old_loc_id) for dev in devices]
+        
+        new_loc_id = optimistic.pending_id()
+        patches = [
+            optimistic.create_location_patch(new_loc_id, client_name, "Client", start_date.isoformat(), end_date.isoformat(), step=0),
+            optimistic.assign_patch(device_ids, new_loc_id)
+        ]
+        patches += [
+            optimistic.add_historic_patch(optimistic.pending_id(), old_loc_id, date.today().isoformat(), step=checkin_offset + i)
+            for i in range(len(devices))
+        ]
+
+        enqueue_operation(
+            f"Reasignar {old_loc_name} → {client_name}",
+            steps,
+            patches
+        )
+        release_devices(device_ids)
+        st.rerun()
+
+@dialog("⚠️ Renovar alquiler", on_open=clear_conflicts)
+def confirm_renew_rental(client_name, devices, start_date, end_date, old_loc_id, old_loc_name, device_ids):
+    st.write(f"**Vas a renovar el alquiler:**")
+    st.write(f"• Alquiler actual: **{old_loc_name}**")
+    st.write(f"• Nuevo alquiler: **{client_name}**")
+    st.write(f"• Dispositivos: **{len(devices)}**")
+    st.write(f"• Desde: **{start_date.strftime('%d/%m/%Y')}**")
+    st.write(f"• Hasta: **{end_date.strftime('%d/%m/%Y')}**")
+    
+    total_days = (end_date - start_date).days
+    st.write(f"• Duración: **{total_days} días**")
+    
+    st.markdown("---")
+    st.write("📦 **Dispositivos a renovar:**")
+    
+    incidents = load_active_incidents()
+    incident_map_local = {}
+    for inc in incidents:
+        did = inc.get("Device")
+        if did:
+            if did not in incident_map_local:
+                incident_map_local[did] = []
+            incident_map_local[did].append(inc)
+    
+    devices_with_issues = 0
+    
+    for dev in devices:
+        dev_incidents = incident_map_local.get(dev["id"], [])
+        
+        if dev_incidents:
+            devices_with_issues += 1
+            for inc in dev_incidents:
+                st.markdown(f"⚠️ **{dev['Name']}** - Incidencia activa: *\"{inc['Name']}\"*")
+        else:
+            st.markdown(f"✅ {dev['Name']}")
+    
+    if devices_with_issues > 0:
+        st.warning(f"⚠️ **ADVERTENCIA:** {devices_with_issues} dispositivo(s) tienen incidencias activas. Se recomienda resolver las incidencias antes de renovar.")
+    
+    st.markdown("---")
+    
+    conflicts = []
+    for dev in devices:
+        if dev.get("Start") and dev.get("End"):
+            dev_start = iso_to_date(dev["Start"])
+            dev_end = iso_to_date(dev["End"])
+            
+            if dev_start and dev_end:
+                if not (start_date > dev_end or end_date < dev_start):
+                    conflicts.append(dev["Name"])
+    
+    if conflicts:
+        st.error(f"⚠️ **Conflicto detectado:** Los siguientes dispositivos ya están asignados a otros proyectos en esas fechas:")
+        for dev_name in conflicts:
+            st.write(f"• {dev_name}")
+        st.warning("Si continúas, estos dispositivos tendrán solapamiento de fechas.")
+    
+    st.info("Se hará check-in automático de todos los dispositivos del alquiler actual y se crearán nuevas asignaciones para la renovación.")
+    
+    taken = hold_devices(device_ids)
+    
+    col1, col2 = st.columns(2)
+    with col1:
+        if st.button("Cancelar", use_container_width=True):
+            release_devices(device_ids)
+            clear_conflicts()
+            st.rerun()
+    with col2:
+        confirmed = st.button("Confirmar renovación", use_container_width=True, type="primary", disabled=bool(taken))
+    
+    if (confirmed and not find_conflicts(device_ids)) or override_conflicts(device_ids):
+        steps = new_shipment_steps(client_name, start_date, end_date, device_ids)
+        checkin_offset = len(steps)
+        steps += [historic_checkin_step(dev, old_loc_id) for dev in devices]
+        
+        new_loc_id = optimistic.pending_id()
+        patches = [
+            optimistic.create_location_patch(new_loc_id, client_name, "Client", start_date.isoformat(), end_date.isoformat(), step=0),
+            optimistic.assign_patch(device_ids, new_loc_id)
+        ]
+        patches += [
+            optimistic.add_historic_patch(optimistic.pending_id(), old_loc_id, date.today().isoformat(), step=checkin_offset + i)
+            for i in range(len(devices))
+        ]
+
+        enqueue_operation(
+            f"Renovar {old_loc_name} → {client_name}",
+            steps,
+            patches
+        )
+        release_devices(device_ids)
+        st.rerun()
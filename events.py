@@ -0,0 +1,142 @@
+import contextlib
+import json
+import os
+import threading
+import time
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+
+class EventLog:
+    """Registro local de eventos de dominio (solo se añade) con un punto de control para reproducirlo rápido.
+
+    Cada línea es un evento y su `seq` es su número de línea, así que al arrancar se salta lo anterior al
+    punto de control sin parsearlo. Lo comparten todos los procesos del servidor: se escribe con el
+    fichero bloqueado y cada proceso proyecta también los eventos que han añadido los demás, así que
+    `seq` es único y creciente en todo el servidor. El registro no se recorta nunca: también sirve de
+    traza de la actividad de los operadores y de cuánto tarda Notion en confirmar cada operación.
+    """
+
+    def __init__(self, path, checkpoint_every=100):
+        self.path = path
+        self.checkpoint_path = path + ".checkpoint"
+        self.checkpoint_every = checkpoint_every
+        self.last_seq = 0
+        self._offset = 0
+        self._checkpoint_seq = 0
+        self._subscribers = {}
+        self._lock = threading.Lock()
+
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with self._locked():
+            self._catch_up()
+
+    def subscribe(self, name, projection):
+        """Conecta una proyección con `restore(state)`, `project(event)` y `state()` y le reproduce el registro"""
+        with self._locked():
+            self._catch_up()
+            after = 0
+            checkpoint = self._read_checkpoint()
+            if checkpoint and name in checkpoint["state"]:
+                projection.restore(checkpoint["state"][name])
+                after = checkpoint["seq"]
+                self._checkpoint_seq = max(self._checkpoint_seq, after)
+            for event in self.read(after=after, until=self.last_seq):
+                projection.project(event)
+            self._subscribers[name] = projection
+
+    def append(self, kind, **fields):
+        with self._locked():
+            self._catch_up()
+            self.last_seq += 1
+            event = dict(fields, seq=self.last_seq, kind=kind, ts=time.time())
+            line = (json.dumps(event) + "\n").encode()
+            with open(self.path, "ab") as fh:
+                fh.write(line)
+                fh.flush()
+                os.fsync(fh.fileno())
+            self._offset += len(line)
+
+            for projection in self._subscribers.values():
+                projection.project(event)
+
+            if self.last_seq - self._checkpoint_seq >= self.checkpoint_every:
+                self._write_checkpoint()
+        return event
+
+    def sync(self):
+        """Proyecta los eventos que otros procesos hayan añadido y devuelve el último `seq`"""
+        with self._locked():
+            self._catch_up()
+            return self.last_seq
+
+    def read(self, after=0, until=None):
+        if not os.path.exists(self.path):
+            return
+        with open(self.path, encoding="utf-8") as fh:
+            for i, line in enumerate(fh, start=1):
+                if until is not None and i > until:
+                    return
+                if i <= after:
+                    continue
+                try:
+                    yield json.loads(line)
+                except ValueError:
+                    continue
+
+    @contextlib.contextmanager
+    def _locked(self):
+        with self._lock:
+            fh = open(f"{self.path}.lock", "a")
+            try:
+                if fcntl:
+                    fcntl.flock(fh, fcntl.LOCK_EX)
+                yield
+            finally:
+                if fcntl:
+                    fcntl.flock(fh, fcntl.LOCK_UN)
+                fh.close()
+
+    def _catch_up(self):
+        try:
+            size = os.path.getsize(self.path)
+        except FileNotFoundError:
+            return
+        if size <= self._offset:
+            return
+
+        with open(self.path, "rb") as fh:
+            fh.seek(self._offset)
+            for line in fh:
+                if not line.endswith(b"\n"):
+                    break
+                self._offset += len(line)
+                self.last_seq += 1
+                if not self._subscribers:
+                    continue
+                try:
+                    event = json.loads(line)
+                except ValueError:
+                    continue
+                for projection in self._subscribers.values():
+                    projection.project(event)
+
+    def _read_checkpoint(self):
+        try:
+            with open(self.checkpoint_path, encoding="utf-8") as fh:
+                checkpoint = json.load(fh)
+        except (OSError, ValueError):
+            return None
+        return checkpoint if checkpoint["seq"] <= self.last_seq else None
+
+    def _write_checkpoint(self):
+        state = {name: projection.state() for name, projection in self._subscribers.items()}
+        checkpoint = {"seq": self.last_seq, "state": state}
+        tmp = f"{self.checkpoint_path}.{os.getpid()}.tmp"
+        with open(tmp, "w", encoding="utf-8") as fh:
+            json.dump(checkpoint, fh)
+        os.replace(tmp, self.checkpoint_path)
+        self._checkpoint_seq = self.last_seq
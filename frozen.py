@@ -0,0 +1,21 @@
+from types import MappingProxyType
+
+
+def freeze(value):
+    """Copia inmutable (tuplas y MappingProxyType) para compartir datos entre sesiones sin copiarlos"""
+    if isinstance(value, (MappingProxyType, tuple)):
+        return value
+    if isinstance(value, dict):
+        return MappingProxyType({k: freeze(v) for k, v in value.items()})
+    if isinstance(value, list):
+        return tuple(freeze(v) for v in value)
+    return value
+
+
+def thaw(value):
+    """Vuelve a tipos básicos (dict/list) para serializar"""
+    if isinstance(value, (dict, MappingProxyType)):
+        return {k: thaw(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [thaw(v) for v in value]
+    return value
@@ -0,0 +1,93 @@
+import contextlib
+import json
+import os
+import threading
+import time
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+
+class LeaseTable:
+    """Reservas temporales de dispositivos mientras una sesión tiene abierto un diálogo de confirmación.
+
+    Se guardan en un fichero JSON compartido entre procesos; cada reserva caduca a los `ttl` segundos
+    si no se renueva, así que un diálogo cerrado sin confirmar libera sus dispositivos solo.
+    """
+
+    def __init__(self, path, ttl=120):
+        self.path = path
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._key = None
+        self._leases = {}
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+
+    def acquire(self, holder, ids):
+        """Reserva o renueva `ids` para `holder`; devuelve los que ya tiene reservados otra sesión"""
+        with self._locked() as leases:
+            expires = time.time() + self.ttl
+            taken = [i for i in ids if i in leases and leases[i]["holder"] != holder]
+            for i in ids:
+                if i not in taken:
+                    leases[i] = {"holder": holder, "expires": expires}
+        return taken
+
+    def release(self, holder, ids=None):
+        with self._locked() as leases:
+            for i, lease in list(leases.items()):
+                if lease["holder"] == holder and (ids is None or i in ids):
+                    del leases[i]
+
+    def held_by_others(self, holder):
+        now = time.time()
+        return {
+            i for i, lease in self._read().items()
+            if lease["holder"] != holder and lease["expires"] > now
+        }
+
+    def _file_key(self):
+        try:
+            st = os.stat(self.path)
+        except FileNotFoundError:
+            return None
+        return (st.st_ino, st.st_mtime_ns, st.st_size)
+
+    def _read(self):
+        key = self._file_key()
+        with self._lock:
+            if key != self._key:
+                self._leases = self._load() if key else {}
+                self._key = key
+            return self._leases
+
+    def _load(self):
+        try:
+            with open(self.path, encoding="utf-8") as fh:
+                return json.load(fh)
+        except (OSError, ValueError):
+            return {}
+
+    @contextlib.contextmanager
+    def _locked(self):
+        with self._lock:
+            fh = open(f"{self.path}.lock", "a")
+            try:
+                if fcntl:
+                    fcntl.flock(fh, fcntl.LOCK_EX)
+                now = time.time()
+                leases = {i: lease for i, lease in self._load().items() if lease["expires"] > now}
+                yield leases
+
+                tmp = f"{self.path}.{os.getpid()}.{threading.get_ident()}.tmp"
+                with open(tmp, "w", encoding="utf-8") as out:
+                    json.dump(leases, out)
+                os.replace(tmp, self.path)
+                self._key = self._file_key()
+                self._leases = leases
+            finally:
+                if fcntl:
+                    fcntl.flock(fh, fcntl.LOCK_UN)
+                fh.close()
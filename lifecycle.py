@@ -0,0 +1,134 @@
+import heapq
+import itertools
+import threading
+from datetime import date, datetime, timedelta
+from types import MappingProxyType
+
+HISTORY_DAYS = 30
+BUCKETS = ("future", "active", "pending", "historic")
+
+
+def _to_date(s):
+    try:
+        return datetime.fromisoformat(s).date()
+    except (TypeError, ValueError):
+        return None
+
+
+def classify(record, today):
+    """Cubos por fechas de un envío a cliente: Próximos, Activos, Recepcionar (ya terminado) e Histórico (terminado hace menos de 30 días)"""
+    if record["type"] != "Client":
+        return frozenset()
+    start = _to_date(record["start"])
+    end = _to_date(record["end"])
+    buckets = set()
+    if start and start > today:
+        buckets.add("future")
+    if start and start <= today and (not end or end > today):
+        buckets.add("active")
+    if end and end <= today:
+        buckets.add("pending")
+        if end >= today - timedelta(days=HISTORY_DAYS):
+            buckets.add("historic")
+    return frozenset(buckets)
+
+
+def next_transition(record, today):
+    """Primer día posterior a `today` en el que cambian los cubos del envío, o None si ya no cambian"""
+    if record["type"] != "Client":
+        return None
+    start = _to_date(record["start"])
+    end = _to_date(record["end"])
+    dates = [start, end, end + timedelta(days=HISTORY_DAYS + 1) if end else None]
+    return min((d for d in dates if d and d > today), default=None)
+
+
+class LifecycleScheduler:
+    """Mantiene los envíos clasificados por fase y los mueve de cubo solo cuando vence su próxima transición.
+
+    Los envíos esperan en un montículo ordenado por la fecha de su siguiente cambio (salida, fin o fin
+    del histórico), así que al cambiar de día o al editar fechas solo se reclasifican los afectados.
+    """
+
+    def __init__(self, clock=date.today):
+        self.clock = clock
+        self.reclassified = 0
+        self._today = None
+        self._records = {}
+        self._positions = {}
+        self._member_of = {}
+        self._buckets = {name: {} for name in BUCKETS}
+        self._heap = []
+        self._seq = itertools.count()
+        self._order = ()
+        self._view = None
+        self._lock = threading.Lock()
+
+    def today(self):
+        return self.clock()
+
+    def sync(self, records, today=None):
+        """Pone los cubos al día con `records` y devuelve una vista inmutable; si nada cambia devuelve la misma"""
+        today = today or self.today()
+        with self._lock:
+            changed = self._advance(today)
+
+            order = tuple(r["id"] for r in records)
+            if order != self._order:
+                self._order = order
+                self._positions = {record_id: i for i, record_id in enumerate(order)}
+                changed = True
+
+            for r in records:
+                if self._records.get(r["id"]) != r:
+                    self._place(r)
+                    changed = True
+
+            for record_id in set(self._records) - set(self._positions):
+                self._remove(record_id)
+                changed = True
+
+            if changed or self._view is None:
+                self._view = MappingProxyType({
+                    name: tuple(sorted(members.values(), key=lambda r: self._positions[r["id"]]))
+                    for name, members in self._buckets.items()
+                })
+            return self._view
+
+    def _advance(self, today):
+        if self._today is not None and today < self._today:
+            self._today = today
+            self._heap = []
+            for r in list(self._records.values()):
+                self._place(r)
+            return True
+
+        self._today = today
+        changed = False
+        while self._heap and self._heap[0][0] <= today:
+            _, _, record_id, record = heapq.heappop(self._heap)
+            if self._records.get(record_id) is record:
+                self._place(record)
+                changed = True
+        return changed
+
+    def _place(self, record):
+        record_id = record["id"]
+        self._records[record_id] = record
+        self.reclassified += 1
+
+        buckets = classify(record, self._today)
+        for name in self._member_of.get(record_id, ()):
+            self._buckets[name].pop(record_id, None)
+        for name in buckets:
+            self._buckets[name][record_id] = record
+        self._member_of[record_id] = buckets
+
+        when = next_transition(record, self._today)
+        if when:
+            heapq.heappush(self._heap, (when, next(self._seq), record_id, record))
+
+    def _remove(self, record_id):
+        self._records.pop(record_id, None)
+        for name in self._member_of.pop(record_id, ()):
+            self._buckets[name].pop(record_id, None)
@@ -0,0 +1,148 @@
+import bisect
+import contextlib
+import functools
+import threading
+import time
+
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+
+def _key(name, labels):
+    return name, tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def _format_labels(labels, extra=()):
+    pairs = list(labels) + list(extra)
+    if not pairs:
+        return ""
+    escaped = (v.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, v in pairs)
+    return "{" + ",".join(f'{k}="{v}"' for (k, _), v in zip(pairs, escaped)) + "}"
+
+
+class Registry:
+    """Contadores, valores instantáneos e histogramas de tiempos del proceso, en memoria.
+
+    Los histogramas usan cubos fijos, así que registrar una medida es barato y los percentiles del panel
+    son aproximados (límite superior del cubo). `render()` los publica en formato de Prometheus.
+    """
+
+    def __init__(self, buckets=BUCKETS):
+        self.buckets = buckets
+        self.started_at = time.time()
+        self._counters = {}
+        self._gauges = {}
+        self._histograms = {}
+        self._lock = threading.Lock()
+
+    def inc(self, name, amount=1, **labels):
+        key = _key(name, labels)
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + amount
+
+    def set(self, name, value, **labels):
+        with self._lock:
+            self._gauges[_key(name, labels)] = value
+
+    def observe(self, name, value, **labels):
+        key = _key(name, labels)
+        with self._lock:
+            h = self._histograms.get(key)
+            if h is None:
+                h = self._histograms[key] = {"counts": [0] * (len(self.buckets) + 1), "sum": 0.0, "count": 0, "max": 0.0}
+            h["counts"][bisect.bisect_left(self.buckets, value)] += 1
+            h["sum"] += value
+            h["count"] += 1
+            h["max"] = max(h["max"], value)
+
+    @contextlib.contextmanager
+    def timer(self, name, **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start, **labels)
+
+    def timed(self, name, **labels):
+        """Decorador: mide cada llamada en el histograma `name`"""
+        def decorator(fn):
+            @functools.wraps(fn)
+            def wrapper(*args, **kwargs):
+                with self.timer(name, **labels):
+                    return fn(*args, **kwargs)
+            return wrapper
+        return decorator
+
+    def _quantile(self, h, q):
+        """Aproximación por el límite superior del cubo que contiene el cuantil"""
+        target = q * h["count"]
+        seen = 0
+        for bound, count in zip(self.buckets + (h["max"],), h["counts"]):
+            seen += count
+            if seen >= target:
+                return min(bound, h["max"])
+        return h["max"]
+
+    def summary(self):
+        """Filas para el panel de administración: una por serie"""
+        with self._lock:
+            counters = dict(self._counters)
+            gauges = dict(self._gauges)
+            histograms = {key: dict(h, counts=list(h["counts"])) for key, h in self._histograms.items()}
+
+        rows = []
+        for (name, labels), h in sorted(histograms.items()):
+            rows.append({
+                "métrica": name,
+                "etiquetas": _format_labels(labels),
+                "n": h["count"],
+                "media (ms)": round(1000 * h["sum"] / h["count"], 1),
+                "p50 (ms)": round(1000 * self._quantile(h, 0.5), 1),
+                "p95 (ms)": round(1000 * self._quantile(h, 0.95), 1),
+                "máx (ms)": round(1000 * h["max"], 1)
+            })
+        values = [
+            {"métrica": name, "etiquetas": _format_labels(labels), "valor": value}
+            for (name, labels), value in sorted({**counters, **gauges}.items())
+        ]
+        return rows, values
+
+    def render(self):
+        """Formato de texto de Prometheus"""
+        with self._lock:
+            counters = dict(self._counters)
+            gauges = dict(self._gauges)
+            histograms = {key: dict(h, counts=list(h["counts"])) for key, h in self._histograms.items()}
+
+        lines = []
+        typed = set()
+
+        def declare(name, kind):
+            if name not in typed:
+                typed.add(name)
+                lines.append(f"# TYPE {name} {kind}")
+
+        for (name, labels), value in sorted(counters.items()):
+            declare(name, "counter")
+            lines.append(f"{name}{_format_labels(labels)} {value}")
+        for (name, labels), value in sorted(gauges.items()):
+            declare(name, "gauge")
+            lines.append(f"{name}{_format_labels(labels)} {value}")
+        for (name, labels), h in sorted(histograms.items()):
+            declare(name, "histogram")
+            cumulative = 0
+            for bound, count in zip(self.buckets, h["counts"]):
+                cumulative += count
+                lines.append(f"{name}_bucket{_format_labels(labels, [('le', str(bound))])} {cumulative}")
+            lines.append(f"{name}_bucket{_format_labels(labels, [('le', '+Inf')])} {h['count']}")
+            lines.append(f"{name}_sum{_format_labels(labels)} {h['sum']}")
+            lines.append(f"{name}_count{_format_labels(labels)} {h['count']}")
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+inc = REGISTRY.inc
+gauge = REGISTRY.set
+observe = REGISTRY.observe
+timer = REGISTRY.timer
+timed = REGISTRY.timed
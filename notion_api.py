@@ -0,0 +1,100 @@
+import threading
+import time
+
+import requests
+
+import metrics
+
+NOTION_API = "https://api.notion.com/v1"
+
+TIMEOUT = (3.05, 20)
+UNAVAILABLE_STATUS = {429, 500, 502, 503, 504}
+
+
+class NotionUnavailable(Exception):
+    """Notion no responde: error de red, timeout, 5xx o circuito abierto"""
+
+
+class CircuitBreaker:
+    """Abre el circuito tras `threshold` fallos seguidos; pasado `reset_after` deja pasar una única petición de prueba"""
+
+    def __init__(self, threshold=5, reset_after=30):
+        self.threshold = threshold
+        self.reset_after = reset_after
+        self.failures = 0
+        self.opened_at = None
+        self.last_error = None
+        self._probing = False
+        self._lock = threading.Lock()
+
+    def is_open(self):
+        with self._lock:
+            return self.opened_at is not None and time.time() - self.opened_at < self.reset_after
+
+    def allow(self):
+        with self._lock:
+            if self.opened_at is None:
+                return True
+            if self._probing or time.time() - self.opened_at < self.reset_after:
+                return False
+            self._probing = True
+            return True
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self.last_error = None
+            self._probing = False
+
+    def record_failure(self, error):
+        with self._lock:
+            self.failures += 1
+            self.last_error = error
+            if self._probing or self.failures >= self.threshold:
+                self.opened_at = time.time()
+            self._probing = False
+
+    def status(self):
+        with self._lock:
+            return {
+                "circuit": "open" if self.opened_at is not None else "closed",
+                "failures": self.failures,
+                "opened_at": self.opened_at,
+                "last_error": self.last_error
+            }
+
+
+def retry_safe(method, path):
+    """Si repetir la petición no puede duplicar nada: todo salvo los POST que crean páginas"""
+    return method != "POST" or path.split("?")[0].endswith("/query")
+
+
+def endpoint(path):
+    """Ruta sin identificadores para agrupar métricas: databases/{id}/query, pages/{id}..."""
+    parts = path.split("?")[0].split("/")
+    return "/".join("{id}" if i % 2 else part for i, part in enumerate(parts))
+
+
+def request(method, path, headers, json=None, breaker=None, timeout=TIMEOUT):
+    """Petición a Notion con timeouts de conexión/lectura; lanza NotionUnavailable si no hay servicio"""
+    if breaker is not None and not breaker.allow():
+        raise NotionUnavailable(f"Circuito abierto: {breaker.last_error}")
+
+    labels = {"method": method, "endpoint": endpoint(path)}
+    try:
+        with metrics.timer("notion_request_seconds", **labels):
+            r = requests.request(method, f"{NOTION_API}/{path}", json=json, headers=headers, timeout=timeout)
+    except requests.RequestException as e:
+        metrics.inc("notion_responses_total", status="error", **labels)
+        if breaker is not None:
+            breaker.record_failure(str(e))
+        raise NotionUnavailable(str(e)) from e
+    metrics.inc("notion_responses_total", status=r.status_code, **labels)
+
+    if breaker is not None:
+        if r.status_code in UNAVAILABLE_STATUS:
+            breaker.record_failure(f"{r.status_code}: {r.text[:200]}")
+        else:
+            breaker.record_success()
+    return r
@@ -0,0 +1,242 @@
+import asyncio
+import contextlib
+import contextvars
+import json
+import random
+import socket
+import threading
+import time
+
+from tornado.httpclient import AsyncHTTPClient, HTTPClientError, HTTPRequest
+
+import metrics
+import notion_api
+
+_low_priority = contextvars.ContextVar("notion_low_priority", default=False)
+
+
+@contextlib.contextmanager
+def low_priority():
+    """Las peticiones hechas dentro solo usan fichas que no necesitan las peticiones interactivas"""
+    token = _low_priority.set(True)
+    try:
+        yield
+    finally:
+        _low_priority.reset(token)
+
+
+def is_low_priority():
+    return _low_priority.get()
+
+
+def _before_sending(error):
+    """Si el fallo impidió que la petición llegara a Notion: sin conexión, sin resolver el nombre o esperando turno"""
+    if isinstance(error, (ConnectionRefusedError, socket.gaierror)):
+        return True
+    return isinstance(error, HTTPClientError) and error.message in ("Timeout while connecting", "Timeout in request queue")
+
+
+class RateLimiter:
+    """Cubo de fichas: `rate` peticiones por segundo de media con ráfagas de hasta `burst`.
+
+    Las peticiones de baja prioridad esperan a que no haya ninguna interactiva en cola y dejan
+    siempre `reserve` fichas libres para ellas.
+    """
+
+    def __init__(self, rate, burst, reserve=None):
+        self.rate = rate
+        self.burst = burst
+        self.reserve = burst / 2 if reserve is None else reserve
+        self._tokens = burst
+        self._updated = time.monotonic()
+        self._waiting = 0
+
+    async def acquire(self, low_priority=False):
+        needed = 1 + self.reserve if low_priority else 1
+        if not low_priority:
+            self._waiting += 1
+        try:
+            while True:
+                now = time.monotonic()
+                self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= needed and not (low_priority and self._waiting):
+                    self._tokens -= 1
+                    return
+                await asyncio.sleep(max(needed - self._tokens, 0.1) / self.rate)
+        finally:
+            if not low_priority:
+                self._waiting -= 1
+
+
+class AsyncNotionClient:
+    """Cliente de Notion sobre AsyncHTTPClient de tornado, con su propio bucle de eventos en un hilo de fondo.
+
+    Todas las peticiones del proceso comparten el bucle, el límite de peticiones y el circuito, así que
+    decenas de consultas o escrituras concurrentes no necesitan un hilo cada una.
+    """
+
+    def __init__(self, headers, breaker=None, rate=3, burst=10, max_concurrency=32, max_attempts=4, database_names=None):
+        self.headers = headers
+        self.breaker = breaker
+        self.database_names = database_names or {}
+        self.max_attempts = max_attempts
+        self._max_concurrency = max_concurrency
+        self._loop = asyncio.new_event_loop()
+        self._ready = threading.Event()
+        self._rate = (rate, burst)
+        threading.Thread(target=self._run_loop, name="notion-async", daemon=True).start()
+        self._ready.wait()
+
+    def _run_loop(self):
+        asyncio.set_event_loop(self._loop)
+        self._http = AsyncHTTPClient(max_clients=self._max_concurrency)
+        self._limiter = RateLimiter(*self._rate)
+        self._ready.set()
+        self._loop.run_forever()
+
+    async def request(self, method, path, json_body=None):
+        """Devuelve (status, datos); reintenta 429 y 5xx con espera exponencial o la que indique Retry-After.
+
+        Las peticiones que crean páginas solo se repiten si Notion no llegó a recibirlas (429 o sin conexión):
+        tras un 5xx o un corte a medias la página pudo crearse, así que se devuelve el error sin reintentar.
+        """
+        retry_safe = notion_api.retry_safe(method, path)
+        for attempt in range(1, self.max_attempts + 1):
+            if self.breaker is not None and not self.breaker.allow():
+                raise notion_api.NotionUnavailable(f"Circuito abierto: {self.breaker.last_error}")
+
+            labels = {"method": method, "endpoint": notion_api.endpoint(path)}
+            with metrics.timer("notion_rate_limit_wait_seconds", low_priority=_low_priority.get()):
+                await self._limiter.acquire(_low_priority.get())
+            connect_timeout, request_timeout = notion_api.TIMEOUT
+            started = time.perf_counter()
+            try:
+                response = await self._http.fetch(
+                    HTTPRequest(
+                        f"{notion_api.NOTION_API}/{path}",
+                        method=method,
+                        headers=self.headers,
+                        body=json.dumps(json_body) if json_body is not None else None,
+                        allow_nonstandard_methods=True,
+                        connect_timeout=connect_timeout,
+                        request_timeout=request_timeout
+                    ),
+                    raise_error=False
+                )
+                status = response.code
+                failure = response.error if status == 599 else None
+            except (HTTPClientError, OSError, asyncio.TimeoutError) as e:
+                response = None
+                status = 599
+                failure = e
+            error = (str(failure) or type(failure).__name__) if failure is not None else None
+            metrics.observe("notion_request_seconds", time.perf_counter() - started, **labels)
+            metrics.inc("notion_responses_total", status=status, **labels)
+
+            if status == 599 or status in notion_api.UNAVAILABLE_STATUS:
+                if status != 599:
+                    error = response.body.decode(errors="replace")[:200]
+                if self.breaker is not None:
+                    self.breaker.record_failure(f"{status}: {error}")
+                if not retry_safe and status != 429 and not (status == 599 and _before_sending(failure)):
+                    metrics.inc("notion_uncertain_total", **labels)
+                    return status, {"message": error}
+                if attempt == self.max_attempts:
+                    if status == 599:
+                        raise notion_api.NotionUnavailable(error)
+                    return status, {"message": error}
+                retry_after = response.headers.get("Retry-After") if status == 429 else None
+                delay = float(retry_after) if retry_after else min(8, 0.5 * 2 ** attempt)
+                metrics.inc("notion_retries_total", **labels)
+                await asyncio.sleep(delay * random.uniform(0.8, 1.2))
+                continue
+
+            if self.breaker is not None:
+                self.breaker.record_success()
+            try:
+                data = json.loads(response.body) if response.body else {}
+            except ValueError:
+                data = {"message": response.body.decode(errors="replace")[:200]}
+            return status, data
+
+    async def query(self, db, payload=None):
+        """Todas las páginas de la consulta; None si Notion la rechaza (4xx)"""
+        payload = dict(payload or {"page_size": 100})
+        results = []
+        pages = 0
+        started = time.perf_counter()
+        try:
+            while True:
+                status, data = await self.request("POST", f"databases/{db}/query", payload)
+                pages += 1
+                if status != 200:
+                    return None
+                results.extend(data.get("results", []))
+                if not data.get("has_more") or not data.get("next_cursor"):
+                    return results
+                payload["start_cursor"] = data["next_cursor"]
+        finally:
+            database = self.database_names.get(db, db)
+            metrics.observe("notion_query_seconds", time.perf_counter() - started, database=database)
+            metrics.inc("notion_query_pages_total", pages, database=database)
+            metrics.inc("notion_queries_total", database=database)
+
+    async def relation_ids(self, page_id, property_id):
+        """Ids completos de una relación paginando el endpoint de propiedades; None si Notion la rechaza o no responde"""
+        ids = []
+        cursor = None
+        while True:
+            path = f"pages/{page_id}/properties/{property_id}?page_size=100"
+            if cursor:
+                path += f"&start_cursor={cursor}"
+            try:
+                status, data = await self.request("GET", path)
+            except notion_api.NotionUnavailable:
+                return None
+            if status != 200:
+                return None
+            ids.extend(item["relation"]["id"] for item in data.get("results", []) if item.get("type") == "relation")
+            if not data.get("has_more") or not data.get("next_cursor"):
+                return ids
+            cursor = data["next_cursor"]
+
+    async def _send(self, method, path, body):
+        try:
+            status, data = await self.request(method, path, body)
+        except notion_api.NotionUnavailable as e:
+            return None, None, str(e)
+        if status == 200:
+            return 200, data, None
+        return status, None, data.get("message", "")[:300]
+
+    def run(self, coro, timeout=None):
+        """Ejecuta una corrutina en el bucle del cliente y espera el resultado desde cualquier hilo"""
+        priority = _low_priority.get()
+
+        async def with_priority():
+            _low_priority.set(priority)
+            return await coro
+
+        return asyncio.run_coroutine_threadsafe(with_priority(), self._loop).result(timeout)
+
+    def query_sync(self, db, payload=None):
+        return self.run(self.query(db, payload))
+
+    def query_many(self, queries):
+        """Lanza a la vez una lista de (db, payload)"""
+        async def gather():
+            return await asyncio.gather(*(self.query(db, payload) for db, payload in queries))
+        return self.run(gather())
+
+    def relation_ids_many(self, properties):
+        """Lanza a la vez una lista de (page_id, property_id)"""
+        async def gather():
+            return await asyncio.gather(*(self.relation_ids(page_id, prop) for page_id, prop in properties))
+        return self.run(gather())
+
+    def send_many(self, requests):
+        """Envía a la vez una lista de (method, path, body) y devuelve (status, datos, error) por petición"""
+        async def gather():
+            return await asyncio.gather(*(self._send(*r) for r in requests))
+        return self.run(gather())
@@ -0,0 +1,295 @@
+import threading
+import time
+import uuid
+
+from frozen import freeze
+
+PENDING_PREFIX = "pending:"
+
+
+def pending_id():
+    return f"{PENDING_PREFIX}{uuid.uuid4().hex}"
+
+
+def is_pending_id(page_id):
+    return isinstance(page_id, str) and page_id.startswith(PENDING_PREFIX)
+
+
+def assign_patch(device_ids, location_id):
+    return {"kind": "assign", "device_ids": list(device_ids), "location_id": location_id}
+
+
+def create_location_patch(temp_id, name, loc_type, start, end, step):
+    return {
+        "kind": "create_location",
+        "id": temp_id,
+        "step": step,
+        "record": {"id": temp_id, "name": name, "type": loc_type, "start": start, "end": end}
+    }
+
+
+def update_location_patch(location_id, **fields):
+    return {"kind": "update_location", "id": location_id, "fields": fields}
+
+
+def archive_location_patch(location_id):
+    return {"kind": "archive_location", "id": location_id}
+
+
+def add_historic_patch(temp_id, location_id, check_in, step):
+    return {
+        "kind": "add_historic",
+        "id": temp_id,
+        "step": step,
+        "record": {"id": temp_id, "location_id": location_id, "check_in": check_in}
+    }
+
+
+def create_incident_patch(temp_id, device_id, name, notes, created, step):
+    return {
+        "kind": "create_incident",
+        "id": temp_id,
+        "step": step,
+        "record": {"id": temp_id, "Name": name, "Device": device_id, "Created": created, "Notes": notes}
+    }
+
+
+def resolve_incident_patch(incident_id, resolved, resolution_notes):
+    return {
+        "kind": "resolve_incident",
+        "id": incident_id,
+        "resolved": resolved,
+        "resolution_notes": resolution_notes
+    }
+
+
+class OptimisticOverlay:
+    """Cambios locales aplicados sobre los datos cacheados hasta que Notion los confirma.
+
+    Es una proyección del events.EventLog: se reconstruye al arrancar reproduciendo los eventos de las
+    operaciones y, mientras los datos base no cambian, cada operación nueva solo aplica sus parches.
+    """
+
+    def __init__(self):
+        self.version = 0
+        self._patches = []
+        self._resolved = {}
+        self._lock = threading.Lock()
+        self._memo_key = None
+        self._memo = None
+        self._memo_base = None
+        self._memo_patches = []
+        self._memo_resolved = {}
+
+    def project(self, event):
+        if event["kind"] == "operation_submitted":
+            self.add(event["op_id"], event["patches"], created=event["ts"], holder=event.get("holder"))
+        elif event["kind"] == "operation_done":
+            self.confirm({"id": event["op_id"], "results": event["results"]}, at=event["ts"], seq=event["seq"])
+        elif event["kind"] == "operation_failed":
+            self.discard(event["op_id"])
+
+    def state(self):
+        with self._lock:
+            return {"patches": [dict(p) for p in self._patches], "resolved": dict(self._resolved)}
+
+    def restore(self, state):
+        with self._lock:
+            self._patches = state["patches"]
+            self._resolved = state["resolved"]
+            self.version += 1
+
+    def add(self, op_id, patches, created=None, holder=None):
+        if not patches:
+            return
+        with self._lock:
+            now = created or time.time()
+            for patch in patches:
+                self._patches.append(dict(patch, op_id=op_id, holder=holder, created=now, confirmed_at=None, confirmed_seq=None))
+            self.version += 1
+
+    def confirm(self, op, at=None, seq=None):
+        with self._lock:
+            now = at or time.time()
+            for patch in self._patches:
+                if patch["op_id"] != op["id"]:
+                    continue
+                patch["confirmed_at"] = now
+                patch["confirmed_seq"] = seq
+                if "step" in patch and op["results"][patch["step"]]:
+                    self._resolved[patch["id"]] = op["results"][patch["step"]]
+            self.version += 1
+
+    def discard(self, op_id):
+        with self._lock:
+            self._patches = [p for p in self._patches if p["op_id"] != op_id]
+            self.version += 1
+
+    def resolved_id(self, temp_id):
+        """Id real en Notion de una página creada de forma optimista, o None si aún no se ha confirmado"""
+        with self._lock:
+            return self._resolved.get(temp_id)
+
+    def patched_device_ids(self, holder):
+        """Dispositivos con cambios en curso de la sesión `holder`: sus ediciones recientes en Notion no son de otro operador"""
+        with self._lock:
+            return {
+                d for p in self._patches
+                if p["kind"] == "assign" and p.get("holder") == holder
+                for d in p["device_ids"]
+            }
+
+    def pending_count(self):
+        with self._lock:
+            return len(self._patches)
+
+    def apply(self, base, derive):
+        """Datos base con los parches pendientes; las vistas cuyas entradas no tocan los parches se reutilizan"""
+        with self._lock:
+            loaded_at = base["loaded_at"]
+            kept = [p for p in self._patches if not _reflected(p, base)]
+            if len(kept) != len(self._patches):
+                self._patches = kept
+                self.version += 1
+
+            if not kept:
+                return base
+
+            key = (loaded_at, base.get("today"), self.version, frozenset(base))
+            if self._memo_key == key:
+                return self._memo
+
+            patches = list(kept)
+            resolved = dict(self._resolved)
+            start, todo = base, patches
+            done = len(self._memo_patches)
+            if (
+                self._memo_base is base
+                and self._memo_resolved == resolved
+                and all(a is b for a, b in zip(patches, self._memo_patches))
+                and len(patches) >= done
+            ):
+                start, todo = self._memo, patches[done:]
+
+        data = dict(start)
+        touched = {name for patch in todo for name in _REQUIRES[patch["kind"]]}
+        for name in touched:
+            if name in start:
+                data[name] = list(start[name])
+
+        for patch in todo:
+            if all(name in data for name in _REQUIRES[patch["kind"]]):
+                _APPLY[patch["kind"]](data, patch, resolved)
+
+        data = freeze(derive(data, start))
+
+        with self._lock:
+            self._memo_key = key
+            self._memo = data
+            self._memo_base = base
+            self._memo_patches = patches
+            self._memo_resolved = resolved
+        return data
+
+
+def _reflected(patch, base):
+    """Si los datos base ya incluyen el parche: se confirmó antes de empezar a leerlos de Notion"""
+    if patch["confirmed_at"] is None:
+        return False
+    if base.get("event_seq") is not None and patch.get("confirmed_seq") is not None:
+        return patch["confirmed_seq"] <= base["event_seq"]
+    return patch["confirmed_at"] <= base["loaded_at"]
+
+
+def _real_id(page_id, resolved):
+    return resolved.get(page_id, page_id)
+
+
+def _apply_assign(data, patch, resolved):
+    loc_id = _real_id(patch["location_id"], resolved)
+    loc = next((r for r in data["location_records"] if r["id"] == loc_id), None)
+    targets = set(patch["device_ids"])
+
+    for i, dev in enumerate(data["devices"]):
+        if dev["id"] in targets:
+            data["devices"][i] = dict(
+                dev,
+                location_ids=[loc_id],
+                Start=loc["start"] if loc else None,
+                End=loc["end"] if loc else None
+            )
+
+
+def _apply_create_location(data, patch, resolved):
+    real = resolved.get(patch["id"])
+    if real and any(r["id"] == real for r in data["location_records"]):
+        return
+    data["location_records"].append(dict(patch["record"], id=real or patch["id"]))
+
+
+def _apply_update_location(data, patch, resolved):
+    loc_id = _real_id(patch["id"], resolved)
+    for i, rec in enumerate(data["location_records"]):
+        if rec["id"] == loc_id:
+            data["location_records"][i] = dict(rec, **patch["fields"])
+
+    fields = patch["fields"]
+    for i, dev in enumerate(data["devices"]):
+        if list(dev["location_ids"]) == [loc_id]:
+            data["devices"][i] = dict(
+                dev,
+                Start=fields.get("start", dev["Start"]),
+                End=fields.get("end", dev["End"])
+            )
+
+
+def _apply_archive_location(data, patch, resolved):
+    loc_id = _real_id(patch["id"], resolved)
+    data["location_records"] = [r for r in data["location_records"] if r["id"] != loc_id]
+
+
+def _apply_add_historic(data, patch, resolved):
+    real = resolved.get(patch["id"])
+    if real and any(h["id"] == real for h in data["historic_records"]):
+        return
+    data["historic_records"].append(dict(patch["record"], id=real or patch["id"]))
+
+
+def _apply_create_incident(data, patch, resolved):
+    real = resolved.get(patch["id"])
+    if real and any(i["id"] == real for i in data["active_incidents"]):
+        return
+    data["active_incidents"].append(dict(patch["record"], id=real or patch["id"]))
+
+
+def _apply_resolve_incident(data, patch, resolved):
+    inc = next((i for i in data["active_incidents"] if i["id"] == patch["id"]), None)
+    if not inc:
+        return
+    data["active_incidents"] = [i for i in data["active_incidents"] if i["id"] != patch["id"]]
+    data["past_incidents"].append(dict(
+        inc,
+        Resolved=patch["resolved"],
+        ResolutionNotes=patch["resolution_notes"]
+    ))
+
+
+_APPLY = {
+    "assign": _apply_assign,
+    "create_location": _apply_create_location,
+    "update_location": _apply_update_location,
+    "archive_location": _apply_archive_location,
+    "add_historic": _apply_add_historic,
+    "create_incident": _apply_create_incident,
+    "resolve_incident": _apply_resolve_incident,
+}
+
+_REQUIRES = {
+    "assign": ("devices", "location_records"),
+    "create_location": ("location_records",),
+    "update_location": ("devices", "location_records"),
+    "archive_location": ("location_records",),
+    "add_historic": ("historic_records",),
+    "create_incident": ("active_incidents",),
+    "resolve_incident": ("active_incidents", "past_incidents"),
+}
@@ -0,0 +1,72 @@
+import json
+import os
+import queue
+import threading
+
+
+class NavigationStats:
+    """Cuenta las transiciones entre vistas (de dónde a dónde navegan los usuarios) y las guarda en disco"""
+
+    def __init__(self, path):
+        self.path = path
+        self._counts = {}
+        self._lock = threading.Lock()
+        try:
+            with open(path, encoding="utf-8") as fh:
+                self._counts = json.load(fh)
+        except (OSError, ValueError):
+            pass
+
+    def record(self, previous, current):
+        with self._lock:
+            nexts = self._counts.setdefault(previous, {})
+            nexts[current] = nexts.get(current, 0) + 1
+            snapshot = json.dumps(self._counts)
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        tmp = f"{self.path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp, "w", encoding="utf-8") as fh:
+            fh.write(snapshot)
+        os.replace(tmp, self.path)
+
+    def likely_next(self, current, limit):
+        with self._lock:
+            nexts = dict(self._counts.get(current, {}))
+        ranked = sorted(nexts.items(), key=lambda item: -item[1])
+        return [view for view, _ in ranked if view != current][:limit]
+
+
+class Prefetcher:
+    """Tras pintar una vista calienta en segundo plano las `limit` vistas que más suelen abrirse a continuación"""
+
+    def __init__(self, stats, warm, limit=2):
+        self.stats = stats
+        self.warm = warm
+        self.limit = limit
+        self.warmed = 0
+        self.last_error = None
+        self._queue = queue.Queue()
+        self._queued = set()
+        self._lock = threading.Lock()
+        threading.Thread(target=self._run, name="prefetch", daemon=True).start()
+
+    def visited(self, previous, current):
+        if previous and previous != current:
+            self.stats.record(previous, current)
+        for view in self.stats.likely_next(current, self.limit):
+            with self._lock:
+                if view in self._queued:
+                    continue
+                self._queued.add(view)
+            self._queue.put(view)
+
+    def _run(self):
+        while True:
+            view = self._queue.get()
+            with self._lock:
+                self._queued.discard(view)
+            try:
+                self.warm(view)
+                self.warmed += 1
+                self.last_error = None
+            except Exception as e:
+                self.last_error = str(e)
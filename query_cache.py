@@ -0,0 +1,96 @@
+import sys
+import threading
+import time
+
+from cachetools import TLRUCache
+
+from frozen import freeze
+from singleflight import jittered
+
+
+def deep_getsizeof(value):
+    """Tamaño aproximado en bytes de un registro proyectado (dicts, listas y escalares)"""
+    size = sys.getsizeof(value)
+    if isinstance(value, str):
+        return size
+    if hasattr(value, "items"):
+        return size + sum(deep_getsizeof(k) + deep_getsizeof(v) for k, v in value.items())
+    if isinstance(value, (list, tuple)):
+        return size + sum(deep_getsizeof(v) for v in value)
+    return size
+
+
+class _StatsTLRUCache(TLRUCache):
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.evictions = 0
+        self.expirations = 0
+
+    def popitem(self):
+        item = super().popitem()
+        self.evictions += 1
+        return item
+
+    def expire(self, time=None):
+        expired = super().expire(time)
+        self.expirations += len(expired)
+        return expired
+
+
+class ProjectedQueryCache:
+    """Caché LRU con caducidad por entrada y presupuesto de memoria para consultas proyectadas"""
+
+    def __init__(self, max_bytes):
+        self._cache = _StatsTLRUCache(
+            maxsize=max_bytes,
+            ttu=lambda key, value, now: now + jittered(key[-1]),
+            timer=time.monotonic,
+            getsizeof=lambda value: deep_getsizeof(value) + 200
+        )
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        with self._lock:
+            value = self._cache.get(key)
+            if value is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+            return value
+
+    def set(self, key, records):
+        """`key` termina en el TTL en segundos; los registros se guardan congelados"""
+        records = freeze(list(records))
+        with self._lock:
+            try:
+                self._cache[key] = records
+            except ValueError:
+                pass
+        return records
+
+    def invalidate(self, db):
+        with self._lock:
+            for key in [k for k in list(self._cache.keys()) if k[0] == db]:
+                try:
+                    del self._cache[key]
+                except KeyError:
+                    pass
+
+    def clear(self):
+        with self._lock:
+            self._cache.clear()
+
+    def stats(self):
+        with self._lock:
+            return {
+                "entries": len(self._cache),
+                "bytes": self._cache.currsize,
+                "max_bytes": self._cache.maxsize,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self._cache.evictions,
+                "expirations": self._cache.expirations
+            }
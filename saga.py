@@ -0,0 +1,173 @@
+RESULT_PREFIX = "$result:"
+SELF_REF = "$self"
+
+PENDING = "pending"
+DONE = "done"
+FAILED = "failed"
+UNDONE = "undone"
+KEPT = "kept"
+UNCERTAIN = "uncertain"
+
+RELATION_LIMIT = 100
+
+
+def step(method, path, json=None, label=None, after=(), compensate=None, writes=(), relation=None, touches=()):
+    """Declara un paso de la saga: una petición a Notion con sus dependencias y las bases de datos que modifica.
+
+    Con `relation` el cuerpo no se fija al declararlo: al ejecutar el paso se relee la relación de la página
+    y se envía sin los ids de "remove" y con los de "add". `touches` son otras páginas que cambia el paso,
+    como las del otro lado de una relación doble.
+    """
+    s = {"method": method, "path": path, "json": json}
+    if relation:
+        s["relation"] = relation
+    if touches:
+        s["touches"] = list(touches)
+    if writes:
+        s["writes"] = list(writes)
+    if label:
+        s["label"] = label
+    if after:
+        s["after"] = list(after)
+    if compensate:
+        s["compensate"] = compensate
+    return s
+
+
+def _refs(value, found):
+    if isinstance(value, str):
+        for part in value.split("/"):
+            if part.startswith(RESULT_PREFIX):
+                found.add(int(part[len(RESULT_PREFIX):]))
+    elif isinstance(value, dict):
+        for v in value.values():
+            _refs(v, found)
+    elif isinstance(value, list):
+        for v in value:
+            _refs(v, found)
+    return found
+
+
+def resolve(value, results, own=None):
+    """Sustituye "$result:N" por el id devuelto en el paso N y "$self" por el del propio paso"""
+    if isinstance(value, str):
+        parts = value.split("/")
+        for i, part in enumerate(parts):
+            if part.startswith(RESULT_PREFIX):
+                parts[i] = results[int(part[len(RESULT_PREFIX):])]
+            elif part == SELF_REF:
+                parts[i] = own
+        return "/".join(parts)
+    if isinstance(value, dict):
+        return {k: resolve(v, results, own) for k, v in value.items()}
+    if isinstance(value, list):
+        return [resolve(v, results, own) for v in value]
+    return value
+
+
+def relation_edit(prop, property_id, remove=(), add=()):
+    return {"property": prop, "property_id": property_id, "remove": list(remove), "add": list(add)}
+
+
+def edit_relation(spec, current):
+    """Cuerpo del PATCH de un paso con relación a partir de los ids que tiene ahora en Notion"""
+    ids = [i for i in current if i not in spec["remove"]]
+    ids += [i for i in spec["add"] if i not in ids]
+    return {"properties": {spec["property"]: {"relation": [{"id": i} for i in ids]}}}
+
+
+def touched_page(s):
+    if s["method"] == "PATCH" and s["path"].startswith("pages/"):
+        return s["path"].split("/", 1)[1]
+    return None
+
+
+def written_pages(op):
+    """Páginas que han cambiado los pasos completados, incluidas las del otro lado de sus relaciones"""
+    pages = set()
+    for s, state, result in zip(op["steps"], op["state"], op["results"]):
+        if state != DONE:
+            continue
+        if result:
+            pages.add(result)
+        for page in [touched_page(s)] + s.get("touches", []):
+            if page:
+                pages.add(resolve(page, op["results"]))
+    return sorted(pages)
+
+
+def dependencies(steps):
+    """Pasos de los que depende cada paso: "after" explícito, referencias $result y misma página"""
+    deps = []
+    last_on_page = {}
+    for i, s in enumerate(steps):
+        d = set(s.get("after", []))
+        _refs(s.get("path"), d)
+        _refs(s.get("json"), d)
+        page = touched_page(s)
+        if page:
+            if page in last_on_page:
+                d.add(last_on_page[page])
+            last_on_page[page] = i
+        deps.append(d)
+    return deps
+
+
+def initial_state(steps):
+    return [PENDING] * len(steps)
+
+
+def ready_steps(op):
+    """Pasos pendientes cuyas dependencias ya se han completado"""
+    deps = dependencies(op["steps"])
+    state = op["state"]
+    return [
+        i for i, s in enumerate(state)
+        if s == PENDING and all(state[d] == DONE for d in deps[i])
+    ]
+
+
+def undoable_steps(op):
+    """Pasos completados que ya no tienen dependientes por deshacer"""
+    deps = dependencies(op["steps"])
+    state = op["state"]
+    blocked = set()
+    for i, s in enumerate(state):
+        if s == DONE:
+            blocked |= deps[i]
+    return [i for i, s in enumerate(state) if s == DONE and i not in blocked]
+
+
+def request_for(op, i):
+    s = op["steps"][i]
+    return s["method"], resolve(s["path"], op["results"]), resolve(s.get("json"), op["results"])
+
+
+def relation_for(op, i):
+    return op["steps"][i].get("relation")
+
+
+def compensation_relation_for(op, i):
+    return (op["steps"][i].get("compensate") or {}).get("relation")
+
+
+def compensation_for(op, i):
+    comp = op["steps"][i].get("compensate")
+    if not comp:
+        return None
+    own = op["results"][i]
+    return (
+        comp["method"],
+        resolve(comp["path"], op["results"], own),
+        resolve(comp.get("json"), op["results"], own)
+    )
+
+
+def progress(op):
+    """Resumen por etiqueta de paso: [(etiqueta, {estado: n}, total)]"""
+    groups = {}
+    for s, state in zip(op["steps"], op["state"]):
+        label = s.get("label") or f"{s['method']} {s['path'].split('/')[0]}"
+        counts = groups.setdefault(label, {})
+        counts[state] = counts.get(state, 0) + 1
+    return [(label, counts, sum(counts.values())) for label, counts in groups.items()]
@@ -0,0 +1,151 @@
+import contextlib
+import json
+import os
+import threading
+import time
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+DEFAULT_STATE = {"status": "Planificado", "headphones": False}
+
+
+class ShipmentStateStore:
+    """Estado de preparación de cada envío (estado y cascos) compartido por todas las sesiones.
+
+    Se guarda en un fichero JSON local y se escribe en Notion en diferido con `push(loc_id, state)`:
+    los cambios seguidos de un mismo envío se agrupan en una sola petición y, si falla, se reintenta.
+    """
+
+    def __init__(self, path, push=None, delay=5, retry_after=30):
+        self.path = path
+        self.push = push
+        self.delay = delay
+        self.retry_after = retry_after
+        self.last_error = None
+        self._lock = threading.Lock()
+        self._cond = threading.Condition()
+        self._key = None
+        self._states = {}
+        self._due = {}
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+
+        for loc_id, state in self._read().items():
+            if not state.get("synced", True):
+                self._due[loc_id] = time.time()
+        if push:
+            threading.Thread(target=self._run, name="shipment-state", daemon=True).start()
+
+    def get(self, loc_id):
+        state = self._read().get(loc_id)
+        return {**DEFAULT_STATE, **state} if state else dict(DEFAULT_STATE)
+
+    def set(self, loc_id, **fields):
+        with self._locked() as states:
+            states[loc_id] = {
+                **DEFAULT_STATE,
+                **states.get(loc_id, {}),
+                **fields,
+                "updated": time.time(),
+                "synced": False
+            }
+        with self._cond:
+            self._due[loc_id] = time.time() + self.delay
+            self._cond.notify()
+
+    def seed(self, records, loaded_at):
+        """Adopta los valores leídos de Notion salvo que haya cambios locales más recientes"""
+        current = self._read()
+        fresh = {}
+        for r in records:
+            remote = {k: r.get(k) for k in DEFAULT_STATE if r.get(k) is not None}
+            if not remote:
+                continue
+            local = current.get(r["id"])
+            if local and (not local.get("synced", True) or local.get("updated", 0) >= loaded_at):
+                continue
+            if local and all(local.get(k) == v for k, v in remote.items()):
+                continue
+            fresh[r["id"]] = remote
+        if not fresh:
+            return
+
+        with self._locked() as states:
+            for loc_id, remote in fresh.items():
+                states[loc_id] = {**DEFAULT_STATE, **states.get(loc_id, {}), **remote, "updated": loaded_at, "synced": True}
+
+    def pending_count(self):
+        with self._cond:
+            return len(self._due)
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._due:
+                    self._cond.wait()
+                loc_id, due = min(self._due.items(), key=lambda item: item[1])
+                if due > time.time():
+                    self._cond.wait(due - time.time())
+                    continue
+                del self._due[loc_id]
+
+            state = self.get(loc_id)
+            try:
+                ok = self.push(loc_id, state)
+                self.last_error = None if ok else f"No se pudo guardar el estado de {loc_id}"
+            except Exception as e:
+                ok = False
+                self.last_error = str(e)
+
+            if ok:
+                with self._locked() as states:
+                    if loc_id in states and states[loc_id]["updated"] == state["updated"]:
+                        states[loc_id]["synced"] = True
+            else:
+                with self._cond:
+                    self._due.setdefault(loc_id, time.time() + self.retry_after)
+
+    def _file_key(self):
+        try:
+            st = os.stat(self.path)
+        except FileNotFoundError:
+            return None
+        return (st.st_ino, st.st_mtime_ns, st.st_size)
+
+    def _read(self):
+        key = self._file_key()
+        with self._lock:
+            if key != self._key:
+                self._states = self._load() if key else {}
+                self._key = key
+            return self._states
+
+    def _load(self):
+        try:
+            with open(self.path, encoding="utf-8") as fh:
+                return json.load(fh)
+        except (OSError, ValueError):
+            return {}
+
+    @contextlib.contextmanager
+    def _locked(self):
+        with self._lock:
+            fh = open(f"{self.path}.lock", "a")
+            try:
+                if fcntl:
+                    fcntl.flock(fh, fcntl.LOCK_EX)
+                states = self._load()
+                yield states
+
+                tmp = f"{self.path}.{os.getpid()}.{threading.get_ident()}.tmp"
+                with open(tmp, "w", encoding="utf-8") as out:
+                    json.dump(states, out)
+                os.replace(tmp, self.path)
+                self._key = self._file_key()
+                self._states = states
+            finally:
+                if fcntl:
+                    fcntl.flock(fh, fcntl.LOCK_UN)
+                fh.close()
@@ -0,0 +1,118 @@
+import os
+import random
+import threading
+import time
+
+import pyarrow as pa
+
+from frozen import freeze, thaw
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+
+class FleetSnapshot:
+    """Estado de la flota publicado en un fichero Arrow IPC compartido entre procesos.
+
+    Es una caché serializada, no una memoria compartida: la aplicación trabaja con dicts de Python, así que
+    cada proceso decodifica el fichero una vez por versión publicada y reparte esa copia congelada entre sus sesiones.
+    """
+
+    def __init__(self, path, derive=None):
+        self.path = path
+        self.derive = derive
+        self.invalidated_at = 0
+        self.version = 0
+        self.ttl_factor = random.uniform(0.9, 1.1)
+        self._refresh_fh = None
+        self._lock = threading.Lock()
+        self._key = None
+        self._data = None
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+
+    def write(self, data):
+        table = pa.table({name: pa.array([thaw(value)]) for name, value in data.items()})
+        tmp = f"{self.path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with pa.OSFile(tmp, "wb") as sink:
+            with pa.ipc.new_file(sink, table.schema) as writer:
+                writer.write_table(table)
+        os.replace(tmp, self.path)
+        return self._publish(self._file_key(), data)
+
+    def _file_key(self):
+        try:
+            st = os.stat(self.path)
+        except FileNotFoundError:
+            return None
+        return (st.st_ino, st.st_mtime_ns, st.st_size)
+
+    def read(self):
+        """Devuelve la última instantánea publicada, releyendo solo si el fichero ha cambiado"""
+        key = self._file_key()
+        if key is None:
+            return None
+
+        with self._lock:
+            if key == self._key:
+                return self._data
+
+        try:
+            with pa.OSFile(self.path, "rb") as source:
+                table = pa.ipc.open_file(source).read_all()
+        except (OSError, pa.ArrowInvalid):
+            return self._data
+
+        return self._publish(key, {name: table.column(name)[0].as_py() for name in table.column_names})
+
+    def _publish(self, key, data):
+        """Congela los datos y los guarda como nueva versión compartida por todas las sesiones"""
+        data = {name: freeze(value) for name, value in data.items()}
+        with self._lock:
+            self.version += 1
+            data["version"] = self.version
+            previous = self._data
+        if self.derive:
+            data = self.derive(data, previous)
+        data = freeze(data)
+
+        with self._lock:
+            if self._data is None or data["loaded_at"] >= self._data["loaded_at"]:
+                self._key = key
+                self._data = data
+            return self._data
+
+    def rederive(self):
+        """Recalcula las vistas derivadas de la versión actual, por ejemplo al cambiar de día"""
+        with self._lock:
+            key, data = self._key, self._data
+        if data is None:
+            return None
+        return self._publish(key, {name: value for name, value in data.items() if name != "version"})
+
+    def invalidate(self):
+        self.invalidated_at = max(self.invalidated_at, time.time())
+
+    def is_stale(self, data, ttl):
+        age = time.time() - data["loaded_at"]
+        return data["loaded_at"] < self.invalidated_at or age > ttl * self.ttl_factor
+
+    def lock_refresh(self, blocking=False):
+        """Bloqueo entre procesos para que solo uno refresque la instantánea a la vez"""
+        if fcntl is None:
+            return True
+        fh = open(f"{self.path}.lock", "a")
+        try:
+            fcntl.flock(fh, fcntl.LOCK_EX if blocking else fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            fh.close()
+            return False
+        self._refresh_fh = fh
+        return True
+
+    def unlock_refresh(self):
+        fh, self._refresh_fh = self._refresh_fh, None
+        if fh:
+            fcntl.flock(fh, fcntl.LOCK_UN)
+            fh.close()
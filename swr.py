@@ -0,0 +1,111 @@
+import functools
+import threading
+import time
+
+import metrics
+from frozen import freeze
+from singleflight import jittered
+
+
+class StaleWhileRevalidate:
+    """Caché por proceso que sirve el valor caducado mientras un único refresco corre en segundo plano.
+
+    Los valores se guardan congelados (ver frozen.py) porque se comparten entre todas las sesiones.
+    """
+
+    def __init__(self, fn, ttl):
+        functools.update_wrapper(self, fn)
+        self.fn = fn
+        self.ttl = ttl
+        self._entries = {}
+        self._refreshing = set()
+        self._lock = threading.Lock()
+
+    def __call__(self, *args):
+        with self._lock:
+            entry = self._entries.get(args)
+
+        if entry is None:
+            return self.fresh(*args)
+
+        if self._expired(entry):
+            self.revalidate(*args)
+        return entry["value"]
+
+    def fresh(self, *args):
+        """Recalcula el valor de forma síncrona y lo guarda"""
+        fetched_at = time.time()
+        with metrics.timer("loader_seconds", loader=self.fn.__name__):
+            value = freeze(self.fn(*args))
+        with self._lock:
+            current = self._entries.get(args)
+            if current is None or current["fetched_at"] <= fetched_at:
+                self._entries[args] = self._entry(value, fetched_at)
+        return value
+
+    def _entry(self, value, fetched_at):
+        return {"value": value, "fetched_at": fetched_at, "ttl": jittered(self.ttl), "stale": False}
+
+    def _expired(self, entry):
+        return entry["stale"] or time.time() - entry["fetched_at"] > entry["ttl"]
+
+    def latest(self, *args):
+        """Valor vigente; lo recalcula de forma síncrona solo si ha caducado o se ha invalidado"""
+        with self._lock:
+            entry = self._entries.get(args)
+        if entry and not self._expired(entry):
+            return entry["value"]
+        return self.fresh(*args)
+
+    def seed(self, value, fetched_at, *args):
+        with self._lock:
+            if args not in self._entries:
+                self._entries[args] = self._entry(freeze(value), fetched_at)
+
+    def revalidate(self, *args):
+        with self._lock:
+            if args in self._refreshing:
+                return
+            self._refreshing.add(args)
+        threading.Thread(target=self._refresh, args=args, daemon=True).start()
+
+    def _refresh(self, *args):
+        try:
+            self.fresh(*args)
+        except Exception:
+            pass
+        finally:
+            with self._lock:
+                self._refreshing.discard(args)
+
+    def clear(self):
+        """Marca los valores como caducados sin borrarlos: se siguen sirviendo hasta el refresco"""
+        with self._lock:
+            for entry in self._entries.values():
+                entry["stale"] = True
+
+
+_caches = {}
+_caches_lock = threading.Lock()
+
+
+def stale_while_revalidate(ttl):
+    """Como st.cache_data, la caché sobrevive a las re-ejecuciones del script y se comparte entre sesiones"""
+    def decorator(fn):
+        key = f"{fn.__module__}.{fn.__qualname__}"
+        with _caches_lock:
+            cache = _caches.get(key)
+            if cache is None:
+                cache = _caches[key] = StaleWhileRevalidate(fn, ttl)
+            else:
+                cache.fn = fn
+                cache.ttl = ttl
+        return cache
+    return decorator
+
+
+def clear_all():
+    with _caches_lock:
+        caches = list(_caches.values())
+    for cache in caches:
+        cache.clear()
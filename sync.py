@@ -0,0 +1,202 @@
+import json
+import os
+import threading
+import time
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+EDIT_GRANULARITY = 60
+OWN_WRITES_RETENTION = 600
+
+
+def edited_since_filter(since):
+    iso = datetime.fromtimestamp(since, tz=timezone.utc).isoformat()
+    return {
+        "filter": {"timestamp": "last_edited_time", "last_edited_time": {"on_or_after": iso}},
+        "page_size": 100
+    }
+
+
+def edited_at(page):
+    try:
+        return datetime.fromisoformat(page["last_edited_time"].replace("Z", "+00:00")).timestamp()
+    except (KeyError, AttributeError, ValueError):
+        return None
+
+
+class ChangeFeed:
+    """Proyección del events.EventLog que comparte el sondeo entre los procesos del servidor.
+
+    Los cambios que detecta el proceso que sondea llegan a los demás como eventos "sources_changed", y las
+    operaciones terminadas dicen qué páginas acaban de escribir para que el sondeo no las tome por ajenas.
+    """
+
+    def __init__(self, on_change):
+        self.on_change = on_change
+        self.started_at = time.time()
+        self._written = {}
+        self._lock = threading.Lock()
+
+    def project(self, event):
+        if event["ts"] < self.started_at - OWN_WRITES_RETENTION:
+            return
+        if event["kind"] == "operation_done":
+            with self._lock:
+                for page_id in event.get("pages", []):
+                    self._written[page_id] = max(self._written.get(page_id, 0), event["ts"])
+        elif event["kind"] == "sources_changed" and event["ts"] >= self.started_at and event.get("pid") != os.getpid():
+            self.on_change(event["databases"])
+
+    def written(self):
+        """Páginas escritas por la cola de cualquier proceso y cuándo terminó la operación"""
+        with self._lock:
+            horizon = time.time() - OWN_WRITES_RETENTION
+            self._written = {page_id: ts for page_id, ts in self._written.items() if ts >= horizon}
+            return dict(self._written)
+
+    def state(self):
+        return {}
+
+    def restore(self, state):
+        pass
+
+
+class SyncWorker:
+    """Hilo de fondo que calienta las cachés y sondea Notion buscando páginas editadas.
+
+    Todos los procesos calientan sus cachés, pero solo sondea el que tiene el bloqueo `lock_path`: si muere,
+    el sistema libera el bloqueo y lo toma otro en la siguiente vuelta.
+    """
+
+    def __init__(self, sources, query, warm, on_change, interval=30, lock_path=None, own_writes=None):
+        self.sources = list(sources)
+        self.query = query
+        self.warm = warm
+        self.on_change = on_change
+        self.interval = interval
+        self.lock_path = lock_path
+        self.own_writes = own_writes
+        self.polling = False
+        self._poll_fh = None
+        self.ready = threading.Event()
+        self.started_at = time.time()
+        self.last_sync = None
+        self.last_error = None
+        self.changes = 0
+        self._seen = {db: set() for db in self.sources}
+
+    def start(self):
+        threading.Thread(target=self._run, name="notion-sync", daemon=True).start()
+        return self
+
+    def _run(self):
+        while not self.ready.is_set():
+            since = time.time()
+            try:
+                self.warm()
+                self.last_sync = time.time()
+                self.last_error = None
+                self.ready.set()
+            except Exception as e:
+                self.last_error = str(e)
+                time.sleep(5)
+
+        while True:
+            time.sleep(self.interval)
+            poll_started = time.time()
+            self.polling = self._lock_poller()
+            if not self.polling:
+                since = poll_started
+                continue
+            try:
+                changed = self.poll(since)
+                if changed:
+                    self.changes += 1
+                    self.on_change(changed)
+                self.last_sync = poll_started
+                self.last_error = None
+                since = poll_started
+            except Exception as e:
+                self.last_error = str(e)
+
+    def _lock_poller(self):
+        if self._poll_fh is not None or self.lock_path is None or fcntl is None:
+            return True
+        fh = open(self.lock_path, "a")
+        try:
+            fcntl.flock(fh, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            fh.close()
+            return False
+        self._poll_fh = fh
+        return True
+
+    def poll(self, since):
+        """Bases de datos con páginas editadas desde `since` que no se habían visto ya ni acaba de escribir la cola"""
+        payload = edited_since_filter(since - EDIT_GRANULARITY)
+        written = self.own_writes() if self.own_writes else {}
+        changed = []
+        for db in self.sources:
+            seen = {
+                (p["id"], p.get("last_edited_time")) for p in self.query(db, payload)
+                if p["id"] not in written or (edited_at(p) or 0) > written[p["id"]]
+            }
+            if seen - self._seen[db]:
+                changed.append(db)
+            self._seen[db] = seen
+        return changed
+
+    def status(self):
+        return {
+            "ready": self.ready.is_set(),
+            "last_sync": self.last_sync,
+            "sync_age": round(time.time() - self.last_sync, 1) if self.last_sync else None,
+            "changes": self.changes,
+            "poller": self.polling,
+            "error": self.last_error,
+            "uptime": round(time.time() - self.started_at, 1)
+        }
+
+
+def serve_health(port, worker, extra_status=None, metrics=None):
+    """Expone /healthz (proceso vivo) y /ready (cachés calientes) para los health checks, y /metrics si se da `metrics`"""
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path == "/metrics" and metrics:
+                self._send(200, "text/plain; version=0.0.4; charset=utf-8", metrics().encode())
+                return
+
+            status = worker.status()
+            if extra_status:
+                status.update(extra_status())
+            if self.path == "/healthz":
+                code = 200
+            elif self.path == "/ready":
+                code = 200 if status["ready"] else 503
+            else:
+                self.send_error(404)
+                return
+            self._send(code, "application/json", json.dumps(status).encode())
+
+        def _send(self, code, content_type, body):
+            self.send_response(code)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    try:
+        server = ThreadingHTTPServer(("0.0.0.0", port), Handler)
+    except OSError:
+        return None
+    threading.Thread(target=server.serve_forever, name="health-server", daemon=True).start()
+    return server
@@ -0,0 +1,46 @@
+import pytest
+
+from depgraph import DependencyGraph
+
+
+def graph():
+    g = DependencyGraph()
+    g.register("summary", ["by_location", "devices"], compute=lambda d: (d["by_location"], len(d["devices"])))
+    g.register("by_location", ["devices", "locations"], compute=lambda d: {"n": len(d["devices"]) + len(d["locations"])})
+    g.register("devices", ["DEVICES"])
+    g.register("locations", ["LOCATIONS"])
+    g.register("incidents", ["INCIDENTS"])
+    return g
+
+
+def test_downstream_is_transitive_and_topological():
+    g = graph()
+
+    affected = g.downstream({"DEVICES"})
+    assert set(affected) == {"devices", "by_location", "summary"}
+    assert affected.index("devices") < affected.index("by_location") < affected.index("summary")
+
+    assert g.downstream({"LOCATIONS"}) == ["locations", "by_location", "summary"]
+    assert g.downstream({"INCIDENTS"}) == ["incidents"]
+    assert g.downstream({"UNKNOWN"}) == []
+
+
+def test_derive_computes_inputs_before_dependents_and_reuses_unchanged_views():
+    g = graph()
+    devices, locations = ("d1",), ("l1", "l2")
+
+    first = g.derive({"devices": devices, "locations": locations})
+    assert first["summary"] == ({"n": 3}, 1)
+
+    second = g.derive({"devices": devices, "locations": locations}, previous=first)
+    assert second["by_location"] is first["by_location"]
+    assert second["summary"] is first["summary"]
+
+
+def test_downstream_rejects_cycles():
+    g = DependencyGraph()
+    g.register("a", ["b", "SRC"])
+    g.register("b", ["a"])
+
+    with pytest.raises(ValueError):
+        g.downstream({"SRC"})
@@ -0,0 +1,76 @@
+import json
+import multiprocessing
+import os
+
+from events import EventLog
+
+
+class Recorder:
+    def __init__(self):
+        self.events = []
+
+    def project(self, event):
+        self.events.append((event["seq"], event["kind"]))
+
+    def state(self):
+        return {"events": self.events}
+
+    def restore(self, state):
+        self.events = [tuple(e) for e in state["events"]]
+
+
+def append_many(path, tag, n):
+    log = EventLog(path)
+    for i in range(n):
+        log.append("tick", tag=tag, i=i)
+
+
+def test_seq_is_unique_across_instances_sharing_the_file(tmp_path):
+    path = str(tmp_path / "events.jsonl")
+    first, second = EventLog(path), EventLog(path)
+
+    seqs = [first.append("a")["seq"], second.append("b")["seq"], first.append("c")["seq"]]
+
+    assert seqs == [1, 2, 3]
+    with open(path) as fh:
+        assert [json.loads(line)["seq"] for line in fh] == [1, 2, 3]
+
+
+def test_seq_is_the_line_number_with_concurrent_processes(tmp_path):
+    path = str(tmp_path / "events.jsonl")
+    ctx = multiprocessing.get_context("fork")
+    procs = [ctx.Process(target=append_many, args=(path, tag, 50)) for tag in "abc"]
+    for p in procs:
+        p.start()
+    for p in procs:
+        p.join()
+
+    with open(path) as fh:
+        assert [json.loads(line)["seq"] for line in fh] == list(range(1, 151))
+
+
+def test_sync_projects_events_appended_by_other_instances(tmp_path):
+    path = str(tmp_path / "events.jsonl")
+    reader, writer = EventLog(path), EventLog(path)
+    recorder = Recorder()
+    reader.subscribe("recorder", recorder)
+
+    writer.append("a")
+    writer.append("b")
+
+    assert reader.sync() == 2
+    assert recorder.events == [(1, "a"), (2, "b")]
+
+
+def test_checkpoint_replay_matches_a_full_replay(tmp_path):
+    path = str(tmp_path / "events.jsonl")
+    writer = EventLog(path, checkpoint_every=3)
+    writer.subscribe("recorder", Recorder())
+    for i in range(7):
+        writer.append(f"e{i}")
+    assert os.path.exists(path + ".checkpoint")
+
+    restored = Recorder()
+    EventLog(path).subscribe("recorder", restored)
+
+    assert restored.events == [(i + 1, f"e{i}") for i in range(7)]
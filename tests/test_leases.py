@@ -0,0 +1,31 @@
+from leases import LeaseTable
+
+
+def test_leases_block_other_holders_until_released(tmp_path):
+    table = LeaseTable(str(tmp_path / "leases.json"), ttl=60)
+
+    assert table.acquire("a", ["d1", "d2"]) == []
+    assert table.acquire("b", ["d2", "d3"]) == ["d2"]
+    assert table.held_by_others("b") == {"d1", "d2"}
+
+    table.release("a", ["d2"])
+    assert table.held_by_others("b") == {"d1"}
+    assert table.acquire("b", ["d2"]) == []
+
+
+def test_leases_expire_after_ttl(tmp_path):
+    table = LeaseTable(str(tmp_path / "leases.json"), ttl=-1)
+
+    table.acquire("a", ["d1"])
+    assert table.held_by_others("b") == set()
+    assert table.acquire("b", ["d1"]) == []
+
+
+def test_leases_are_shared_between_tables_on_the_same_file(tmp_path):
+    path = str(tmp_path / "leases.json")
+    first, second = LeaseTable(path), LeaseTable(path)
+
+    first.acquire("a", ["d1"])
+    assert second.acquire("b", ["d1"]) == ["d1"]
+    first.release("a")
+    assert second.held_by_others("b") == set()
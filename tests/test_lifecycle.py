@@ -0,0 +1,67 @@
+from datetime import date, timedelta
+
+import pytest
+
+from lifecycle import HISTORY_DAYS, LifecycleScheduler, classify, next_transition
+
+TODAY = date(2025, 3, 10)
+
+
+def shipment(start, end, record_id="loc", type="Client"):
+    return {
+        "id": record_id,
+        "type": type,
+        "start": start.isoformat() if start else None,
+        "end": end.isoformat() if end else None
+    }
+
+
+@pytest.mark.parametrize("start, end, expected", [
+    (TODAY + timedelta(days=1), TODAY + timedelta(days=5), {"future"}),
+    (TODAY, TODAY + timedelta(days=5), {"active"}),
+    (TODAY - timedelta(days=3), None, {"active"}),
+    (TODAY - timedelta(days=3), TODAY, {"pending", "historic"}),
+    (TODAY - timedelta(days=40), TODAY - timedelta(days=HISTORY_DAYS), {"pending", "historic"}),
+    (TODAY - timedelta(days=40), TODAY - timedelta(days=HISTORY_DAYS + 1), {"pending"}),
+])
+def test_classify_boundaries(start, end, expected):
+    assert classify(shipment(start, end), TODAY) == expected
+
+
+def test_classify_ignores_non_client_locations():
+    assert classify(shipment(TODAY, TODAY, type="Office"), TODAY) == frozenset()
+    assert next_transition(shipment(TODAY, TODAY, type="Office"), TODAY) is None
+
+
+def test_next_transition_walks_start_end_and_history_limit():
+    start = TODAY + timedelta(days=2)
+    end = TODAY + timedelta(days=6)
+    record = shipment(start, end)
+
+    assert next_transition(record, TODAY) == start
+    assert next_transition(record, start) == end
+    assert next_transition(record, end) == end + timedelta(days=HISTORY_DAYS + 1)
+    assert next_transition(record, end + timedelta(days=HISTORY_DAYS + 1)) is None
+
+
+def test_scheduler_matches_classify_day_by_day():
+    records = [
+        shipment(TODAY + timedelta(days=i), TODAY + timedelta(days=i + 3), record_id=f"loc{i}")
+        for i in range(-40, 10, 3)
+    ]
+    clock = {"today": TODAY}
+    scheduler = LifecycleScheduler(clock=lambda: clock["today"])
+
+    for offset in list(range(0, 60)) + [20, 5]:
+        clock["today"] = TODAY + timedelta(days=offset)
+        view = scheduler.sync(records)
+        for bucket, members in view.items():
+            expected = [r["id"] for r in records if bucket in classify(r, clock["today"])]
+            assert [r["id"] for r in members] == expected
+
+
+def test_scheduler_returns_same_view_when_nothing_changes():
+    scheduler = LifecycleScheduler(clock=lambda: TODAY)
+    records = [shipment(TODAY + timedelta(days=5), TODAY + timedelta(days=8))]
+
+    assert scheduler.sync(records) is scheduler.sync(list(records))
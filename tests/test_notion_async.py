@@ -0,0 +1,73 @@
+import socket
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+import notion_api
+from notion_async import AsyncNotionClient
+
+
+@pytest.fixture
+def notion(monkeypatch):
+    hits = []
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            hits.append(self.path)
+            self.rfile.read(int(self.headers.get("Content-Length", 0)))
+            self.send_response(500)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    monkeypatch.setattr(notion_api, "NOTION_API", f"http://127.0.0.1:{server.server_address[1]}")
+    yield hits
+    server.shutdown()
+
+
+def closed_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def client(max_attempts=2):
+    return AsyncNotionClient({}, rate=100, burst=100, max_attempts=max_attempts)
+
+
+def test_page_creation_is_not_retried_after_a_server_error(notion):
+    c = client()
+    status, data = c.run(c.request("POST", "pages", {}))
+
+    assert status == 500
+    assert notion == ["/pages"]
+
+
+def test_queries_are_retried_after_a_server_error(notion):
+    c = client()
+    status, data = c.run(c.request("POST", "databases/db/query", {}))
+
+    assert status == 500
+    assert notion == ["/databases/db/query"] * 2
+
+
+def test_page_creation_is_retried_when_the_connection_is_refused(monkeypatch):
+    monkeypatch.setattr(notion_api, "NOTION_API", f"http://127.0.0.1:{closed_port()}")
+    breaker = notion_api.CircuitBreaker()
+    c = AsyncNotionClient({}, breaker=breaker, rate=100, burst=100, max_attempts=2)
+
+    with pytest.raises(notion_api.NotionUnavailable):
+        c.run(c.request("POST", "pages", {}))
+    assert breaker.status()["failures"] == 2
+
+
+def test_relation_ids_returns_none_when_notion_is_unreachable(monkeypatch):
+    monkeypatch.setattr(notion_api, "NOTION_API", f"http://127.0.0.1:{closed_port()}")
+    c = AsyncNotionClient({}, rate=100, burst=100, max_attempts=1)
+
+    assert c.relation_ids_many([("page", "prop"), ("other", "prop")]) == [None, None]
@@ -0,0 +1,110 @@
+import optimistic
+
+
+def base(event_seq=0, loaded_at=100.0, devices=None, locations=None):
+    return {
+        "loaded_at": loaded_at,
+        "event_seq": event_seq,
+        "devices": devices if devices is not None else [
+            {"id": "d1", "location_ids": ["office"], "Start": None, "End": None},
+            {"id": "d2", "location_ids": ["office"], "Start": None, "End": None}
+        ],
+        "location_records": locations if locations is not None else [
+            {"id": "office", "name": "Office", "type": "Office", "start": None, "end": None}
+        ]
+    }
+
+
+def no_derive(data, previous):
+    return data
+
+
+def submit(overlay, op_id, patches, seq):
+    overlay.project({"kind": "operation_submitted", "op_id": op_id, "patches": patches, "ts": 1.0, "seq": seq})
+
+
+def new_shipment(overlay, seq=1):
+    temp_id = optimistic.pending_id()
+    submit(overlay, "op1", [
+        optimistic.create_location_patch(temp_id, "Cliente", "Client", "2025-03-01", "2025-03-05", step=0),
+        optimistic.assign_patch(["d1"], temp_id)
+    ], seq)
+    return temp_id
+
+
+def test_pending_patches_are_applied_over_the_base():
+    overlay = optimistic.OptimisticOverlay()
+    temp_id = new_shipment(overlay)
+
+    data = overlay.apply(base(), no_derive)
+
+    assert [r["id"] for r in data["location_records"]] == ["office", temp_id]
+    assert data["devices"][0]["location_ids"] == (temp_id,)
+    assert data["devices"][1]["location_ids"] == ("office",)
+
+
+def test_confirmed_ids_replace_the_temporary_one():
+    overlay = optimistic.OptimisticOverlay()
+    temp_id = new_shipment(overlay)
+    overlay.project({"kind": "operation_done", "op_id": "op1", "results": ["real"], "ts": 2.0, "seq": 5})
+
+    data = overlay.apply(base(event_seq=4), no_derive)
+
+    assert overlay.resolved_id(temp_id) == "real"
+    assert data["devices"][0]["location_ids"] == ("real",)
+
+
+def test_patch_is_dropped_only_once_the_base_was_read_after_the_confirmation():
+    overlay = optimistic.OptimisticOverlay()
+    new_shipment(overlay)
+    overlay.project({"kind": "operation_done", "op_id": "op1", "results": ["real"], "ts": 2.0, "seq": 5})
+
+    overlay.apply(base(event_seq=4, loaded_at=500.0), no_derive)
+    assert overlay.pending_count() == 2
+
+    reflected = base(event_seq=5, locations=[
+        {"id": "office", "name": "Office", "type": "Office", "start": None, "end": None},
+        {"id": "real", "name": "Cliente", "type": "Client", "start": "2025-03-01", "end": "2025-03-05"}
+    ])
+    assert overlay.apply(reflected, no_derive) is reflected
+    assert overlay.pending_count() == 0
+
+
+def test_failed_operations_are_discarded():
+    overlay = optimistic.OptimisticOverlay()
+    new_shipment(overlay)
+    overlay.project({"kind": "operation_failed", "op_id": "op1", "ts": 2.0, "seq": 2})
+
+    data = base()
+    assert overlay.apply(data, no_derive) is data
+
+
+def test_incremental_apply_matches_a_full_apply():
+    incremental = optimistic.OptimisticOverlay()
+    data = base()
+    incremental.apply(data, no_derive)
+    patches = [
+        [optimistic.assign_patch(["d1"], "office")],
+        [optimistic.update_location_patch("office", start="2025-01-01")],
+        [optimistic.assign_patch(["d2"], "office")]
+    ]
+    for i, p in enumerate(patches):
+        submit(incremental, f"op{i}", p, i + 1)
+        result = incremental.apply(data, no_derive)
+
+    full = optimistic.OptimisticOverlay()
+    for i, p in enumerate(patches):
+        submit(full, f"op{i}", p, i + 1)
+
+    assert result == full.apply(base(), no_derive)
+    assert data["devices"][0]["Start"] is None
+
+
+def test_state_round_trips_through_restore():
+    overlay = optimistic.OptimisticOverlay()
+    new_shipment(overlay)
+
+    restored = optimistic.OptimisticOverlay()
+    restored.restore(overlay.state())
+
+    assert restored.apply(base(), no_derive) == overlay.apply(base(), no_derive)
@@ -0,0 +1,42 @@
+import saga
+
+
+def test_ready_steps_follow_results_after_and_page_order():
+    steps = [
+        saga.step("POST", "pages", {"parent": {}}),
+        saga.step("PATCH", "pages/dev1", {"properties": {"Location": "$result:0"}}),
+        saga.step("PATCH", "pages/dev1", {"properties": {}}),
+        saga.step("PATCH", "pages/loc9", {}, after=[0]),
+        saga.step("PATCH", "pages/dev2", {}),
+    ]
+    op = {"steps": steps, "state": saga.initial_state(steps)}
+
+    assert saga.ready_steps(op) == [0, 4]
+    op["state"][0] = saga.DONE
+    op["state"][4] = saga.DONE
+    assert saga.ready_steps(op) == [1, 3]
+    op["state"][1] = saga.DONE
+    assert saga.ready_steps(op) == [2, 3]
+
+
+def test_undoable_steps_unwind_dependents_first():
+    steps = [
+        saga.step("POST", "pages", {}),
+        saga.step("PATCH", "pages/dev1", {"properties": {"Location": "$result:0"}}),
+        saga.step("PATCH", "pages/dev1", {}),
+        saga.step("PATCH", "pages/dev2", {}),
+    ]
+    op = {"steps": steps, "state": [saga.DONE] * len(steps)}
+
+    assert saga.undoable_steps(op) == [2, 3]
+    op["state"][2] = saga.UNDONE
+    op["state"][3] = saga.UNDONE
+    assert saga.undoable_steps(op) == [1]
+    op["state"][1] = saga.UNDONE
+    assert saga.undoable_steps(op) == [0]
+
+
+def test_resolve_substitutes_results_and_self():
+    value = {"path": "pages/$result:0", "children": ["$self", "$result:1"]}
+
+    assert saga.resolve(value, ["a", "b"], own="c") == {"path": "pages/a", "children": ["c", "b"]}
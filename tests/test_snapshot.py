@@ -0,0 +1,50 @@
+from snapshot import FleetSnapshot
+
+
+def sample():
+    return {
+        "loaded_at": 100.0,
+        "devices": [
+            {"id": "d1", "Name": "Gafa 1", "location_ids": ["l1"], "Start": None},
+            {"id": "d2", "Name": "Gafa 2", "location_ids": [], "Start": "2026-01-01"}
+        ],
+        "office_id": "l1"
+    }
+
+
+def test_snapshot_round_trips_between_processes(tmp_path):
+    path = str(tmp_path / "fleet.arrow")
+    FleetSnapshot(path).write(sample())
+
+    data = FleetSnapshot(path).read()
+
+    assert data["loaded_at"] == 100.0
+    assert data["office_id"] == "l1"
+    assert [dict(d) for d in data["devices"]] == [
+        {"id": "d1", "Name": "Gafa 1", "location_ids": ("l1",), "Start": None},
+        {"id": "d2", "Name": "Gafa 2", "location_ids": (), "Start": "2026-01-01"}
+    ]
+
+
+def test_read_reuses_the_decoded_version_until_the_file_changes(tmp_path):
+    path = str(tmp_path / "fleet.arrow")
+    writer, reader = FleetSnapshot(path), FleetSnapshot(path)
+    writer.write(sample())
+
+    first = reader.read()
+    assert reader.read() is first
+
+    writer.write(dict(sample(), loaded_at=200.0))
+    assert reader.read()["loaded_at"] == 200.0
+
+
+def test_missing_or_corrupt_file_keeps_the_last_version(tmp_path):
+    path = str(tmp_path / "fleet.arrow")
+    reader = FleetSnapshot(path)
+    assert reader.read() is None
+
+    FleetSnapshot(path).write(sample())
+    good = reader.read()
+    with open(path, "wb") as fh:
+        fh.write(b"not arrow")
+    assert reader.read() is good
@@ -0,0 +1,89 @@
+import threading
+import time
+
+from swr import StaleWhileRevalidate
+
+
+def counting_loader():
+    calls = []
+
+    def load(key):
+        calls.append(key)
+        return {"key": key, "n": len(calls)}
+    return load, calls
+
+
+def wait_for(condition, timeout=5):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if condition():
+            return True
+        time.sleep(0.01)
+    return False
+
+
+def test_first_call_loads_and_later_calls_reuse_the_value():
+    load, calls = counting_loader()
+    cache = StaleWhileRevalidate(load, ttl=60)
+
+    assert cache("a")["n"] == 1
+    assert cache("a")["n"] == 1
+    assert calls == ["a"]
+
+
+def test_cleared_value_is_served_while_a_single_refresh_runs():
+    release = threading.Event()
+    calls = []
+
+    def load(key):
+        calls.append(key)
+        if len(calls) > 1:
+            release.wait(5)
+        return len(calls)
+
+    cache = StaleWhileRevalidate(load, ttl=60)
+    assert cache("a") == 1
+    cache.clear()
+
+    assert [cache("a") for _ in range(5)] == [1] * 5
+    release.set()
+    assert wait_for(lambda: cache("a") == 2)
+    assert len(calls) == 2
+
+
+def test_latest_reloads_synchronously_after_clear():
+    load, calls = counting_loader()
+    cache = StaleWhileRevalidate(load, ttl=60)
+    cache("a")
+    cache.clear()
+
+    assert cache.latest("a")["n"] == 2
+    assert cache.latest("a")["n"] == 2
+
+
+def test_seed_does_not_replace_a_loaded_value():
+    load, calls = counting_loader()
+    cache = StaleWhileRevalidate(load, ttl=60)
+    cache.seed({"key": "a", "n": 0}, time.time(), "a")
+    cache.seed({"key": "a", "n": -1}, time.time(), "a")
+
+    assert cache("a")["n"] == 0
+    assert calls == []
+
+
+def test_failed_refresh_keeps_serving_the_stale_value():
+    calls = []
+
+    def load(key):
+        calls.append(key)
+        if len(calls) > 1:
+            raise RuntimeError("Notion caído")
+        return "ok"
+
+    cache = StaleWhileRevalidate(load, ttl=60)
+    cache("a")
+    cache.clear()
+
+    assert cache("a") == "ok"
+    assert wait_for(lambda: len(calls) == 2 and not cache._refreshing)
+    assert cache("a") == "ok"
@@ -0,0 +1,62 @@
+import os
+import time
+from datetime import datetime, timezone
+
+from events import EventLog
+from sync import ChangeFeed, SyncWorker
+
+
+def page(page_id, edited):
+    return {"id": page_id, "last_edited_time": edited}
+
+
+def worker(pages, **kwargs):
+    return SyncWorker(["DB"], lambda db, payload: pages, warm=lambda: None, on_change=lambda dbs: None, **kwargs)
+
+
+def test_only_one_worker_per_lock_file_polls(tmp_path):
+    lock = str(tmp_path / "sync.lock")
+    first, second = worker([], lock_path=lock), worker([], lock_path=lock)
+
+    assert first._lock_poller()
+    assert not second._lock_poller()
+    assert first._lock_poller()
+
+
+def test_poll_skips_pages_the_write_queue_just_wrote():
+    pages = [page("mine", "2026-10-19T10:00:00.000Z")]
+    written = {"mine": datetime(2026, 10, 19, 10, 0, 30, tzinfo=timezone.utc).timestamp()}
+    w = worker(pages, own_writes=lambda: written)
+
+    assert w.poll(time.time()) == []
+
+    pages.append(page("other", "2026-10-19T10:00:00.000Z"))
+    assert w.poll(time.time()) == ["DB"]
+
+
+def test_feed_shares_detected_changes_and_written_pages_between_processes(tmp_path):
+    path = str(tmp_path / "events.jsonl")
+    received = []
+    feed = ChangeFeed(on_change=received.append)
+    reader = EventLog(path)
+    reader.subscribe("changes", feed)
+
+    writer = EventLog(path)
+    writer.append("operation_done", op_id="op", results=["p1"], pages=["p1", "p2"])
+    writer.append("sources_changed", databases=["DB"], pid=-1)
+    reader.sync()
+
+    assert received == [["DB"]]
+    assert set(feed.written()) == {"p1", "p2"}
+
+
+def test_feed_ignores_its_own_process_and_old_changes(tmp_path):
+    path = str(tmp_path / "events.jsonl")
+    EventLog(path).append("sources_changed", databases=["OLD"], pid=-1)
+    received = []
+    feed = ChangeFeed(on_change=received.append)
+    log = EventLog(path)
+    log.subscribe("changes", feed)
+
+    log.append("sources_changed", databases=["MINE"], pid=os.getpid())
+    assert received == []
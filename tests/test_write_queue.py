@@ -0,0 +1,189 @@
+import json
+import threading
+import time
+
+import saga
+from write_queue import WriteQueue
+
+
+class FakeClient:
+    breaker = None
+
+    def __init__(self, relations=None):
+        self.sent = []
+        self.relations = relations or {}
+
+    def relation_ids_many(self, properties):
+        return [self.relations.get(page_id) for page_id, _ in properties]
+
+    def send_many(self, requests):
+        self.sent.extend(requests)
+        return [(200, {"id": f"page{len(self.sent)}"}, None) for _ in requests]
+
+
+def create_step(name="x"):
+    return {"method": "POST", "path": "pages", "json": {"name": name}}
+
+
+def wait_for(condition, timeout=5):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if condition():
+            return True
+        time.sleep(0.05)
+    return False
+
+
+def orphan_line(op_id, owner="gone"):
+    return json.dumps({
+        "id": op_id, "label": op_id, "steps": [create_step()], "results": [None], "state": ["pending"],
+        "mode": "forward", "status": "running", "attempts": 0, "error": None, "created": time.time(),
+        "next_attempt": 0, "invalidate": [], "owner": owner, "updated": time.time()
+    }) + "\n"
+
+
+def test_each_queue_only_runs_its_own_operations(tmp_path):
+    journal = str(tmp_path / "journal.jsonl")
+    first_client, second_client = FakeClient(), FakeClient()
+    first = WriteQueue(journal, first_client, workers=1)
+    second = WriteQueue(journal, second_client, workers=1)
+
+    ids = [first.submit(f"op{i}", [create_step()]) for i in range(3)]
+
+    assert wait_for(lambda: all(op["status"] == "done" for op in second.operations() if op["id"] in ids))
+    assert len(first_client.sent) == 3
+    assert second_client.sent == []
+
+
+def test_concurrent_adoption_gives_the_orphan_a_single_owner(tmp_path):
+    journal = str(tmp_path / "journal.jsonl")
+    with open(journal, "w") as fh:
+        fh.write(orphan_line("orphan"))
+    first = WriteQueue(journal, FakeClient(), workers=0)
+    second = WriteQueue(journal, FakeClient(), workers=0)
+
+    threads = [threading.Thread(target=q._adopt_orphans) for q in (first, second) for _ in range(3)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    owners = {
+        next(op["owner"] for op in q.operations() if op["id"] == "orphan")
+        for q in (first, second)
+    }
+    assert len(owners) == 1
+    assert owners <= {first.owner, second.owner}
+
+
+def test_orphan_of_a_dead_process_runs_exactly_once(tmp_path):
+    journal = str(tmp_path / "journal.jsonl")
+    clients = [FakeClient(), FakeClient()]
+    queues = [WriteQueue(journal, client, workers=1) for client in clients]
+    with open(journal, "a") as fh:
+        fh.write(orphan_line("orphan"))
+
+    assert wait_for(lambda: any(op["id"] == "orphan" and op["status"] == "done" for op in queues[0].operations()))
+    time.sleep(0.3)
+    assert len(clients[0].sent) + len(clients[1].sent) == 1
+
+
+def test_journal_is_compacted_while_running(tmp_path):
+    journal = str(tmp_path / "journal.jsonl")
+    queue = WriteQueue(journal, FakeClient(), workers=0)
+    op_id = queue.submit("x", [create_step()])
+
+    with queue._cond:
+        for _ in range(300):
+            queue._persist(queue._ops[op_id])
+
+    with open(journal) as fh:
+        assert sum(1 for _ in fh) <= 105
+    assert [op["id"] for op in WriteQueue(journal, FakeClient(), workers=0).operations()] == [op_id]
+
+
+def test_relation_steps_reread_the_relation_when_they_run(tmp_path):
+    client = FakeClient({"loc": ["a", "b", "c"]})
+    queue = WriteQueue(str(tmp_path / "journal.jsonl"), client, workers=1)
+    step = saga.step("PATCH", "pages/loc", relation=saga.relation_edit("Devices", "prop", remove=["a"], add=["d"]))
+    client.relations["loc"].append("e")
+
+    op_id = queue.submit("x", [step])
+
+    assert wait_for(lambda: any(op["id"] == op_id and op["status"] == "done" for op in queue.operations()))
+    assert client.sent == [(
+        "PATCH", "pages/loc",
+        {"properties": {"Devices": {"relation": [{"id": i} for i in ["b", "c", "e", "d"]]}}}
+    )]
+
+
+def test_relation_step_is_retried_when_the_relation_cannot_be_read(tmp_path):
+    client = FakeClient()
+    queue = WriteQueue(str(tmp_path / "journal.jsonl"), client, workers=1)
+    step = saga.step("PATCH", "pages/loc", relation=saga.relation_edit("Devices", "prop", remove=["a"]))
+
+    op_id = queue.submit("x", [step])
+
+    assert wait_for(lambda: any(op["id"] == op_id and op["attempts"] == 1 for op in queue.operations()))
+    op = next(op for op in queue.operations() if op["id"] == op_id)
+    assert op["status"] == "pending"
+    assert client.sent == []
+
+
+class ScriptedClient(FakeClient):
+    def __init__(self, outcomes):
+        super().__init__()
+        self.outcomes = list(outcomes)
+
+    def send_many(self, requests):
+        self.sent.extend(requests)
+        outcome = self.outcomes.pop(0) if self.outcomes else (200, {"id": "page"}, None)
+        if isinstance(outcome, Exception):
+            raise outcome
+        return [outcome for _ in requests]
+
+
+def operation(queue, op_id):
+    return next(op for op in queue.operations() if op["id"] == op_id)
+
+
+def test_post_that_may_have_reached_notion_is_not_resent(tmp_path):
+    client = ScriptedClient([(599, None, "Timeout during request")])
+    queue = WriteQueue(str(tmp_path / "journal.jsonl"), client, workers=1)
+
+    op_id = queue.submit("x", [create_step()])
+
+    assert wait_for(lambda: operation(queue, op_id)["status"] == "failed")
+    assert operation(queue, op_id)["state"] == [saga.UNCERTAIN]
+    time.sleep(0.3)
+    assert len(client.sent) == 1
+
+    queue.retry(op_id)
+    assert wait_for(lambda: operation(queue, op_id)["status"] == "done")
+    assert len(client.sent) == 2
+
+
+def test_post_rejected_before_sending_is_retried(tmp_path):
+    client = ScriptedClient([(None, None, "Circuito abierto")])
+    queue = WriteQueue(str(tmp_path / "journal.jsonl"), client, workers=1)
+
+    op_id = queue.submit("x", [create_step()])
+
+    assert wait_for(lambda: operation(queue, op_id)["attempts"] == 1)
+    assert operation(queue, op_id)["status"] == "pending"
+
+
+def test_worker_survives_a_client_exception(tmp_path):
+    client = ScriptedClient([ConnectionResetError("reset")])
+    queue = WriteQueue(str(tmp_path / "journal.jsonl"), client, workers=1)
+
+    op_id = queue.submit("x", [saga.step("PATCH", "pages/p", {"archived": True})])
+
+    assert wait_for(lambda: operation(queue, op_id)["error"] == "reset")
+    op = operation(queue, op_id)
+    assert op["status"] == "pending"
+    assert op_id not in queue._running
+    with queue._cond:
+        queue._ops[op_id]["next_attempt"] = 0
+        queue._cond.notify_all()
+    assert wait_for(lambda: operation(queue, op_id)["status"] == "done")
@@ -0,0 +1,612 @@
+import streamlit as st
+from datetime import datetime, date
+import functools
+import os
+import time
+import optimistic
+import saga
+import notion_api
+import metrics
+from data_layer import (
+    DATASET_LABELS,
+    data_version,
+    get_circuit_breaker,
+    get_write_queue,
+    iso_to_date,
+    section_data,
+    set_shipment_state,
+    shipment_state
+)
+
+PREFERRED_TAG_ORDER = ["Ultra", "Neo 4", "Quest 2", "Quest 3", "Quest 3S", "Vision Pro"]
+
+
+def show_feedback(message_type, message, duration=None):
+    placeholder = st.empty()
+    
+    with placeholder.container():
+        if message_type == 'success':
+            st.success(message, icon="✅")
+        elif message_type == 'error':
+            st.error(message)
+        elif message_type == 'warning':
+            st.warning(message)
+        elif message_type == 'info':
+            st.info(message)
+        elif message_type == 'spinner':
+            with st.spinner(message):
+                return placeholder
+    
+    if duration:
+        time.sleep(duration)
+        placeholder.empty()
+    
+    return placeholder
+
+def fmt(date_str):
+    try:
+        dt = iso_to_date(date_str)
+        return dt.strftime("%d/%m/%Y")
+    except:
+        return date_str
+    
+def fmt_datetime(date_str):
+    try:
+        dt = datetime.fromisoformat(date_str)
+        return dt.strftime("%d/%m/%Y %H:%M")
+    except:
+        return date_str if date_str else "Sin fecha"
+
+def format_relative_date(date_obj):
+    today = date.today()
+    days_diff = (date_obj - today).days
+    
+    day_names = ["lunes", "martes", "miércoles", "jueves", "viernes", "sábado", "domingo"]
+    day_name = day_names[date_obj.weekday()]
+    day_num = date_obj.day
+    
+    if days_diff == 0:
+        return "hoy"
+    elif days_diff == 1:
+        return "mañana"
+    elif days_diff == -1:
+        return "ayer"
+    elif 2 <= days_diff <= 6:
+        return f"este {day_name}, día {day_num}"
+    elif 7 <= days_diff <= 13:
+        return f"el {day_name} que viene, día {day_num}"
+    elif -7 <= days_diff <= -2:
+        return f"el {day_name} pasado, día {day_num}"
+    elif days_diff < -7:
+        weeks_ago = abs(days_diff) // 7
+        if weeks_ago == 1:
+            return f"hace una semana, día {day_num}"
+        else:
+            return f"hace {weeks_ago} semanas, día {day_num}"
+    else:
+        return f"dentro de {days_diff} días"
+
+SHIPMENT_STATUSES = {
+    "Planificado": "📋",
+    "Empaquetado": "📦",
+    "En camino": "🚚"
+}
+
+def get_shipment_status_icon(loc_id):
+    return SHIPMENT_STATUSES.get(shipment_state(loc_id)["status"], "📋")
+
+def save_shipment_status(loc_id, key):
+    set_shipment_state(loc_id, status=st.session_state[key].split(" ", 1)[1])
+
+def save_headphones(loc_id, key):
+    set_shipment_state(loc_id, headphones=st.session_state[key])
+
+def pending_notice(page_id):
+    saving = optimistic.is_pending_id(page_id)
+    if saving:
+        st.caption("⏳ Guardando en Notion. Podrás modificarlo cuando se confirme.")
+    return saving
+
+def preserve_expander_state(expander_key, is_primary=True):
+    if expander_key not in st.session_state.expander_states:
+        st.session_state.expander_states[expander_key] = is_primary
+    return st.session_state.expander_states[expander_key]
+
+def set_expander_open(expander_key):
+    st.session_state.expander_states[expander_key] = True
+
+OPERATION_STATUS_ICONS = {
+    "pending": "⏳",
+    "running": "🔄",
+    "failed": "❌",
+    "done": "✅",
+    "compensated": "↩️"
+}
+
+STEP_STATE_LABELS = {
+    saga.FAILED: "fallidos",
+    saga.UNCERTAIN: "sin confirmar",
+    saga.UNDONE: "deshechos",
+    saga.KEPT: "sin deshacer"
+}
+
+def render_operation_progress(op):
+    for label, counts, total in saga.progress(op):
+        detail = " · ".join(
+            f"{counts[state]} {text}" for state, text in STEP_STATE_LABELS.items() if counts.get(state)
+        )
+        st.caption(f"{label}: {counts.get(saga.DONE, 0)}/{total}" + (f" ({detail})" if detail else ""))
+
+def render_operations_panel():
+    ops = [
+        op for op in get_write_queue().operations()
+        if op["status"] not in ("done", "compensated") or time.time() - op["updated"] < 60
+    ]
+    
+    if not ops:
+        return
+    
+    st.markdown("----")
+    st.caption("Operaciones")
+    
+    for op in reversed(ops):
+        done_steps = sum(1 for state in op["state"] if state == saga.DONE)
+        icon = OPERATION_STATUS_ICONS.get(op["status"], "⏳")
+        compensating = op["mode"] == "compensate" and op["status"] != "compensated"
+        action = " (deshaciendo)" if compensating else ""
+        st.markdown(f"{icon} {op['label']}{action} ({done_steps}/{len(op['steps'])})")
+        
+        if op["status"] in ("pending", "running") and len(op["steps"]) > 1:
+            st.progress(done_steps / len(op["steps"]))
+        
+        if op["status"] == "failed":
+            st.caption(f"Error: {op['error']}")
+            if saga.UNCERTAIN in op["state"]:
+                st.warning("Notion no confirmó si creó la página. Compruébalo en Notion antes de reintentar para no duplicarla.")
+            with st.expander("Detalle", expanded=False):
+                render_operation_progress(op)
+            
+            if op["mode"] == "forward":
+                col_retry, col_undo, col_dismiss = st.columns(3)
+                with col_undo:
+                    if st.button("Deshacer", key=f"op_undo_{op['id']}", use_container_width=True):
+                        get_write_queue().compensate(op["id"])
+                        st.rerun()
+            else:
+                col_retry, col_dismiss = st.columns(2)
+            
+            with col_retry:
+                if st.button("Reintentar", key=f"op_retry_{op['id']}", use_container_width=True):
+                    get_write_queue().retry(op["id"])
+                    st.rerun()
+            with col_dismiss:
+                if st.button("Descartar", key=f"op_dismiss_{op['id']}", use_container_width=True):
+                    get_write_queue().dismiss(op["id"])
+                    st.rerun()
+        elif op["status"] == "pending" and op["attempts"] > 0:
+            st.caption(f"Reintento {op['attempts']}: {op['error']}")
+
+def legend_button():
+    st.markdown(
+        '''
+        <style>
+        .legend-container {
+            position: relative;
+            display: flex;
+            justify-content: flex-end;
+            margin-bottom: 15px;
+            margin-top: -45px;
+        }
+        
+        .legend-button {
+            width: 28px;
+            height: 28px;
+            border-radius: 50%;
+            background: #e0e0e0;
+            color: #666;
+            border: none;
+            font-size: 16px;
+            font-weight: bold;
+            cursor: help;
+            display: flex;
+            align-items: center;
+            justify-content: center;
+            transition: all 0.2s ease;
+        }
+        
+        .legend-button:hover {
+            background: #00859b;
+            color: white;
+        }
+        
+        .legend-tooltip {
+            visibility: hidden;
+            opacity: 0;
+            position: absolute;
+            top: 35px;
+            right: 0;
+            background: white;
+            border: 1px solid #ddd;
+            border-radius: 8px;
+            padding: 15px;
+            box-shadow: 0 4px 12px rgba(0,0,0,0.15);
+            z-index: 1000;
+            width: 520px;
+            transition: opacity 0.3s ease, visibility 0.3s ease;
+            pointer-events: none;
+        }
+        
+        .legend-button:hover + .legend-tooltip,
+        .legend-tooltip:hover {
+            visibility: visible;
+            opacity: 1;
+            pointer-events: auto;
+        }
+        
+        .legend-item {
+            display: flex;
+            align-items: center;
+            margin-bottom: 8px;
+        }
+        
+        .legend-badge {
+            display: inline-block;
+            width: 24px;
+            height: 24px;
+            line-height: 24px;
+            text-align: center;
+            font-weight: bold;
+            color: #fff;
+            border-radius: 4px;
+            margin-right: 10px;
+            flex-shrink: 0;
+        }
+        
+        .legend-incident-badge {
+            display: inline-block;
+            min-width: 35px;
+            height: 24px;
+            line-height: 24px;
+            text-align: center;
+            font-weight: bold;
+            color: #fff;
+            border-radius: 4px;
+            margin-right: 10px;
+            padding: 0 6px;
+            flex-shrink: 0;
+            font-size: 11px;
+        }
+        
+        .legend-text {
+            font-size: 13px;
+            color: #333;
+            line-height: 1.4;
+        }
+        
+        .legend-divider {
+            height: 1px;
+            background: #e0e0e0;
+            margin: 12px 0;
+        }
+        </style>
+        
+        <div class="legend-container">
+            <div class="legend-button">?</div>
+            <div class="legend-tooltip">
+                <div class="legend-item">
+                    <span class="legend-badge" style="background:#4CAF50;">O</span>
+                    <span class="legend-text"><strong>Office:</strong> Las gafas se encuentran DISPONIBLES en oficina, libres de compromisos.</span>
+                </div>
+                <div class="legend-item">
+                    <span class="legend-badge" style="background:#FF9800;">C</span>
+                    <span class="legend-text"><strong>Client:</strong> Las gafas se encuentran ASIGNADAS a un proyecto en otras fechas.</span>
+                </div>
+                <div class="legend-item">
+                    <span class="legend-badge" style="background:#1565C0;">H</span>
+                    <span class="legend-text"><strong>At Home:</strong> Las gafas se encuentran en casa de algun miembro del equipo.</span>
+                </div>
+                <div class="legend-divider"></div>
+                <div class="legend-item">
+                    <span class="legend-incident-badge" style="background:#9E9E9E;">0/1</span>
+                    <span class="legend-text">Dispositivos con incidencias resueltas en el pasado.</span>
+                </div>
+                <div class="legend-item">
+                    <span class="legend-incident-badge" style="background:#E53935;">1/1</span>
+                    <span class="legend-text">Dispositivos con alguna incidencia sin resolver actualmente.</span>
+                </div>
+            </div>
+        </div>
+        ''',
+        unsafe_allow_html=True
+    )
+
+def card(name, location_types=None, selected=False, incident_counts=None):
+    color_map_bg = {
+        "Office": "#D9E9DC",
+        "In House": "#E1EDF8",
+        "Client": "#F4ECDF"
+    }
+    
+    color_map_badge = {
+        "Office": "#4CAF50",
+        "In House": "#1565C0",
+        "Client": "#FF9800"
+    }
+    
+    badge_letter_map = {
+        "Office": "O",
+        "In House": "H",
+        "Client": "C"
+    }
+    
+    bg = "#e0e0e0"
+    badge_html = ""
+    border_color = "#9e9e9e"
+    text_color = "#000"
+    
+    if location_types:
+        first_type = location_types.split("  ")[0]
+        bg = color_map_bg.get(first_type, "#e0e0e0")
+        badge_color = color_map_badge.get(first_type, "#B3E5E6")
+        letter = badge_letter_map.get(first_type, "?")
+        
+        badge_html = (
+            f"<span style='float:right;width:20px;height:20px;line-height:20px;"
+            f"text-align:center;font-weight:bold;color:#fff;background:{badge_color};"
+            f"border-radius:4px;margin-left:8px'>{letter}</span>"
+        )
+    
+    if selected:
+        bg = "#B3E5E6"
+    
+    incident_badge_html = ""
+    if incident_counts:
+        active, total = incident_counts
+        
+        if active > 0:
+            border_color = "#E53935"
+            text_color = "#E53935"
+            
+            incident_badge_html = (
+                f"<span style='float:right;width:auto;min-width:20px;height:20px;line-height:20px;"
+                f"text-align:center;font-weight:bold;color:#fff;background:#E53935;"
+                f"border-radius:4px;margin-left:8px;padding:0 6px;font-size:11px;'>"
+                f"{active}/{total}</span>"
+            )
+        elif total > 0:
+            incident_badge_html = (
+                f"<span style='float:right;width:auto;min-width:20px;height:20px;line-height:20px;"
+                f"text-align:center;font-weight:bold;color:#fff;background:#9E9E9E;"
+                f"border-radius:4px;margin-left:8px;padding:0 6px;font-size:11px;'>"
+                f"0/{total}</span>"
+            )
+    
+    st.markdown(
+        f"""
+        <div style='padding:7px;background:{bg};border-left:4px solid {border_color};
+                    border-radius:6px;margin-bottom:4px;overflow:auto;'>
+            <b style='color:{text_color};'>{name}</b> {badge_html}{incident_badge_html} 
+            <div style='clear:both;'></div>
+        </div>
+        """,
+        unsafe_allow_html=True
+    )
+
+def counter_badge(selected, total):
+    if selected > 0:
+        bg = "#B3E5E6"
+        tc = "#333"
+    else:
+        bg = "#e0e0e0"
+        tc = "#666"
+    
+    st.markdown(
+        f"""
+        <div style='background:{bg};color:{tc};padding:12px 16px;border-radius:8px;
+                    text-align:center;font-size:18px;font-weight:bold;margin-bottom:15px;
+                    box-shadow:0 2px 4px rgba(0,0,0,0.1);'>
+            {selected} / {total} seleccionadas
+        </div>
+        """,
+        unsafe_allow_html=True
+    )
+
+def smart_segmented_filter(devices, key_prefix, tag_field="Tags", show_red_for_active=False, incidence_map=None):
+    present_tags = {d.get(tag_field) for d in devices if d.get(tag_field)}
+    
+    ordered_tags = []
+    
+    for preferred_tag in PREFERRED_TAG_ORDER:
+        if preferred_tag in present_tags:
+            ordered_tags.append(preferred_tag)
+    
+    new_tags = sorted([tag for tag in present_tags if tag not in PREFERRED_TAG_ORDER])
+    ordered_tags.extend(new_tags)
+    
+    if show_red_for_active and incidence_map:
+        counts_active = {"Todas": 0}
+        counts_total = {"Todas": 0}
+        
+        for tag in ordered_tags:
+            counts_active[tag] = 0
+            counts_total[tag] = 0
+        
+        for d in devices:
+            tag = d.get(tag_field)
+            inc = incidence_map.get(d["id"], {"active": 0, "total": 0})
+            
+            counts_active["Todas"] += inc["active"]
+            counts_total["Todas"] += inc["total"]
+            
+            if tag in counts_active:
+                counts_active[tag] += inc["active"]
+                counts_total[tag] += inc["total"]
+    else:
+        counts = {"Todas": len(devices)}
+        for tag in ordered_tags:
+            counts[tag] = sum(1 for d in devices if d.get(tag_field) == tag)
+    
+    opciones_display = []
+    opciones_map = {}
+    
+    if show_red_for_active and incidence_map:
+        if counts_active["Todas"] > 0:
+            label_all = f"Todas :red[({counts_active['Todas']})]"
+        else:
+            label_all = f"Todas ({counts_active['Todas']})"
+    else:
+        label_all = f"Todas ({counts['Todas']})"
+    
+    opciones_display.append(label_all)
+    opciones_map[label_all] = "Todas"
+    
+    for tag in ordered_tags:
+        if show_red_for_active and incidence_map:
+            if counts_active[tag] > 0:
+                label = f"{tag} :red[({counts_active[tag]})]"
+            else:
+                label = f"{tag} ({counts_active[tag]})"
+        else:
+            label = f"{tag} ({counts[tag]})"
+        
+        opciones_display.append(label)
+        opciones_map[label] = tag
+    
+    sel_label = st.segmented_control(
+        label=None,
+        options=opciones_display,
+        default=opciones_display[0],
+        key=f"{key_prefix}_seg"
+    )
+    
+    if sel_label is None or sel_label not in opciones_map:
+        sel_label = opciones_display[0]
+    
+    selected_group = opciones_map[sel_label]
+    
+    if selected_group == "Todas":
+        filtered = devices
+    else:
+        filtered = [d for d in devices if d.get(tag_field) == selected_group]
+    
+    return filtered, selected_group
+
+SECTION_TITLES = {
+    "Disponibles para Alquilar": "Disponibles para Alquilar",
+    "Gafas en casa": "Gafas en casa",
+    "Almacén": "📦 Almacén",
+    "Incidencias": "Incidencias en dispositivos"
+}
+
+def render_skeleton(section, needed, loaded):
+    st.title(SECTION_TITLES[section])
+    
+    if section == "Disponibles para Alquilar":
+        cols = st.columns(3)
+        for col, label in zip(cols, ["Fecha salida", "Fecha regreso", "Días totales"]):
+            with col:
+                st.caption(label)
+                st.markdown('<div class="skeleton-field"></div>', unsafe_allow_html=True)
+    
+    st.caption("   ".join(
+        f"{'✅' if name in loaded else '⏳'} {DATASET_LABELS[name]}" for name in needed
+    ))
+    
+    for _ in range(4):
+        st.markdown(
+            '<div class="skeleton-card"><div class="skeleton-line"></div><div class="skeleton-line short"></div></div>',
+            unsafe_allow_html=True
+        )
+
+def load_section(section):
+    skeleton = st.empty()
+    
+    def show_skeleton(needed, loaded):
+        with skeleton.container():
+            render_skeleton(section, needed, loaded)
+    
+    try:
+        with metrics.timer("section_load_seconds", section=section):
+            data = section_data(section, on_progress=show_skeleton)
+    except notion_api.NotionUnavailable as e:
+        skeleton.empty()
+        st.error(f"❌ No se puede conectar con Notion y no hay datos guardados: {e}")
+        st.stop()
+    
+    skeleton.empty()
+    st.session_state.current_view = section
+    
+    if data.get('loading'):
+        st.caption("⏳ Cargando " + ", ".join(DATASET_LABELS[name] for name in data['loading']).lower() + "...")
+    
+    if get_circuit_breaker().is_open():
+        loaded_at = datetime.fromtimestamp(data['loaded_at']).strftime('%H:%M')
+        st.warning(
+            f"⚠️ Notion no responde. Mostrando los datos guardados a las {loaded_at}; "
+            "los cambios quedan en cola y se enviarán cuando vuelva la conexión."
+        )
+    return data
+
+LIVE_UPDATE_INTERVAL = int(os.getenv("LOGISTICA_LIVE_INTERVAL", "5"))
+DIALOG_GRACE = 120
+
+def opening_dialog():
+    try:
+        from streamlit.runtime.scriptrunner import get_script_run_ctx
+        return not get_script_run_ctx().fragment_ids_this_run
+    except:
+        return True
+
+def dialog(title, on_open=None):
+    def wrap(fn):
+        @functools.wraps(fn)
+        def run(*args, **kwargs):
+            st.session_state.dialog_open_until = time.time() + DIALOG_GRACE
+            if on_open and opening_dialog():
+                on_open()
+            return fn(*args, **kwargs)
+        return st.dialog(title)(run)
+    return wrap
+
+def start_live_run():
+    st.session_state.data_version = data_version()
+    st.session_state.dialog_open_until = 0
+
+@st.fragment(run_every=LIVE_UPDATE_INTERVAL)
+def live_updates():
+    if st.session_state.get('data_version') == data_version():
+        return
+    if st.session_state.get('dialog_open_until', 0) > time.time():
+        return
+    st.rerun()
+
+def count_widgets():
+    try:
+        from streamlit.runtime.scriptrunner import get_script_run_ctx
+        return len(get_script_run_ctx().widget_ids_this_run)
+    except:
+        return None
+
+def record_script_run(view, seconds):
+    metrics.observe("script_run_seconds", seconds, view=view)
+    widgets = count_widgets()
+    if widgets is not None:
+        metrics.gauge("widgets_last_run", widgets, view=view)
+
+def render_performance_panel():
+    if st.query_params.get("admin") != "1":
+        return
+    
+    st.markdown("----")
+    with st.expander("Rendimiento", expanded=False):
+        timings, values = metrics.REGISTRY.summary()
+        if not timings and not values:
+            st.caption("Sin datos todavía")
+            return
+        
+        uptime = int(time.time() - metrics.REGISTRY.started_at)
+        st.caption(f"Desde hace {uptime // 3600} h {uptime % 3600 // 60} min en este proceso")
+        if timings:
+            st.dataframe(timings, hide_index=True, use_container_width=True)
+        if values:
+            st.dataframe(values, hide_index=True, use_container_width=True)
@@ -0,0 +1,436 @@
+import contextlib
+import glob
+import json
+import os
+import threading
+import time
+import uuid
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+import notion_api
+import saga
+
+RETRYABLE_STATUS = {409, 429, 500, 502, 503, 504}
+UNCERTAIN_STATUS = {500, 502, 503, 504, 599}
+DONE_RETENTION = 3600
+FINISHED_STATUS = ("done", "compensated")
+OWNER_CHECK_EVERY = 10
+
+
+def _touched_pages(steps):
+    return ({saga.touched_page(s) for s in steps} | {p for s in steps for p in s.get("touches", [])}) - {None}
+
+
+class WriteQueue:
+    """Cola de sagas de escritura a Notion con diario en disco y workers en segundo plano.
+
+    Los pasos listos de cada oleada se envían a la vez por el bucle del notion_async.AsyncNotionClient.
+    El diario lo comparten todos los procesos del servidor: cada operación la ejecuta solo el proceso
+    que la creó y las de un proceso que ya no existe las adopta otro, así que nunca se envían dos veces.
+    """
+
+    def __init__(self, journal_path, client, workers=2, max_attempts=6):
+        self.journal_path = journal_path
+        self.client = client
+        self.breaker = client.breaker
+        self.max_attempts = max_attempts
+        self.owner = uuid.uuid4().hex
+        self._ops = {}
+        self._running = set()
+        self._listeners = []
+        self._cond = threading.Condition()
+        self._journal_lock = threading.Lock()
+        self._journal_ino = None
+        self._journal_offset = 0
+        self._journal_lines = 0
+        self._owners_alive = {}
+
+        os.makedirs(os.path.dirname(journal_path) or ".", exist_ok=True)
+        self._owner_lock = open(self._owner_path(self.owner), "a")
+        if fcntl:
+            fcntl.flock(self._owner_lock, fcntl.LOCK_EX)
+
+        with self._cond, self._locked():
+            self._sync()
+            self._compact()
+        for path in glob.glob(self._owner_path("*")):
+            self._owner_alive(os.path.basename(path)[len(os.path.basename(self.journal_path)) + 1:-len(".owner")])
+
+        for i in range(workers):
+            threading.Thread(target=self._worker, name=f"write-queue-{i}", daemon=True).start()
+
+    def _owner_path(self, owner):
+        return f"{self.journal_path}.{owner}.owner"
+
+    @contextlib.contextmanager
+    def _locked(self):
+        with self._journal_lock:
+            fh = open(f"{self.journal_path}.lock", "a")
+            try:
+                if fcntl:
+                    fcntl.flock(fh, fcntl.LOCK_EX)
+                yield
+            finally:
+                if fcntl:
+                    fcntl.flock(fh, fcntl.LOCK_UN)
+                fh.close()
+
+    def _sync(self):
+        """Lee las líneas que otros procesos han añadido al diario desde la última lectura"""
+        try:
+            st = os.stat(self.journal_path)
+        except FileNotFoundError:
+            return
+        if st.st_ino != self._journal_ino or st.st_size < self._journal_offset:
+            self._journal_ino = st.st_ino
+            self._journal_offset = 0
+            self._journal_lines = 0
+            self._ops = {op_id: op for op_id, op in self._ops.items() if op_id in self._running}
+        if st.st_size == self._journal_offset:
+            return
+
+        with open(self.journal_path, "rb") as fh:
+            fh.seek(self._journal_offset)
+            for line in fh:
+                if not line.endswith(b"\n"):
+                    break
+                self._journal_offset += len(line)
+                self._journal_lines += 1
+                try:
+                    op = json.loads(line)
+                except ValueError:
+                    continue
+                if op["id"] in self._running:
+                    continue
+                if op["status"] == "dismissed":
+                    self._ops.pop(op["id"], None)
+                    continue
+                op.setdefault("mode", "forward")
+                op.setdefault("state", [
+                    saga.DONE if r is not None else saga.PENDING for r in op["results"]
+                ])
+                self._ops[op["id"]] = op
+
+    def _compact(self):
+        """Reescribe el diario con una línea por operación viva; hay que llamarla con el diario bloqueado"""
+        now = time.time()
+        for op_id, op in list(self._ops.items()):
+            if op_id not in self._running and op["status"] in FINISHED_STATUS and now - op["updated"] > DONE_RETENTION:
+                del self._ops[op_id]
+
+        tmp = f"{self.journal_path}.{os.getpid()}.tmp"
+        with open(tmp, "w", encoding="utf-8") as fh:
+            for op in self._ops.values():
+                fh.write(json.dumps(op) + "\n")
+            fh.flush()
+            os.fsync(fh.fileno())
+        os.replace(tmp, self.journal_path)
+
+        st = os.stat(self.journal_path)
+        self._journal_ino = st.st_ino
+        self._journal_offset = st.st_size
+        self._journal_lines = len(self._ops)
+
+    def _persist(self, op):
+        with self._locked():
+            self._sync()
+            self._append(op)
+
+    def _append(self, op):
+        """Añade la línea de `op` al diario; hay que llamarla con el diario bloqueado y recién leído"""
+        op["updated"] = time.time()
+        line = json.dumps(op) + "\n"
+        with open(self.journal_path, "a", encoding="utf-8") as fh:
+            fh.write(line)
+            fh.flush()
+            os.fsync(fh.fileno())
+        self._journal_offset += len(line.encode())
+        self._journal_lines += 1
+        if self._journal_lines > 4 * len(self._ops) + 100:
+            self._compact()
+
+    def _owner_alive(self, owner):
+        if owner == self.owner:
+            return True
+        if not owner:
+            return False
+        if not fcntl:
+            return True
+
+        alive, checked_at = self._owners_alive.get(owner, (True, 0))
+        if time.time() - checked_at < OWNER_CHECK_EVERY:
+            return alive
+        try:
+            with open(self._owner_path(owner), "a") as fh:
+                fcntl.flock(fh, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            alive = False
+            os.remove(self._owner_path(owner))
+        except BlockingIOError:
+            alive = True
+        except OSError:
+            alive = False
+        self._owners_alive[owner] = (alive, time.time())
+        return alive
+
+    def _adopt_orphans(self):
+        """Hace suyas las operaciones sin terminar de procesos que ya no existen.
+
+        Lee, comprueba el dueño y reescribe con el diario bloqueado todo el rato: si dos procesos
+        intentan adoptar la misma operación, el segundo ya ve al primero como dueño vivo.
+        """
+        with self._locked():
+            self._sync()
+            orphans = [
+                op for op in self._ops.values()
+                if op["status"] in ("pending", "running") and not self._owner_alive(op.get("owner"))
+            ]
+            for op in orphans:
+                op["owner"] = self.owner
+                op["status"] = "pending"
+                self._append(op)
+
+    def add_listener(self, fn):
+        self._listeners.append(fn)
+
+    def submit(self, label, steps, invalidate=None, op_id=None):
+        op = {
+            "id": op_id or uuid.uuid4().hex,
+            "label": label,
+            "steps": steps,
+            "results": [None] * len(steps),
+            "state": saga.initial_state(steps),
+            "mode": "forward",
+            "status": "pending",
+            "attempts": 0,
+            "error": None,
+            "created": time.time(),
+            "next_attempt": 0,
+            "invalidate": invalidate or {},
+            "owner": self.owner,
+        }
+        with self._cond:
+            self._persist(op)
+            self._ops[op["id"]] = op
+            self._cond.notify_all()
+        return op["id"]
+
+    def retry(self, op_id):
+        with self._cond:
+            op = self._ops.get(op_id)
+            if not op or op["status"] != "failed":
+                return
+            if op["mode"] == "forward":
+                op["state"] = [saga.PENDING if s in (saga.FAILED, saga.UNCERTAIN) else s for s in op["state"]]
+            self._restart(op)
+
+    def compensate(self, op_id):
+        with self._cond:
+            op = self._ops.get(op_id)
+            if not op or op["status"] != "failed" or op["mode"] != "forward":
+                return
+            op["mode"] = "compensate"
+            self._restart(op)
+
+    def _restart(self, op):
+        op["status"] = "pending"
+        op["attempts"] = 0
+        op["error"] = None
+        op["next_attempt"] = 0
+        self._persist(op)
+        self._cond.notify_all()
+
+    def dismiss(self, op_id):
+        with self._cond:
+            op = self._ops.pop(op_id, None)
+            if op:
+                op["status"] = "dismissed"
+                self._persist(op)
+
+    def operations(self):
+        with self._cond:
+            with self._locked():
+                self._sync()
+            ops = [dict(op) for op in self._ops.values()]
+        return sorted(ops, key=lambda op: op["created"])
+
+    def _next_op(self):
+        if self.breaker is not None and self.breaker.is_open():
+            return None
+        self._adopt_orphans()
+
+        now = time.time()
+        busy = set()
+        for op in self._ops.values():
+            if op["status"] == "running":
+                busy |= _touched_pages(op["steps"])
+
+        for op in sorted(self._ops.values(), key=lambda o: o["created"]):
+            if op["status"] != "pending":
+                continue
+            touched = _touched_pages(op["steps"])
+            if touched & busy:
+                busy |= touched
+                continue
+            busy |= touched
+            if op["next_attempt"] <= now and op.get("owner") == self.owner:
+                return op
+        return None
+
+    def _worker(self):
+        while True:
+            with self._cond:
+                op = self._next_op()
+                while op is None:
+                    self._cond.wait(timeout=1.0)
+                    op = self._next_op()
+                op["status"] = "running"
+                self._running.add(op["id"])
+                self._persist(op)
+
+            try:
+                self._execute(op)
+            except Exception as e:
+                with self._cond:
+                    op["status"] = "pending"
+                    op["error"] = str(e) or type(e).__name__
+                    op["next_attempt"] = time.time() + min(60, 2 ** (op["attempts"] + 1))
+                    try:
+                        self._persist(op)
+                    except Exception:
+                        pass
+
+            with self._cond:
+                self._running.discard(op["id"])
+                self._cond.notify_all()
+
+            if op["status"] in ("done", "failed", "compensated"):
+                for fn in self._listeners:
+                    try:
+                        fn(op)
+                    except Exception:
+                        pass
+
+    def _uncertain(self, op, i, status):
+        s = op["steps"][i]
+        return op["mode"] == "forward" and status in UNCERTAIN_STATUS and not notion_api.retry_safe(s["method"], s["path"])
+
+    def _fail(self, op, i, status, error):
+        """Programa un reintento si el fallo es pasajero; si Notion pudo crear la página, reenviarla la duplicaría"""
+        op["error"] = f"{status}: {error}" if status else error
+        if self._uncertain(op, i, status):
+            op["status"] = "failed"
+            op["state"][i] = saga.UNCERTAIN
+            return
+        if self.breaker is not None and self.breaker.is_open():
+            op["status"] = "pending"
+            op["next_attempt"] = time.time()
+            return
+        op["attempts"] += 1
+        if (status is None or status in RETRYABLE_STATUS) and op["attempts"] < self.max_attempts:
+            op["status"] = "pending"
+            op["next_attempt"] = time.time() + min(60, 2 ** op["attempts"])
+        else:
+            op["status"] = "failed"
+            if op["mode"] == "forward":
+                op["state"][i] = saga.FAILED
+
+    def _send(self, requests, relations):
+        """Envía una oleada; las relaciones se releen justo antes para no pisar cambios posteriores a la caché"""
+        reads = [
+            (path.split("/", 1)[1], rel["property_id"])
+            for (method, path, body), rel in zip(requests, relations) if rel
+        ]
+        current = iter(self.client.relation_ids_many(reads) if reads else [])
+        outcomes = [None] * len(requests)
+        to_send = []
+        for k, ((method, path, body), rel) in enumerate(zip(requests, relations)):
+            if rel:
+                ids = next(current)
+                if ids is None:
+                    outcomes[k] = (None, None, "No se pudo releer la relación")
+                    continue
+                body = saga.edit_relation(rel, ids)
+                if len(body["properties"][rel["property"]]["relation"]) > saga.RELATION_LIMIT:
+                    outcomes[k] = (400, None, f"La relación supera {saga.RELATION_LIMIT} elementos")
+                    continue
+            to_send.append((k, (method, path, body)))
+
+        sent = self.client.send_many([r for _, r in to_send]) if to_send else []
+        for (k, _), outcome in zip(to_send, sent):
+            outcomes[k] = outcome
+        return outcomes
+
+    def _execute(self, op):
+        if op["mode"] == "compensate":
+            self._compensate(op)
+            return
+
+        while True:
+            ready = saga.ready_steps(op)
+            if not ready:
+                break
+
+            outcomes = self._send([saga.request_for(op, i) for i in ready], [saga.relation_for(op, i) for i in ready])
+
+            with self._cond:
+                failures = []
+                for i, (status, data, error) in zip(ready, outcomes):
+                    if status == 200:
+                        op["results"][i] = data.get("id", "")
+                        op["state"][i] = saga.DONE
+                    else:
+                        failures.append((i, status, error))
+                uncertain = [f for f in failures if self._uncertain(op, f[0], f[1])]
+                if failures:
+                    self._fail(op, *(uncertain or failures)[0])
+                for i, status, error in uncertain:
+                    op["state"][i] = saga.UNCERTAIN
+                self._persist(op)
+                if failures:
+                    return
+
+        with self._cond:
+            if all(s == saga.DONE for s in op["state"]):
+                op["status"] = "done"
+                op["error"] = None
+            else:
+                op["status"] = "failed"
+            self._persist(op)
+
+    def _compensate(self, op):
+        while True:
+            ready = saga.undoable_steps(op)
+            if not ready:
+                break
+
+            requests_by_step = {i: saga.compensation_for(op, i) for i in ready}
+            to_send = [i for i in ready if requests_by_step[i]]
+            outcomes = self._send(
+                [requests_by_step[i] for i in to_send],
+                [saga.compensation_relation_for(op, i) for i in to_send]
+            )
+
+            with self._cond:
+                for i in ready:
+                    if not requests_by_step[i]:
+                        op["state"][i] = saga.KEPT
+                failure = None
+                for i, (status, data, error) in zip(to_send, outcomes):
+                    if status == 200:
+                        op["state"][i] = saga.UNDONE
+                    elif failure is None:
+                        failure = (i, status, error)
+                if failure:
+                    self._fail(op, *failure)
+                self._persist(op)
+                if failure:
+                    return
+
+        with self._cond:
+            op["status"] = "compensated"
+            op["error"] = None
+            self._persist(op)